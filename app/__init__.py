@@ -1,23 +1,27 @@
 import datetime
+import hmac
 import logging
 import os
 
-from flask import Flask, jsonify, current_app, g
+from flask import Flask, current_app, g, request
 
-from flask_bcrypt import check_password_hash
 from flask_jwt import JWT
 from flask_migrate import init, upgrade, Migrate
-from flask_sqlalchemy import SQLAlchemy
 
 from sqlalchemy import create_engine
 from sqlalchemy.exc import ProgrammingError
 
 from config import config
 
-from .exceptions import CustomError
+from .cache import LRUCache
+from .database import PooledSQLAlchemy, health, init_pool_events, pool_status
+from .encoding import JSONEncoder, compress_response, jsonify
+from .exceptions import CustomError, UnauthorizedError
+from .instrumentation import init_instrumentation
+from .metrics import render_prometheus
 from .settings import DATABASE_NAME, SECRET_KEY
 
-db = SQLAlchemy()
+db = PooledSQLAlchemy()
 jwt = JWT()
 migrate = Migrate()
 
@@ -27,15 +31,21 @@ logging.basicConfig(level=logging.INFO, format='[%(levelname)s] - %(message)s')
 @jwt.authentication_handler
 def authenticate(username, password):
     from .user.models import User
+    from .user.password_functions import check_password, hash_password, needs_rehash
     # Check username
     user = User.query.filter_by(username=username).first()
     if user is None:
         raise CustomError(401, message='Username or password were not found.')
 
     # Check password
-    if not check_password_hash(user.password, password):
+    if not check_password(user.password, password):
         raise CustomError(401, message='Username or password were not found.')
 
+    # Upgrade the hash now we know the password if BCRYPT_LOG_ROUNDS has changed
+    if needs_rehash(user.password):
+        user.password = hash_password(password)
+        db.session.commit()
+
     return user.to_dict()
 
 
@@ -43,7 +53,14 @@ def authenticate(username, password):
 def identity(payload):
     # Takes identity from JWT token and gets a user from it
     from .user.models import User
+    from .user.identity_functions import LazyUser
     user_id = payload['identity']
+
+    if current_app.config.get('JWT_STATELESS_IDENTITY') and 'school_id' in payload:
+        # Trust the token and only load the user if a view needs more than its id, school or default permissions
+        g.user = LazyUser(user_id, payload['school_id'], payload.get('permissions', 0))
+        return {'id': user_id, 'school_id': payload['school_id']}
+
     user = User.query.get(user_id)
     if user is None:
         raise CustomError(404, 'User with id: {} was not found.'.format(id))
@@ -58,27 +75,67 @@ def payload_handler(identity):
     exp = iat + current_app.config.get('JWT_EXPIRATION_DELTA') # Set expiry time
     nbf = iat + current_app.config.get('JWT_NOT_BEFORE_DELTA') # Set time before token can be used
     new_identity = identity['id'] # Identity is set to the user id
-    return {'exp': exp, 'iat': iat, 'nbf': nbf, 'identity': new_identity} # Return dictionary 
+    payload = {'exp': exp, 'iat': iat, 'nbf': nbf, 'identity': new_identity}
+
+    if current_app.config.get('JWT_STATELESS_IDENTITY'):
+        from .permissions.cache_functions import load_access_summary
+        from .user.identity_functions import permission_bitmap
+        payload['school_id'] = identity['school_id']
+        payload['permissions'] = permission_bitmap(load_access_summary(new_identity).permissions)
+
+    return payload # Return dictionary 
 
 
 def create_app(config_name="default"):
     app = Flask(__name__)
     app.config.from_object(config[config_name])
+    app.json_encoder = JSONEncoder
 
     db.init_app(app)
+    init_pool_events()
 
     jwt.init_app(app) # Initialise JWT for app
 
+    if app.config.get('PERMISSIONS_CACHE_ENABLED'):
+        app.extensions['permissions_cache'] = LRUCache(app.config.get('PERMISSIONS_CACHE_SIZE'))
+    if app.config.get('TIMETABLE_CACHE_ENABLED'):
+        app.extensions['timetable_cache'] = LRUCache(app.config.get('TIMETABLE_CACHE_SIZE'))
+    if app.config.get('ICAL_CACHE_ENABLED'):
+        app.extensions['ical_cache'] = LRUCache(app.config.get('ICAL_CACHE_SIZE'))
+
     @app.errorhandler(CustomError)
     def custom_error(error):
         response = jsonify(error.to_dict())
         response.status_code = error.status_code
         return response
 
+    init_instrumentation(app)
+    app.after_request(compress_response)
+
     @app.route('/')
     def root():
         return app.send_static_file('index.html')
 
+    if app.config.get('METRICS_ENDPOINT'):
+        @app.route('/metrics')
+        def metrics_view():
+            token = app.config.get('METRICS_TOKEN')
+            if token is not None:
+                authorization = request.headers.get('Authorization', '').encode('utf-8')
+                if not hmac.compare_digest(authorization, 'Bearer {}'.format(token).encode('utf-8')):
+                    raise UnauthorizedError()
+            # Values are per worker process
+            pool_status(db.engine.pool)  # Updates the pool gauges
+            return app.response_class(render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+    if app.config.get('HEALTH_ENDPOINT'):
+        @app.route('/health')
+        def health_view():
+            healthy, status = health(db.engine, app.config.get('HEALTH_POOL_SATURATION_LIMIT'))
+            response = jsonify({'success': healthy, 'status': status})
+            response.status_code = 200 if healthy else 503
+            return response
+
     from .school import school_blueprint
     app.register_blueprint(school_blueprint)
     from .permissions import permissions_blueprint
@@ -0,0 +1,141 @@
+"""
+Connection pool settings and health checks.
+
+Flask-SQLAlchemy 2.1 only passes the pool size, overflow, timeout and recycle from the config to create_engine, so
+PooledSQLAlchemy adds pre-ping, the statement timeout and PgBouncer mode, see config.py. Pool events are counted in
+app/metrics.py and pool_status() is what /health reports.
+
+Pre-ping tests each connection with a cheap round trip when it is checked out and reconnects if the server or a
+firewall dropped it while idle, rather than the request failing. Recycling replaces connections before they get old
+enough for that to happen.
+"""
+import time
+
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.pool import NullPool, Pool, QueuePool
+
+from app import metrics
+
+POOL_OPTIONS = ('pool_size', 'max_overflow', 'pool_timeout', 'pool_recycle')
+STATEMENT_TIMEOUT_OPTION = 'vle_statement_timeout_ms'
+
+pool_checkouts = metrics.counter('db_pool_checkouts_total', 'Connections checked out of the pool.')
+pool_connects = metrics.counter('db_pool_connects_total', 'New connections opened to the database.')
+pool_invalidations = metrics.counter(
+    'db_pool_invalidations_total', 'Connections found broken, e.g. by pre-ping, and discarded.'
+)
+pool_size = metrics.gauge('db_pool_size', 'Connections the pool keeps open.')
+pool_checked_out = metrics.gauge('db_pool_checked_out', 'Connections checked out of the pool.')
+pool_saturation = metrics.gauge('db_pool_saturation', 'Checked out connections over the most the pool will open.')
+
+
+class PooledSQLAlchemy(SQLAlchemy):
+    def apply_driver_hacks(self, app, info, options):
+        config = app.config
+        pgbouncer = config.get('DATABASE_PGBOUNCER')
+
+        if info.drivername.startswith('sqlite') or pgbouncer:
+            # sqlite uses a StaticPool in memory or a NullPool for files, neither of which are sized. PgBouncer
+            # keeps the pool of server connections itself, so connections here are closed when checked in.
+            for key in POOL_OPTIONS:
+                options.pop(key, None)
+            if pgbouncer:
+                options['poolclass'] = NullPool
+        elif config.get('DATABASE_POOL_PRE_PING'):
+            options['pool_pre_ping'] = True
+
+        timeout = config.get('DATABASE_STATEMENT_TIMEOUT_MS')
+        if timeout and info.drivername.startswith('postgresql'):
+            if pgbouncer:
+                # PgBouncer rejects the options startup parameter, and with transaction pooling a session SET would
+                # apply to whichever client used the server connection next, so it is SET LOCAL in each transaction
+                options.setdefault('execution_options', {})[STATEMENT_TIMEOUT_OPTION] = int(timeout)
+            else:
+                connect_args = options.setdefault('connect_args', {})
+                connect_args['options'] = '-c statement_timeout={:d}'.format(int(timeout))
+
+        super(PooledSQLAlchemy, self).apply_driver_hacks(app, info, options)
+
+
+def _on_begin(conn):
+    # Connection.get_execution_options() is new in SQLAlchemy 1.3
+    timeout = conn._execution_options.get(STATEMENT_TIMEOUT_OPTION)
+    if timeout:
+        # On the DBAPI cursor so it isn't counted as one of the request's statements
+        cursor = conn.connection.cursor()
+        cursor.execute('SET LOCAL statement_timeout = {:d}'.format(timeout))
+        cursor.close()
+
+
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    pool_checkouts.inc()
+
+
+def _on_connect(dbapi_connection, connection_record):
+    pool_connects.inc()
+
+
+def _on_invalidate(dbapi_connection, connection_record, exception):
+    pool_invalidations.inc()
+
+
+def init_pool_events():
+    if not event.contains(Pool, 'checkout', _on_checkout):
+        event.listen(Pool, 'checkout', _on_checkout)
+        event.listen(Pool, 'connect', _on_connect)
+        event.listen(Pool, 'invalidate', _on_invalidate)
+        event.listen(Engine, 'begin', _on_begin)
+
+
+def pool_status(pool):
+    """
+    Return the pool's size, connections checked out and saturation, i.e. checked out over the most it will open.
+
+    Only a QueuePool has a limit, so other pools report a saturation of None.
+    """
+    status = {
+        'pool': type(pool).__name__,
+        'size': None,
+        'max_overflow': None,
+        'checked_out': None,
+        'saturation': None
+    }
+    if isinstance(pool, QueuePool):
+        # A negative max_overflow means there's no limit
+        max_overflow = pool._max_overflow
+        status.update({
+            'size': pool.size(),
+            'max_overflow': max_overflow,
+            'checked_out': pool.checkedout(),
+            'saturation': pool.checkedout() / (pool.size() + max_overflow) if max_overflow >= 0 else None
+        })
+        pool_size.set(status['size'])
+        pool_checked_out.set(status['checked_out'])
+        if status['saturation'] is not None:
+            pool_saturation.set(status['saturation'])
+    return status
+
+
+def health(engine, saturation_limit):
+    """Return (healthy, status) after checking the pool isn't saturated and a SELECT 1 succeeds."""
+    # Before connecting, which checks out a connection too
+    status = pool_status(engine.pool)
+    if status['saturation'] is not None and status['saturation'] >= saturation_limit:
+        # Connecting could wait for the pool timeout
+        status['database'] = 'not checked, pool saturated'
+        return False, status
+
+    start = time.perf_counter()
+    try:
+        with engine.connect() as conn:
+            conn.scalar('SELECT 1')
+        status['database'] = 'ok'
+        healthy = True
+    except SQLAlchemyError as e:
+        status['database'] = 'error: {}'.format(type(e).__name__)
+        healthy = False
+    status['ping_ms'] = round((time.perf_counter() - start) * 1000, 2)
+    return healthy, status
@@ -0,0 +1,142 @@
+"""
+Functions to encode and compress API responses.
+
+jsonify here is a drop in for flask.jsonify. It uses orjson when it is installed and JSON_BACKEND allows, otherwise
+the stdlib json module. Both backends give the same output for the types used by the API:
+datetimes and dates as HTTP dates (as Flask does), times as ISO 8601, Decimals as numbers and Enums by value.
+"""
+import datetime
+import decimal
+import enum
+import gzip
+import json
+import time
+import uuid
+
+from flask import current_app, request
+from werkzeug.http import http_date
+
+from app.instrumentation import record_serialisation
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'application/x-ndjson', 'text/csv', 'text/calendar'}
+
+
+def default(o):
+    """Encode types json can't, for either backend."""
+    if isinstance(o, (datetime.datetime, datetime.date)):
+        return http_date(o.timetuple())
+    if isinstance(o, datetime.time):
+        return o.isoformat()
+    if isinstance(o, decimal.Decimal):
+        return float(o)
+    if isinstance(o, enum.Enum):
+        return o.value
+    if isinstance(o, uuid.UUID):
+        return str(o)
+    if hasattr(o, '__html__'):
+        return str(o.__html__())
+    raise TypeError("{!r} is not JSON serializable".format(o))
+
+
+class JSONEncoder(json.JSONEncoder):
+    """Encoder used by flask.json, e.g. by Flask-JWT, so it matches jsonify."""
+    def default(self, o):
+        return default(o)
+
+
+def use_orjson():
+    backend = current_app.config.get('JSON_BACKEND', 'auto')
+    if backend == 'orjson' and orjson is None:
+        raise RuntimeError("JSON_BACKEND is orjson but orjson is not installed.")
+    return orjson is not None and backend in ('auto', 'orjson')
+
+
+def dumps(data, pretty=False):
+    """Return data encoded as JSON bytes."""
+    sort_keys = current_app.config.get('JSON_SORT_KEYS', False)
+
+    if use_orjson():
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, default=default, option=option)
+
+    return json.dumps(
+        data,
+        default=default,
+        sort_keys=sort_keys,
+        indent=2 if pretty else None,
+        separators=(', ', ': ') if pretty else (',', ':')
+    ).encode('utf-8')
+
+
+def jsonify(*args, **kwargs):
+    """Create a JSON response in the same way as flask.jsonify, compact unless JSONIFY_PRETTYPRINT_REGULAR."""
+    if args and kwargs:
+        raise TypeError('jsonify() behavior undefined when passed both args and kwargs')
+    elif len(args) == 1:
+        data = args[0]
+    else:
+        data = args or kwargs
+
+    pretty = current_app.config.get('JSONIFY_PRETTYPRINT_REGULAR') and not request.is_xhr
+    start = time.perf_counter()
+    body = dumps(data, pretty=pretty) + b'\n'
+    record_serialisation(time.perf_counter() - start)
+    return current_app.response_class(body, mimetype=current_app.config['JSONIFY_MIMETYPE'])
+
+
+def choose_encoding(accept_encoding):
+    """Return the best encoding the client accepts, preferring br to gzip, or None."""
+    if brotli is not None and accept_encoding['br']:
+        return 'br'
+    if accept_encoding['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress_response(response):
+    """
+    Compress a buffered response if the client accepts it and it is worth it.
+
+    Streamed responses are left alone so they are still sent as they are generated.
+    """
+    config = current_app.config
+    if not config.get('RESPONSE_COMPRESSION'):
+        return response
+    if response.direct_passthrough or response.is_streamed or 'Content-Encoding' in response.headers:
+        return response
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES or not 200 <= response.status_code < 300:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(request.accept_encodings)
+    data = response.get_data()
+    if encoding is None or len(data) < config.get('RESPONSE_COMPRESSION_MIN_SIZE', 1024):
+        return response
+
+    level = config.get('RESPONSE_COMPRESSION_LEVEL', 6)
+    if encoding == 'br':
+        data = brotli.compress(data, quality=level)
+    else:
+        data = gzip.compress(data, compresslevel=level)
+
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag is not None and not weak:
+        # A strong ETag is for one exact representation, so each encoding needs its own
+        response.set_etag('{}-{}'.format(etag, encoding))
+    return response
@@ -42,3 +42,9 @@ class NotFoundError(CustomError):
     """Return a generic 404 error."""
     def __init__(self):
         super().__init__(404, message="Not found.")
+
+
+class TooManyRequestsError(CustomError):
+    """Return a 429 error when the server is too busy to take more work."""
+    def __init__(self):
+        super().__init__(429, message="Too many requests, please try again shortly.")
@@ -1,6 +1,11 @@
-from app.exceptions import BlankValueError
+import base64
+import datetime
+import json
+
+from app.exceptions import BlankValueError, CustomError
 from .exceptions import NoJSONError, MissingKeyError, NotFoundError, UnauthorizedError
-from flask import g
+from flask import current_app, g
+from sqlalchemy import and_, func, or_
 
 
 def json_from_request(request):
@@ -23,6 +28,29 @@ def get_boolean_query_param(request, param_name):
     return False
 
 
+def get_int_query_param(request, param_name, default=None, minimum=None, maximum=None):
+    param = request.args.get(param_name)
+    if param is None or param == '':
+        return default
+    try:
+        value = int(param)
+    except ValueError:
+        raise CustomError(409, message="Invalid value for {}: {}".format(param_name, param))
+    if minimum is not None and value < minimum:
+        raise CustomError(409, message="{} must be at least {}.".format(param_name, minimum))
+    if maximum is not None:
+        value = min(value, maximum)
+    return value
+
+
+def get_list_query_param(request, param_name):
+    """Return a comma separated query param as a list, e.g. ?fields=id,email"""
+    param = request.args.get(param_name)
+    if not param:
+        return []
+    return [value.strip() for value in param.split(',') if value.strip()]
+
+
 def get_record_by_id(model_id, model, custom_not_found_error=None, check_school_id=True):
     # Check user specified is in the correct school
     record = model.query.filter_by(id=model_id).first()
@@ -44,3 +72,146 @@ def check_values_not_blank(keys, data):
             value = data[key].strip()
             if value is None or value == '':
                 raise BlankValueError(key)
+
+
+class Page:
+    """One page of results from paginate, with the metadata every listing returns."""
+    def __init__(self, items, limit, sort, next_cursor=None, total=None):
+        self.items = items
+        self.limit = limit
+        self.sort = sort
+        self.next_cursor = next_cursor
+        self.total = total
+
+    def metadata(self):
+        metadata = {'next_cursor': self.next_cursor, 'limit': self.limit, 'sort': self.sort}
+        if self.total is not None:
+            metadata['total'] = self.total
+        return metadata
+
+
+def _python_type(column):
+    try:
+        return column.type.python_type
+    except NotImplementedError:
+        return str
+
+
+def _parse_value(column, value, param_name):
+    python_type = _python_type(column)
+    try:
+        if python_type is bool:
+            return value.lower() == "true"
+        if python_type is datetime.datetime:
+            return datetime.datetime.strptime(value, '%Y-%m-%dT%H:%M:%S.%f')
+        if python_type is datetime.date:
+            return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+        return python_type(value)
+    except (TypeError, ValueError):
+        raise CustomError(409, message="Invalid value for {}: {}".format(param_name, value))
+
+
+def _encode_cursor(values):
+    values = [v.strftime('%Y-%m-%dT%H:%M:%S.%f') if isinstance(v, datetime.datetime)
+              else v.isoformat() if isinstance(v, datetime.date) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+
+def _decode_cursor(cursor, sort_column, id_column):
+    try:
+        value, last_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+    except (TypeError, ValueError):
+        raise CustomError(409, message="Invalid cursor.")
+    if not isinstance(last_id, int) or isinstance(last_id, bool) or isinstance(value, (list, dict)):
+        raise CustomError(409, message="Invalid cursor.")
+    if value is not None and sort_column is not id_column:
+        value = _parse_value(sort_column, str(value), 'cursor')
+    return value, last_id
+
+
+def _nullable(column):
+    return getattr(getattr(column, 'expression', column), 'nullable', True)
+
+
+# Databases which sort NULL after every value ascending, others sort it before
+NULLS_LAST_DIALECTS = {'postgresql', 'oracle'}
+
+
+def _after_cursor(sort_column, id_column, value, last_id, descending, nulls_last):
+    """
+    Rows after (value, last_id) in the order paginate sorts by.
+
+    The database's own ordering of NULLs is kept so an index can still give the order, but comparisons with NULL are
+    never true so a nullable sort column needs IS NULL on whichever side of the values its NULLs sort.
+    """
+    after_id = id_column < last_id if descending else id_column > last_id
+    if sort_column is id_column:
+        return after_id
+    nulls_after = nulls_last != descending
+    if value is None:
+        if nulls_after:
+            return and_(sort_column.is_(None), after_id)
+        return or_(sort_column.isnot(None), and_(sort_column.is_(None), after_id))
+
+    after_value = sort_column < value if descending else sort_column > value
+    after = or_(after_value, and_(sort_column == value, after_id))
+    if nulls_after and _nullable(sort_column):
+        return or_(sort_column.is_(None), after)
+    return after
+
+
+def paginate(request, query, sort_columns, filters=None, default_sort='id', options=(), schema=None):
+    """
+    Return a Page of a query using the query params every listing accepts.
+
+    sort_columns maps the names allowed in ?sort= (or ?sort=-name for descending) to columns and must include 'id'.
+    Pages are found by keyset on (sort column, id) so a ?cursor= from next_cursor is as cheap as the first page.
+    filters maps other query params to columns, e.g. ?subject=1,2 filters subject_id to 1 or 2. ?count=true adds the
+    total number of results, found with a single COUNT. options are loader options for the items on the page, as
+    well as those derived from schema (see app/serializers.py).
+    """
+    id_column = sort_columns['id']
+    if schema is not None:
+        options = list(options) + schema.loader_options()
+
+    for param_name, column in (filters or {}).items():
+        values = get_list_query_param(request, param_name)
+        if values:
+            query = query.filter(column.in_([_parse_value(column, v, param_name) for v in values]))
+
+    sort = request.args.get('sort') or default_sort
+    descending = sort.startswith('-')
+    sort_column = sort_columns.get(sort.lstrip('-'))
+    if sort_column is None:
+        raise CustomError(409, message="Invalid sort: {}. Must be one of: {}".format(
+            sort, ", ".join(sorted(sort_columns.keys()))
+        ))
+
+    limit = get_int_query_param(
+        request, 'limit',
+        default=current_app.config['PAGE_SIZE_DEFAULT'],
+        minimum=1,
+        maximum=current_app.config['PAGE_SIZE_MAX']
+    )
+
+    total = None
+    if get_boolean_query_param(request, 'count'):
+        total = query.order_by(None).with_entities(func.count(id_column)).scalar()
+
+    cursor = request.args.get('cursor')
+    if cursor:
+        value, last_id = _decode_cursor(cursor, sort_column, id_column)
+        nulls_last = query.session.get_bind().dialect.name in NULLS_LAST_DIALECTS
+        query = query.filter(_after_cursor(sort_column, id_column, value, last_id, descending, nulls_last))
+
+    order = [sort_column] if sort_column is id_column else [sort_column, id_column]
+    query = query.order_by(*[column.desc() if descending else column for column in order])
+
+    items = query.options(*options).limit(limit + 1).all()
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        next_cursor = _encode_cursor([getattr(last, sort_column.key), getattr(last, id_column.key)])
+
+    return Page(items, limit, sort, next_cursor=next_cursor, total=total)
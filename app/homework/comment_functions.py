@@ -1,6 +1,7 @@
 """Functions to manipulate Comments."""
-from flask import g, jsonify
+from flask import g
 from app import db
+from app.encoding import jsonify
 from app.exceptions import UnauthorizedError
 from app.helper import json_from_request, check_keys, get_record_by_id
 from app.homework.models import Submission, Comment
@@ -1,13 +1,16 @@
 """Essay Functions."""
 import datetime
 
-from flask import g, jsonify
+from flask import g
 
 from app import db
+from app.encoding import jsonify
 from app.exceptions import UnauthorizedError, CustomError
 from app.helper import json_from_request, check_keys, get_record_by_id
 from app.homework.models import Essay, HomeworkType, Question, QuizAnswer, QuizSubmission, EssaySubmission
+from app.homework.status_functions import rebuild_statuses, record_submission
 from app.lessons.models import Lesson
+from app.timetable.cache_functions import invalidate_calendars
 
 
 def create_essay(request):
@@ -46,6 +49,9 @@ def create_essay(request):
     )
 
     db.session.add(essay)
+    db.session.flush()
+    rebuild_statuses(homework_id=essay.id)
+    invalidate_calendars(essay.lesson_id)
     db.session.commit()
 
     return jsonify(essay.to_dict()), 201
@@ -76,6 +82,8 @@ def submit_essay(request, essay_id):
     )
 
     db.session.add(submission)
+    db.session.flush()
+    record_submission(submission)
     db.session.commit()
 
     return jsonify({'success': True}), 201
@@ -0,0 +1,124 @@
+"""Functions to stream submissions and grades for a homework, lesson or school as NDJSON or CSV."""
+import csv
+import io
+
+from flask import Response, current_app, g, stream_with_context
+from sqlalchemy import func
+
+from app import db
+from app.encoding import dumps
+from app.exceptions import CustomError
+from app.helper import get_int_query_param
+from app.homework.models import Comment, EssaySubmission, Homework, HomeworkType, QuizSubmission, Submission
+from app.lessons.models import Lesson
+from app.user.models import User
+
+EXPORT_COLUMNS = [
+    'submission_id', 'homework_id', 'homework_title', 'homework_type', 'date_due', 'lesson_id', 'lesson_name',
+    'user_id', 'username', 'first_name', 'last_name', 'datetime_submitted', 'quiz_score', 'essay_length',
+    'comment_count'
+]
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv'
+}
+
+
+def export_query(school_id, homework_id=None, lesson_id=None):
+    """One flat row per submission so nothing is loaded lazily while streaming."""
+    comment_count = db.session.query(func.count(Comment.id)) \
+        .filter(Comment.submission_id == Submission.id) \
+        .correlate(Submission) \
+        .as_scalar()
+
+    query = db.session.query(
+        Submission.id,
+        Homework.id,
+        Homework.title,
+        Homework.type_id,
+        Homework.date_due,
+        Lesson.id,
+        Lesson.name,
+        User.id,
+        User.username,
+        User.first_name,
+        User.last_name,
+        Submission.datetime_submitted,
+        QuizSubmission.total_score,
+        func.length(EssaySubmission.text),
+        comment_count
+    ) \
+        .select_from(Submission) \
+        .join(Homework, Homework.id == Submission.homework_id) \
+        .join(Lesson, Lesson.id == Homework.lesson_id) \
+        .join(User, User.id == Submission.user_id) \
+        .outerjoin(QuizSubmission.__table__, QuizSubmission.id == Submission.id) \
+        .outerjoin(EssaySubmission.__table__, EssaySubmission.id == Submission.id) \
+        .filter(Lesson.school_id == school_id) \
+        .order_by(Lesson.id, Homework.id, Submission.id)
+
+    if homework_id is not None:
+        query = query.filter(Homework.id == homework_id)
+    if lesson_id is not None:
+        query = query.filter(Lesson.id == lesson_id)
+    return query
+
+
+def export_rows(query, batch_size):
+    # stream_results uses a server side cursor where the driver supports one, yield_per fetches in batches
+    rows = query.execution_options(stream_results=True).yield_per(batch_size)
+    for row in rows:
+        row = dict(zip(EXPORT_COLUMNS, row))
+        row['homework_type'] = HomeworkType(row['homework_type']).name
+        row['date_due'] = row['date_due'].isoformat() if row['date_due'] is not None else None
+        row['datetime_submitted'] = row['datetime_submitted'].isoformat() \
+            if row['datetime_submitted'] is not None else None
+        yield row
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield dumps(row) + b'\n'
+
+
+def csv_lines(rows, rows_per_write=500):
+    """Write rows to a small buffer and yield it every rows_per_write rows."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    for i, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if i % rows_per_write == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def submissions_export(request):
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        raise CustomError(409, message="Invalid format: {}. Must be ndjson or csv.".format(export_format))
+
+    homework_id = get_int_query_param(request, 'homework_id')
+    lesson_id = get_int_query_param(request, 'lesson_id')
+    school_id = g.user.school_id
+
+    # Check ids before streaming starts so an error can still be returned
+    if homework_id is not None:
+        homework = Homework.query.join(Lesson).filter(Homework.id == homework_id, Lesson.school_id == school_id)
+        if homework.first() is None:
+            raise CustomError(409, message="Invalid homework_id.")
+    if lesson_id is not None:
+        if Lesson.query.filter_by(id=lesson_id, school_id=school_id).first() is None:
+            raise CustomError(409, message="Invalid lesson_id.")
+
+    rows = export_rows(
+        export_query(school_id, homework_id=homework_id, lesson_id=lesson_id),
+        current_app.config.get('EXPORT_BATCH_SIZE', 1000)
+    )
+    lines = ndjson_lines(rows) if export_format == 'ndjson' else csv_lines(rows)
+
+    response = Response(stream_with_context(lines), mimetype=EXPORT_FORMATS[export_format])
+    response.headers['Content-Disposition'] = 'attachment; filename=submissions.{}'.format(export_format)
+    return response
@@ -0,0 +1,81 @@
+"""Functions to load homework and submissions in bulk."""
+from sqlalchemy import and_
+from sqlalchemy.orm import joinedload, with_polymorphic
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app import db
+from app.homework.models import Homework, Question, Quiz, QuizAnswer, QuizSubmission, Submission
+from app.lessons.models import lesson_student
+
+
+def load_questions(quizzes):
+    """Fill in quiz.questions for every quiz using one query."""
+    questions = {quiz.id: [] for quiz in quizzes}
+    if not questions:
+        return
+
+    query = Question.query.filter(Question.homework_id.in_(list(questions.keys()))).order_by(Question.id)
+    for question in query:
+        questions[question.homework_id].append(question)
+
+    for quiz in quizzes:
+        set_committed_value(quiz, 'questions', questions[quiz.id])
+
+
+def load_answers(submissions):
+    """Fill in submission.answers for every QuizSubmission using one query."""
+    answers = {submission.id: [] for submission in submissions}
+    if not answers:
+        return
+
+    query = QuizAnswer.query.filter(QuizAnswer.submission_id.in_(list(answers.keys()))).order_by(QuizAnswer.id)
+    for answer in query:
+        answers[answer.submission_id].append(answer)
+
+    for submission in submissions:
+        set_committed_value(submission, 'answers', answers[submission.id])
+
+
+def homework_summary(user_id, nest_lessons=False):
+    """
+    Return all homework set for lessons a student attends, with the student's submission for each.
+
+    Uses a fixed number of queries however much homework there is.
+    """
+    homework_entity = with_polymorphic(Homework, '*')
+    submission_entity = with_polymorphic(Submission, '*', flat=True)
+    lesson_ids = db.session.query(lesson_student.c.lesson_id).filter(lesson_student.c.user_id == user_id)
+
+    query = db.session.query(homework_entity, submission_entity) \
+        .outerjoin(submission_entity, and_(
+            submission_entity.homework_id == homework_entity.id,
+            submission_entity.user_id == user_id
+        )) \
+        .filter(homework_entity.lesson_id.in_(lesson_ids.subquery())) \
+        .order_by(homework_entity.id, submission_entity.id)
+
+    if nest_lessons:
+        query = query.options(joinedload(homework_entity.lesson))
+
+    homework = []
+    submissions = {}
+    for homework_item, submission in query:
+        # A student can submit more than once, only the first submission is shown
+        if homework and homework[-1].id == homework_item.id:
+            continue
+        homework.append(homework_item)
+        if submission is not None:
+            submissions[homework_item.id] = submission
+
+    load_questions([h for h in homework if isinstance(h, Quiz)])
+    load_answers([s for s in submissions.values() if isinstance(s, QuizSubmission)])
+
+    return [
+        h.to_dict(
+            date_as_string=True,
+            nest_lesson=nest_lessons,
+            has_submitted=True,
+            user_id=user_id,
+            submissions=submissions
+        ) for h in homework
+    ]
@@ -0,0 +1,119 @@
+"""Functions to mark quiz answers against a quiz's answer key."""
+from flask import current_app
+from sqlalchemy import and_, case, false, func, or_, select, true
+
+from app import db
+from app.homework.models import Question, QuizAnswer, QuizSubmission, Submission
+
+
+class MarkingRules:
+    """How an answer is compared to the correct answer."""
+    def __init__(self, fold_case=True, strip_whitespace=True, numeric_tolerance=None):
+        self.fold_case = fold_case
+        self.strip_whitespace = strip_whitespace
+        # If set, answers which are both numbers are correct if within this distance of each other
+        self.numeric_tolerance = numeric_tolerance
+
+    @classmethod
+    def from_config(cls, config=None):
+        if config is None:
+            config = current_app.config
+        return cls(
+            fold_case=config.get('QUIZ_MARKING_FOLD_CASE', True),
+            strip_whitespace=config.get('QUIZ_MARKING_STRIP_WHITESPACE', True),
+            numeric_tolerance=config.get('QUIZ_MARKING_NUMERIC_TOLERANCE')
+        )
+
+    def normalise(self, answer):
+        if answer is None:
+            return ''
+        answer = str(answer)
+        if self.strip_whitespace:
+            answer = answer.strip()
+        if self.fold_case:
+            answer = answer.casefold()
+        return answer
+
+    def is_correct(self, answer, correct_answer):
+        answer = self.normalise(answer)
+        correct_answer = self.normalise(correct_answer)
+        if answer == correct_answer:
+            return True
+
+        if self.numeric_tolerance is not None:
+            try:
+                return abs(float(answer) - float(correct_answer)) <= self.numeric_tolerance
+            except ValueError:
+                return False
+        return False
+
+
+def load_answer_key(quiz_id):
+    """Return {question_id: answer} for a quiz using one query."""
+    query = db.session.query(Question.id, Question.question_answer).filter(Question.homework_id == quiz_id)
+    return {question_id: answer for question_id, answer in query}
+
+
+def mark_answers(answers, answer_key, rules=None):
+    """Set correct on each QuizAnswer in memory and return the number correct."""
+    if rules is None:
+        rules = MarkingRules.from_config()
+
+    score = 0
+    for answer in answers:
+        correct_answer = answer_key.get(answer.question_id)
+        answer.correct = correct_answer is not None and rules.is_correct(answer.answer, correct_answer)
+        if answer.correct:
+            score += 1
+    return score
+
+
+def remark_quiz(quiz_id, rules=None):
+    """
+    Re-mark every submission for a quiz, e.g. after its answer key changes.
+
+    Only the distinct answers given to each question are compared in Python. Answers are then updated with a
+    single UPDATE and scores with another, without loading any submissions. Does not commit.
+    """
+    if rules is None:
+        rules = MarkingRules.from_config()
+    answer_key = load_answer_key(quiz_id)
+
+    submission_table = Submission.__table__
+    answer_table = QuizAnswer.__table__
+    quiz_submission_table = QuizSubmission.__table__
+    submission_ids = select([submission_table.c.id]).where(submission_table.c.homework_id == quiz_id)
+
+    given_answers = db.session.query(QuizAnswer.question_id, QuizAnswer.answer) \
+        .filter(QuizAnswer.submission_id.in_(submission_ids)) \
+        .distinct()
+
+    correct_answers = {}
+    for question_id, answer in given_answers:
+        if question_id in answer_key and rules.is_correct(answer, answer_key[question_id]):
+            correct_answers.setdefault(question_id, []).append(answer)
+
+    if correct_answers:
+        is_correct = or_(*[
+            and_(answer_table.c.question_id == question_id, answer_table.c.answer.in_(answers))
+            for question_id, answers in correct_answers.items()
+        ])
+    else:
+        is_correct = false()
+
+    db.session.execute(
+        answer_table.update()
+        .where(answer_table.c.submission_id.in_(submission_ids))
+        .values(correct=case([(is_correct, true())], else_=false()))
+    )
+
+    score = select([func.count(answer_table.c.id)]).where(and_(
+        answer_table.c.submission_id == quiz_submission_table.c.id,
+        answer_table.c.correct == true()
+    )).as_scalar()
+
+    db.session.execute(
+        quiz_submission_table.update()
+        .where(quiz_submission_table.c.id.in_(submission_ids))
+        .values(total_score=score)
+    )
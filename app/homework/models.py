@@ -20,6 +20,10 @@ class Type(db.Model):
 
 class Homework(db.Model):
     """Model representing a homework which can be assigned to a submission."""
+    __table_args__ = (
+        db.Index('ix_homework_lesson_id_date_due', 'lesson_id', 'date_due'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     lesson_id = db.Column(db.Integer, db.ForeignKey('lesson.id'))
     title = db.Column(db.String(200))
@@ -45,7 +49,7 @@ class Homework(db.Model):
         self.type_id = type_id
         self.date_due = date_due
 
-    def to_dict(self, date_as_string=False, nest_lesson=False, has_submitted=False, user_id=None):
+    def to_dict(self, date_as_string=False, nest_lesson=False, has_submitted=False, user_id=None, submissions=None):
         homework_dict = {
             'id': self.id,
             'lesson_id': self.lesson_id,
@@ -59,7 +63,11 @@ class Homework(db.Model):
             homework_dict['lesson'] = self.lesson.to_dict()
 
         if has_submitted:
-            submission = Submission.query.filter_by(user_id=user_id, homework_id=self.id).first()
+            if submissions is None:
+                submission = Submission.query.filter_by(user_id=user_id, homework_id=self.id).first()
+            else:
+                # Submissions by user_id have already been fetched, keyed by homework id
+                submission = submissions.get(self.id)
             has_submitted = not (submission is None)
             homework_dict['submitted'] = has_submitted
             if has_submitted:
@@ -72,7 +80,7 @@ class Quiz(Homework):
     id = db.Column(db.Integer, db.ForeignKey('homework.id'), primary_key=True)
     number_of_questions = db.Column(db.Integer)
 
-    questions = db.relationship('Question', backref='quiz', lazy='dynamic')
+    questions = db.relationship('Question', backref='quiz')
 
     __mapper_args__ = {
         'polymorphic_identity': HomeworkType.QUIZ.value,
@@ -82,8 +90,8 @@ class Quiz(Homework):
         super().__init__(lesson_id, title, description, HomeworkType.QUIZ.value, date_due)
         self.number_of_questions = number_of_questions
 
-    def to_dict(self, date_as_string=False, nest_lesson=False, has_submitted=False, user_id=None):
-        dictionary = super().to_dict(date_as_string, nest_lesson, has_submitted, user_id)
+    def to_dict(self, date_as_string=False, nest_lesson=False, has_submitted=False, user_id=None, submissions=None):
+        dictionary = super().to_dict(date_as_string, nest_lesson, has_submitted, user_id, submissions)
         dictionary['number_of_questions'] = self.number_of_questions
         dictionary['questions'] = [q.to_dict() for q in self.questions]
         return dictionary
@@ -101,6 +109,14 @@ class Essay(Homework):
 
 
 class Submission(db.Model):
+    __table_args__ = (
+        db.Index('ix_submission_homework_id_user_id', 'homework_id', 'user_id'),
+        db.Index('ix_submission_user_id_homework_id', 'user_id', 'homework_id'),
+        # Listings are ordered by id
+        db.Index('ix_submission_homework_id_id', 'homework_id', 'id'),
+        db.Index('ix_submission_user_id_id', 'user_id', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     homework_id = db.Column(db.Integer, db.ForeignKey('homework.id'))
     type_id = db.Column(db.Integer, db.ForeignKey('type.id'))
@@ -169,7 +185,7 @@ class QuizAnswer(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     answer = db.Column(db.String(120))
     submission_id = db.Column(db.Integer, db.ForeignKey('submission.id'))
-    question_id = db.Column(db.Integer, db.ForeignKey('question.id'))
+    question_id = db.Column(db.Integer, db.ForeignKey('question.id'), index=True)
     correct = db.Column(db.Boolean)
 
     def __init__(self, answer, submission_id, question_id):
@@ -191,7 +207,7 @@ class QuizSubmission(Submission):
     id = db.Column(db.Integer, db.ForeignKey('submission.id'), primary_key=True)
     total_score = db.Column(db.Integer)
 
-    answers = db.relationship(QuizAnswer, backref='submission', lazy='dynamic')
+    answers = db.relationship(QuizAnswer, backref='submission')
 
     __mapper_args__ = {
         'polymorphic_identity': HomeworkType.QUIZ.value,
@@ -201,16 +217,12 @@ class QuizSubmission(Submission):
         super().__init__(homework_id, HomeworkType.QUIZ.value, user_id, datetime_submitted)
         self.total_score = 0
 
-    def mark(self):
-        score = 0
-        # TODO: Refactor to make more efficient
-        for answer in self.answers:
-            answer.correct = False
-            question = Question.query.get(answer.question_id)
-            if question.question_answer == answer.answer:
-                score += 1
-                answer.correct = True
-        self.total_score = score
+    def mark(self, answer_key=None, rules=None):
+        """Mark all answers in memory against the quiz's {question_id: answer} answer key."""
+        from app.homework.marking_functions import load_answer_key, mark_answers
+        if answer_key is None:
+            answer_key = load_answer_key(self.homework_id)
+        self.total_score = mark_answers(self.answers, answer_key, rules)
 
     def to_dict(self, **kwargs):
         submission_dict = super().to_dict(**kwargs)
@@ -221,7 +233,7 @@ class QuizSubmission(Submission):
 
 class Question(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    homework_id = db.Column(db.Integer, db.ForeignKey('homework.id'))
+    homework_id = db.Column(db.Integer, db.ForeignKey('homework.id'), index=True)
     question_text = db.Column(db.String(120))
     question_answer = db.Column(db.String(120))
 
@@ -241,7 +253,7 @@ class Question(db.Model):
 
 class Comment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    submission_id = db.Column(db.Integer, db.ForeignKey('submission.id'))
+    submission_id = db.Column(db.Integer, db.ForeignKey('submission.id'), index=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     text = db.Column(db.Text)
 
@@ -262,3 +274,31 @@ class Comment(db.Model):
         if nest_user:
             dictionary['user'] = self.user.to_dict()
         return dictionary
+
+
+class SubmissionStatus(Enum):
+    NOT_SUBMITTED = 0
+    SUBMITTED = 1
+
+
+class HomeworkStatus(db.Model):
+    """
+    One row per student and homework set for a lesson they attend, with their first submission.
+
+    Denormalised so dashboards are a single indexed read. Kept up to date by app/homework/status_functions.py.
+    """
+    __tablename__ = 'homework_status'
+    __table_args__ = (
+        # Listings are ordered by (date_due, homework_id) for a student and by user_id for a homework
+        db.Index('ix_homework_status_user_id_date_due_homework_id', 'user_id', 'date_due', 'homework_id'),
+        db.Index('ix_homework_status_homework_id_user_id', 'homework_id', 'user_id'),
+    )
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    homework_id = db.Column(db.Integer, db.ForeignKey('homework.id', ondelete='CASCADE'), primary_key=True)
+    lesson_id = db.Column(db.Integer, db.ForeignKey('lesson.id', ondelete='CASCADE'), index=True)
+    date_due = db.Column(db.Date)
+    status = db.Column(db.Integer, nullable=False, default=SubmissionStatus.NOT_SUBMITTED.value)
+    submission_id = db.Column(db.Integer, db.ForeignKey('submission.id', ondelete='SET NULL'), nullable=True)
+    score = db.Column(db.Integer, nullable=True)
+    submitted_at = db.Column(db.DateTime, nullable=True)
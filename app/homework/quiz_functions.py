@@ -1,13 +1,18 @@
 """Homework Functions."""
 import datetime
 
-from flask import g, jsonify
+from flask import g
 
 from app import db
+from app.encoding import jsonify
 from app.exceptions import UnauthorizedError, CustomError
 from app.helper import json_from_request, check_keys, get_record_by_id
+from app.homework.marking_functions import load_answer_key, mark_answers, remark_quiz
 from app.homework.models import Quiz, HomeworkType, Question, QuizAnswer, QuizSubmission
+from app.homework.status_functions import rebuild_statuses, record_submission
+from app.lessons.helper_functions import is_student
 from app.lessons.models import Lesson
+from app.timetable.cache_functions import invalidate_calendars
 
 
 def create_quiz(request):
@@ -34,6 +39,16 @@ def create_quiz(request):
     except ValueError:
         raise CustomError(409, message="Invalid date_due: {}.".format(json_data['date_due']))
 
+    # Checked before anything is written so an invalid question leaves no quiz behind
+    if not isinstance(json_data['questions'], list):
+        raise CustomError(409, message="questions must be a list of questions.")
+    for question_object in json_data['questions']:
+        if not isinstance(question_object, dict) or not {'answer', 'question_text'} <= question_object.keys():
+            raise CustomError(
+                409,
+                message="Invalid object in questions array. Make sure it has a question and a answer."
+            )
+
     quiz = Quiz(
         lesson_id=json_data['lesson_id'],
         title=json_data['title'],
@@ -42,20 +57,17 @@ def create_quiz(request):
         number_of_questions=len(json_data['questions'])
     )
 
+    # Flushed for its id, the quiz, questions and statuses are committed together
     db.session.add(quiz)
-    db.session.commit()
+    db.session.flush()
 
     for question_object in json_data['questions']:
-        if 'answer' and 'question_text' not in question_object.keys():
-            raise CustomError(
-                409,
-                message="Invalid object in questions array. Make sure it has a question and a answer."
-            )
         question = Question(quiz.id, question_object['question_text'], question_object['answer'])
         db.session.add(question)
         quiz.questions.append(question)
 
-    db.session.add(quiz)
+    rebuild_statuses(homework_id=quiz.id)
+    invalidate_calendars(quiz.lesson_id)
     db.session.commit()
     return jsonify(quiz.to_dict()), 201
 
@@ -73,29 +85,44 @@ def submit_quiz(request, quiz_id):
     check_keys(expected_top_keys, json_data)
 
     #  Validate lesson
-    lesson = get_record_by_id(quiz.lesson.id, Lesson)
-    if g.user.id not in [t.id for t in lesson.students]:
+    if not is_student(quiz.lesson_id, g.user.id):
         raise UnauthorizedError()
 
-    question_ids = [question.id for question in quiz.questions]
+    # Answer key is used both to validate question ids and to mark the answers
+    answer_key = load_answer_key(quiz.id)
+
+    if not isinstance(json_data['answers'], list) or \
+            any(not isinstance(answer_object, dict) for answer_object in json_data['answers']):
+        raise CustomError(409, message="answers must be a list of answers.")
+
+    answers = []
+    question_ids = set()
+    for answer_object in json_data['answers']:
+        check_keys(expected_inner_keys, answer_object)
+        question_id = answer_object['question_id']
+        if not isinstance(question_id, int) or isinstance(question_id, bool) or question_id not in answer_key:
+            raise CustomError(409, message="Invalid question_id: {}".format(question_id))
+        if question_id in question_ids:
+            raise CustomError(409, message="Duplicate question_id: {}".format(question_id))
+        question_ids.add(question_id)
+        answers.append(QuizAnswer(answer_object['answer'], None, question_id))
 
     submission = QuizSubmission(
         homework_id=quiz.id,
         user_id=g.user.id,
         datetime_submitted=datetime.datetime.now()  # TODO: Deal with timezones
     )
+    submission.total_score = mark_answers(answers, answer_key)
 
-    for answer in json_data['answers']:
-        check_keys(expected_inner_keys, answer)
-        question = get_record_by_id(answer['question_id'], Question, check_school_id=False)
-        if question.id not in question_ids:
-            raise UnauthorizedError()
+    db.session.add(submission)
+    db.session.flush()
 
-        answer = QuizAnswer(answer['answer'], submission.id, question.id)
-        submission.answers.append(answer)
+    # Answers are written with a single executemany INSERT
+    for answer in answers:
+        answer.submission_id = submission.id
+    db.session.bulk_save_objects(answers)
 
-    submission.mark()
-    db.session.add(submission)
+    record_submission(submission, score=submission.total_score)
     db.session.commit()
     return jsonify({'score': submission.total_score})
 
@@ -107,3 +134,31 @@ def quiz_detail(request, quiz_id):
         raise UnauthorizedError()
 
     return jsonify({'success': True, 'quiz': quiz.to_dict()})
+
+
+def question_update(request, quiz_id, question_id):
+    """Update a question, re-marking every submission for the quiz if the answer changes."""
+    quiz = get_record_by_id(quiz_id, Quiz, check_school_id=False)
+    if quiz.lesson.school_id != g.user.school_id:
+        raise UnauthorizedError()
+    if g.user.id not in [t.id for t in quiz.lesson.teachers]:
+        raise UnauthorizedError()
+
+    question = get_record_by_id(question_id, Question, check_school_id=False)
+    if question.homework_id != quiz.id:
+        raise UnauthorizedError()
+
+    data = json_from_request(request)
+
+    if 'question_text' in data.keys():
+        question.question_text = data['question_text']
+
+    if 'answer' in data.keys() and data['answer'] != question.question_answer:
+        question.question_answer = data['answer']
+        db.session.flush()
+        remark_quiz(quiz.id)
+        rebuild_statuses(homework_id=quiz.id)
+
+    db.session.add(question)
+    db.session.commit()
+    return jsonify({'success': True, 'message': 'Updated.'})
@@ -0,0 +1,55 @@
+from app.serializers import Schema
+from app.user.schemas import UserSchema
+
+from .models import Comment, Homework, HomeworkStatus, HomeworkType, SubmissionStatus, Question, Quiz, QuizAnswer, \
+    EssaySubmission, QuizSubmission, Submission
+
+QuestionSchema = Schema(Question, ['homework_id', 'question_text', ('answer', lambda q: q.question_answer), 'id'])
+HomeworkSchema = Schema(
+    Homework,
+    [
+        'id',
+        'lesson_id',
+        'title',
+        'description',
+        ('type', lambda h: HomeworkType(h.type_id).name),
+        ('date_due', lambda h: h.date_due.strftime('%d/%m/%Y'))
+    ],
+    subtypes={
+        Quiz: Schema(Quiz, ['number_of_questions'], nested={'questions': QuestionSchema})
+    }
+)
+CommentSchema = Schema(Comment, ['id', 'submission_id', 'text', 'user_id'])
+CommentWithUserSchema = CommentSchema.nest(user=UserSchema)
+QuizAnswerSchema = Schema(QuizAnswer, ['answer', 'id', 'submission_id', 'question_id', 'correct'])
+
+SubmissionSchema = Schema(
+    Submission,
+    [
+        'id',
+        'homework_id',
+        'user_id',
+        'type_id',
+        ('type', lambda s: HomeworkType(s.type_id).name),
+        'datetime_submitted'
+    ],
+    subtypes={
+        EssaySubmission: Schema(EssaySubmission, ['text']),
+        QuizSubmission: Schema(
+            QuizSubmission,
+            [('score', lambda s: s.total_score)],
+            nested={'answers': QuizAnswerSchema}
+        )
+    }
+)
+
+HomeworkStatusSchema = Schema(HomeworkStatus, [
+    'user_id',
+    'homework_id',
+    'lesson_id',
+    ('date_due', lambda s: s.date_due.strftime('%d/%m/%Y')),
+    ('status', lambda s: SubmissionStatus(s.status).name),
+    'submission_id',
+    'score',
+    'submitted_at'
+])
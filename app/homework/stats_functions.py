@@ -0,0 +1,146 @@
+"""Functions to summarise a quiz's results with SQL aggregates."""
+import math
+
+from flask import g
+from sqlalchemy import case, distinct, func, select, true
+
+from app import db
+from app.encoding import jsonify
+from app.exceptions import NotFoundError, UnauthorizedError
+from app.homework.models import Homework, HomeworkType, Question, QuizAnswer, QuizSubmission, Submission
+from app.lessons.models import Lesson, lesson_student
+
+PERCENTILES = [10, 25, 50, 75, 90]
+
+
+def first_submission_ids(quiz_id):
+    """
+    Select the id of each student's first submission to a quiz, the one their homework status shows, so a student
+    who resubmits is only counted once.
+    """
+    submission = Submission.__table__
+    return select([func.min(submission.c.id)]) \
+        .where(submission.c.homework_id == quiz_id) \
+        .group_by(submission.c.user_id)
+
+
+def score_distribution(quiz_id):
+    """Return {score: number of students} from each student's first submission using one GROUP BY."""
+    quiz_submission = QuizSubmission.__table__
+    # Unmarked submissions count as 0, grouped with those marked 0
+    score = func.coalesce(quiz_submission.c.total_score, 0)
+    query = db.session.query(score, func.count()) \
+        .filter(quiz_submission.c.id.in_(first_submission_ids(quiz_id))) \
+        .group_by(score)
+    return dict(query.all())
+
+
+def percentile(distribution, p):
+    """
+    Return the pth percentile of the scores in a {score: count} distribution, interpolating between scores.
+
+    Works on the counts rather than one value per submission, so it costs the same however many submitted.
+    """
+    total = sum(distribution.values())
+    if total == 0:
+        return None
+
+    def score_at(index):
+        seen = 0
+        for score in sorted(distribution):
+            seen += distribution[score]
+            if index < seen:
+                return score
+
+    rank = p / 100 * (total - 1)
+    lower = score_at(math.floor(rank))
+    upper = score_at(math.ceil(rank))
+    return lower + (upper - lower) * (rank - math.floor(rank))
+
+
+def score_summary(distribution, number_of_questions):
+    total = sum(distribution.values())
+    top_score = max([number_of_questions] + list(distribution.keys()))
+    summary = {
+        'histogram': [{'score': score, 'count': distribution.get(score, 0)} for score in range(0, top_score + 1)],
+        'mean': sum(score * count for score, count in distribution.items()) / total if total else None,
+        'median': percentile(distribution, 50),
+        'percentiles': {str(p): percentile(distribution, p) for p in PERCENTILES},
+        'min': min(distribution) if total else None,
+        'max': max(distribution) if total else None
+    }
+    return summary
+
+
+def question_stats(quiz_id):
+    """Return the number of answers and correct answers to each question in first submissions using one GROUP BY."""
+    answers = db.session.query(
+        QuizAnswer.question_id.label('question_id'),
+        func.count(QuizAnswer.id).label('answer_count'),
+        func.sum(case([(QuizAnswer.correct == true(), 1)], else_=0)).label('correct_count')
+    ) \
+        .filter(QuizAnswer.submission_id.in_(first_submission_ids(quiz_id))) \
+        .group_by(QuizAnswer.question_id) \
+        .subquery()
+
+    query = db.session.query(Question.id, Question.question_text, answers.c.answer_count, answers.c.correct_count) \
+        .outerjoin(answers, answers.c.question_id == Question.id) \
+        .filter(Question.homework_id == quiz_id) \
+        .order_by(Question.id)
+
+    stats = []
+    for question_id, question_text, answer_count, correct_count in query:
+        answer_count = answer_count or 0
+        correct_count = correct_count or 0
+        stats.append({
+            'question_id': question_id,
+            'question_text': question_text,
+            'answer_count': answer_count,
+            'correct_count': correct_count,
+            'correct_rate': correct_count / answer_count if answer_count else None
+        })
+    return stats
+
+
+def submission_counts(quiz_id, lesson_id):
+    """Return (number of students who submitted, students in the lesson, students in the lesson yet to submit)."""
+    submission = Submission.__table__
+    submission_count = db.session.query(func.count(distinct(submission.c.user_id))) \
+        .filter(submission.c.homework_id == quiz_id) \
+        .scalar()
+
+    student_ids = db.session.query(lesson_student.c.user_id).filter(lesson_student.c.lesson_id == lesson_id)
+    student_count = db.session.query(func.count(distinct(lesson_student.c.user_id))) \
+        .filter(lesson_student.c.lesson_id == lesson_id) \
+        .scalar()
+    submitted_count = db.session.query(func.count(distinct(submission.c.user_id))) \
+        .filter(submission.c.homework_id == quiz_id, submission.c.user_id.in_(student_ids.subquery())) \
+        .scalar()
+    return submission_count, student_count, student_count - submitted_count
+
+
+def quiz_stats(request, quiz_id):
+    quiz = db.session.query(Lesson.id, Lesson.school_id) \
+        .join(Homework, Homework.lesson_id == Lesson.id) \
+        .filter(Homework.id == quiz_id, Homework.type_id == HomeworkType.QUIZ.value) \
+        .first()
+    if quiz is None:
+        raise NotFoundError()
+    lesson_id, school_id = quiz
+    if school_id != g.user.school_id:
+        raise UnauthorizedError()
+
+    questions = question_stats(quiz_id)
+    submission_count, student_count, not_submitted_count = submission_counts(quiz_id, lesson_id)
+
+    return jsonify({
+        'success': True,
+        'stats': {
+            'quiz_id': quiz_id,
+            'submission_count': submission_count,
+            'student_count': student_count,
+            'not_submitted_count': not_submitted_count,
+            'scores': score_summary(score_distribution(quiz_id), len(questions)),
+            'questions': questions
+        }
+    })
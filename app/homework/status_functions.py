@@ -0,0 +1,123 @@
+"""
+Functions to keep homework_status up to date.
+
+Each row is written from homework, lesson_student and submission with one INSERT ... SELECT, so the rows for a
+homework, a student or the whole table are rebuilt in the same way.
+"""
+from sqlalchemy import and_, case, func, select
+
+from app import db
+from app.homework.models import Homework, HomeworkStatus, QuizSubmission, Submission, SubmissionStatus
+from app.lessons.models import lesson_student
+
+STATUS_COLUMNS = [
+    'user_id', 'homework_id', 'lesson_id', 'date_due', 'submission_id', 'status', 'score', 'submitted_at'
+]
+
+
+def _criteria(table, homework_id=None, lesson_id=None, user_ids=None):
+    criteria = []
+    if homework_id is not None:
+        criteria.append(table.c.homework_id == homework_id)
+    if lesson_id is not None:
+        criteria.append(table.c.lesson_id == lesson_id)
+    if user_ids is not None:
+        criteria.append(table.c.user_id.in_(user_ids))
+    return criteria
+
+
+def status_select(homework_id=None, lesson_id=None, user_ids=None):
+    """Select a status row for each student of each homework, using their first submission if there is one."""
+    homework = Homework.__table__
+    submission = Submission.__table__
+    quiz_submission = QuizSubmission.__table__
+
+    first_submission = select([
+        submission.c.user_id,
+        submission.c.homework_id,
+        func.min(submission.c.id).label('id')
+    ]).group_by(submission.c.user_id, submission.c.homework_id)
+    if homework_id is not None:
+        first_submission = first_submission.where(submission.c.homework_id == homework_id)
+    if user_ids is not None:
+        first_submission = first_submission.where(submission.c.user_id.in_(user_ids))
+    first_submission = first_submission.alias('first_submission')
+
+    chosen = submission.alias('chosen_submission')
+    query = select([
+        lesson_student.c.user_id,
+        homework.c.id,
+        homework.c.lesson_id,
+        homework.c.date_due,
+        chosen.c.id,
+        case(
+            [(chosen.c.id.is_(None), SubmissionStatus.NOT_SUBMITTED.value)],
+            else_=SubmissionStatus.SUBMITTED.value
+        ),
+        quiz_submission.c.total_score,
+        chosen.c.datetime_submitted
+    ]).select_from(
+        homework
+        .join(lesson_student, lesson_student.c.lesson_id == homework.c.lesson_id)
+        .outerjoin(first_submission, and_(
+            first_submission.c.user_id == lesson_student.c.user_id,
+            first_submission.c.homework_id == homework.c.id
+        ))
+        .outerjoin(chosen, chosen.c.id == first_submission.c.id)
+        .outerjoin(quiz_submission, quiz_submission.c.id == chosen.c.id)
+    )
+
+    if homework_id is not None:
+        query = query.where(homework.c.id == homework_id)
+    if lesson_id is not None:
+        query = query.where(homework.c.lesson_id == lesson_id)
+    if user_ids is not None:
+        query = query.where(lesson_student.c.user_id.in_(user_ids))
+    return query
+
+
+def remove_statuses(homework_id=None, lesson_id=None, user_ids=None):
+    table = HomeworkStatus.__table__
+    db.session.execute(table.delete().where(and_(*_criteria(table, homework_id, lesson_id, user_ids))))
+
+
+def rebuild_statuses(homework_id=None, lesson_id=None, user_ids=None):
+    """
+    Rewrite the status rows for a homework, a lesson and/or some students, or every row if none are given.
+
+    Doesn't commit so the rows are written in the same transaction as the change which caused them.
+    """
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+
+    table = HomeworkStatus.__table__
+    remove_statuses(homework_id, lesson_id, user_ids)
+    db.session.execute(table.insert().from_select(
+        STATUS_COLUMNS,
+        status_select(homework_id=homework_id, lesson_id=lesson_id, user_ids=user_ids)
+    ))
+
+
+def record_submission(submission, score=None):
+    """Mark a student's homework as submitted with one UPDATE, unless they had already submitted it."""
+    table = HomeworkStatus.__table__
+    db.session.execute(table.update().where(and_(
+        table.c.user_id == submission.user_id,
+        table.c.homework_id == submission.homework_id,
+        table.c.status == SubmissionStatus.NOT_SUBMITTED.value
+    )).values(
+        status=SubmissionStatus.SUBMITTED.value,
+        submission_id=submission.id,
+        score=score,
+        submitted_at=submission.datetime_submitted
+    ))
+
+
+def lesson_students_changed(lesson_id, added_ids, removed_ids):
+    """Add rows for students who joined a lesson and remove the rows of those who left it."""
+    if removed_ids:
+        remove_statuses(lesson_id=lesson_id, user_ids=removed_ids)
+    if added_ids:
+        rebuild_statuses(lesson_id=lesson_id, user_ids=added_ids)
@@ -1,16 +1,29 @@
 from app.exceptions import UnauthorizedError
-from app.helper import get_boolean_query_param, get_record_by_id
+from app.helper import get_boolean_query_param, get_record_by_id, paginate
 from app.homework.comment_functions import comment_create_view, comment_detail_view, comment_delete_view, \
     comment_update_view
 from app.homework.essay_functions import create_essay, submit_essay, essay_detail
-from app.homework.quiz_functions import create_quiz, submit_quiz, quiz_detail
+from app.homework.export_functions import submissions_export
+from app.homework.helper_functions import homework_summary
+from app.homework.schemas import CommentWithUserSchema, HomeworkSchema, HomeworkStatusSchema, SubmissionSchema
+from app.homework.quiz_functions import create_quiz, submit_quiz, quiz_detail, question_update
+from app.homework.stats_functions import quiz_stats
 from app.permissions.decorators import permissions_required
-from flask import Blueprint, request, g, jsonify
+from flask import Blueprint, request, g
+from app.encoding import jsonify
 from flask_jwt import jwt_required
+from sqlalchemy.orm import selectinload, with_polymorphic
+from app.user.schemas import UserSchema
 from .models import *
 
 homework_blueprint = Blueprint('homework', __name__, url_prefix='/homework')
 
+SUBMISSION_SORT_COLUMNS = {
+    'id': Submission.id,
+    'datetime_submitted': Submission.datetime_submitted,
+    'user_id': Submission.user_id
+}
+
 
 @homework_blueprint.route('/')
 def index():
@@ -21,9 +34,15 @@ def index():
 @jwt_required()
 @permissions_required({'Student'})
 def list_my_submissions():
-    submissions = Submission.query.filter_by(user_id=g.user.id)
-    submissions_list = [s.to_dict(nest_homework=True, nest_comments=True) for s in submissions]
-    return jsonify({'success': True, 'submissions': submissions_list})
+    schema = SubmissionSchema.nest(homework=HomeworkSchema, comments=CommentWithUserSchema)
+    submissions = schema.query().filter_by(user_id=g.user.id)
+    page = paginate(
+        request, submissions,
+        sort_columns=SUBMISSION_SORT_COLUMNS,
+        filters={'homework_id': Submission.homework_id},
+        schema=schema
+    )
+    return jsonify({'success': True, 'submissions': schema.dump_many(page.items), **page.metadata()})
 
 
 @homework_blueprint.route('/homework/<int:homework_id>/submissions')
@@ -33,14 +52,83 @@ def list_submissions(homework_id):
     homework = get_record_by_id(homework_id, Homework, check_school_id=False)
     if homework.lesson.school_id != g.user.school_id:
         raise UnauthorizedError()
-    submissions = Submission.query.filter_by(homework_id=homework.id).all()
-    return jsonify({'success': True, 'submissions': [s.to_dict(nest_user=True) for s in submissions]})
+    schema = SubmissionSchema.nest(user=UserSchema)
+    submissions = schema.query().filter_by(homework_id=homework.id)
+    page = paginate(
+        request, submissions,
+        sort_columns=SUBMISSION_SORT_COLUMNS,
+        filters={'user_id': Submission.user_id},
+        schema=schema
+    )
+    return jsonify({
+        'success': True,
+        'submissions': schema.dump_many(page.items),
+        **page.metadata()
+    })
+
+
+# 'id' breaks ties so must be unique within the listing: the homework for a student, the student for a homework
+MY_STATUS_SORT_COLUMNS = {
+    'id': HomeworkStatus.homework_id,
+    'date_due': HomeworkStatus.date_due
+}
+HOMEWORK_STATUS_SORT_COLUMNS = {
+    'id': HomeworkStatus.user_id,
+    'status': HomeworkStatus.status
+}
+STATUS_FILTERS = {
+    'lesson_id': HomeworkStatus.lesson_id,
+    'status': HomeworkStatus.status
+}
+
+
+@homework_blueprint.route('/status')
+@jwt_required()
+@permissions_required({'Student'})
+def list_my_homework_status():
+    """The current user's homework, whether they have submitted it and their score, from homework_status."""
+    statuses = HomeworkStatus.query.filter_by(user_id=g.user.id)
+    page = paginate(
+        request, statuses,
+        sort_columns=MY_STATUS_SORT_COLUMNS,
+        filters=STATUS_FILTERS,
+        default_sort='date_due'
+    )
+    return jsonify({'success': True, 'statuses': HomeworkStatusSchema.dump_many(page.items), **page.metadata()})
+
+
+@homework_blueprint.route('/homework/<int:homework_id>/status')
+@jwt_required()
+@permissions_required({'Teacher'})
+def list_homework_status(homework_id):
+    homework = get_record_by_id(homework_id, Homework, check_school_id=False)
+    if homework.lesson.school_id != g.user.school_id:
+        raise UnauthorizedError()
+    statuses = HomeworkStatus.query.filter_by(homework_id=homework.id)
+    page = paginate(
+        request, statuses,
+        sort_columns=HOMEWORK_STATUS_SORT_COLUMNS,
+        filters=STATUS_FILTERS
+    )
+    return jsonify({'success': True, 'statuses': HomeworkStatusSchema.dump_many(page.items), **page.metadata()})
+
+
+@homework_blueprint.route('/export')
+@jwt_required()
+@permissions_required({'Teacher'})
+def export_submissions():
+    """Stream submissions for ?homework_id=, ?lesson_id= or the whole school as ?format=ndjson or csv."""
+    return submissions_export(request)
 
 
 @homework_blueprint.route('/due/<int:lesson_id>')
 @jwt_required()
 def homework_due_for_lesson(lesson_id):
-    homework = Homework.query.filter(Homework.lesson_id == lesson_id)
+    # Load each quiz's columns and questions up front rather than per quiz in to_dict
+    homework_entity = with_polymorphic(Homework, '*')
+    homework = db.session.query(homework_entity) \
+        .filter(homework_entity.lesson_id == lesson_id) \
+        .options(selectinload(homework_entity.Quiz.questions))
     return jsonify({'success': True, 'homework': [h.to_dict(date_as_string=True) for h in homework]})
 
 
@@ -48,10 +136,8 @@ def homework_due_for_lesson(lesson_id):
 @jwt_required()
 @permissions_required({"Student"})
 def homework_due_summary():
-    lesson_ids = [l.id for l in g.user.lessons_attending]
-    homework = Homework.query.filter(Homework.lesson_id.in_(lesson_ids))
     nest_lessons = get_boolean_query_param(request, 'nest-lessons')
-    homework_list = [h.to_dict(date_as_string=True, nest_lesson=nest_lessons, has_submitted=True, user_id=g.user.id) for h in homework]
+    homework_list = homework_summary(g.user.id, nest_lessons=nest_lessons)
 
     return jsonify({'success': True, 'homework': homework_list})
 
@@ -74,6 +160,20 @@ def quiz_submit(quiz_id):
     return quiz_detail(request, quiz_id)
 
 
+@homework_blueprint.route('/quiz/<int:quiz_id>/question/<int:question_id>', methods=("PUT",))
+@jwt_required()
+@permissions_required({'Teacher'})
+def quiz_question_update(quiz_id, question_id):
+    return question_update(request, quiz_id, question_id)
+
+
+@homework_blueprint.route('/quiz/<int:quiz_id>/stats')
+@jwt_required()
+@permissions_required({'Teacher'})
+def quiz_stats_view(quiz_id):
+    return quiz_stats(request, quiz_id)
+
+
 @homework_blueprint.route('/quiz/submission/<int:submission_id>')
 @jwt_required()
 def view_quiz_submission(submission_id):
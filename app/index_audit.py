@@ -0,0 +1,176 @@
+"""
+Check the app's hot queries use indexes.
+
+HOT_QUERIES holds the filters, joins and listing pages the *_functions.py modules run most, with placeholder ids.
+audit_indexes runs EXPLAIN on each and reports any table it reads with a sequential scan, and for pages (queries with
+a LIMIT) any sort, as a page read in index order stops after LIMIT rows but a sorted one reads every match first.
+On PostgreSQL sequential scans are disabled for the audit, so one is only chosen when no index can be used, however
+little data the database has.
+"""
+import datetime
+import re
+
+from sqlalchemy import and_, select
+
+from app import db
+from app.helper import NULLS_LAST_DIALECTS, _after_cursor
+from app.homework.models import Comment, Homework, HomeworkStatus, Question, QuizAnswer, Submission
+from app.lessons.models import Lesson, Subject, lesson_student, lesson_teacher
+from app.permissions.models import Permission, Role, role_permissions, user_permissions, user_roles
+from app.timetable.models import Period, TimetabledLesson, Week
+from app.timetable.timetable_functions import member_lessons, single_lesson, timetable_query
+from app.user.models import Form, User
+
+SAMPLE_ID = 1
+PAGE_SIZE = 20
+
+
+def _where(table, *criteria):
+    return select([table]).where(and_(*criteria))
+
+
+def _statement(query):
+    """The SELECT of an ORM query, labelled as its columns repeat names such as id."""
+    return query.with_labels().statement
+
+
+def _page(table, criteria, sort_column, id_column, cursor=None, descending=False):
+    """A page as app.helper.paginate reads it, after cursor (sort value, id) if given."""
+    criteria = [criteria]
+    if cursor is not None:
+        nulls_last = db.session.connection().dialect.name in NULLS_LAST_DIALECTS
+        criteria.append(_after_cursor(sort_column, id_column, cursor[0], cursor[1], descending, nulls_last))
+    order = [sort_column] if sort_column is id_column else [sort_column, id_column]
+    return _where(table, *criteria) \
+        .order_by(*[column.desc() if descending else column for column in order]) \
+        .limit(PAGE_SIZE + 1)
+
+
+HOT_QUERIES = {
+    'users in school': lambda: _where(User.__table__, User.school_id == SAMPLE_ID),
+    'user by username': lambda: _where(User.__table__, User.school_id == SAMPLE_ID, User.username == 'username'),
+    'roles of user': lambda: _where(user_roles, user_roles.c.user_id == SAMPLE_ID),
+    'users with role': lambda: _where(user_roles, user_roles.c.role_id == SAMPLE_ID),
+    'permissions of user': lambda: _where(user_permissions, user_permissions.c.user_id == SAMPLE_ID),
+    'permissions of role': lambda: _where(role_permissions, role_permissions.c.role_id == SAMPLE_ID),
+    'roles in school': lambda: _where(Role.__table__, Role.school_id == SAMPLE_ID),
+    'permissions in school': lambda: _where(Permission.__table__, Permission.school_id == SAMPLE_ID),
+    'forms in school': lambda: _where(Form.__table__, Form.school_id == SAMPLE_ID),
+    'subjects in school': lambda: _where(Subject.__table__, Subject.school_id == SAMPLE_ID),
+    'lessons in school': lambda: _where(Lesson.__table__, Lesson.school_id == SAMPLE_ID),
+    'lesson by name': lambda: _where(Lesson.__table__, Lesson.school_id == SAMPLE_ID, Lesson.name == 'name'),
+    'lessons taught': lambda: _where(lesson_teacher, lesson_teacher.c.user_id == SAMPLE_ID),
+    'lessons attended': lambda: _where(lesson_student, lesson_student.c.user_id == SAMPLE_ID),
+    'students of lesson': lambda: _where(lesson_student, lesson_student.c.lesson_id == SAMPLE_ID),
+    'homework for lesson': lambda: _where(Homework.__table__, Homework.lesson_id == SAMPLE_ID),
+    'questions of quiz': lambda: _where(Question.__table__, Question.homework_id == SAMPLE_ID),
+    'submissions of user': lambda: _where(Submission.__table__, Submission.user_id == SAMPLE_ID),
+    'submissions for homework': lambda: _where(Submission.__table__, Submission.homework_id == SAMPLE_ID),
+    'answers of submission': lambda: _where(QuizAnswer.__table__, QuizAnswer.submission_id == SAMPLE_ID),
+    'answers to question': lambda: _where(QuizAnswer.__table__, QuizAnswer.question_id == SAMPLE_ID),
+    'comments on submission': lambda: _where(Comment.__table__, Comment.submission_id == SAMPLE_ID),
+    'homework status of user': lambda: _where(HomeworkStatus.__table__, HomeworkStatus.user_id == SAMPLE_ID),
+    'homework status of homework': lambda: _where(
+        HomeworkStatus.__table__, HomeworkStatus.homework_id == SAMPLE_ID
+    ),
+    'weeks in school': lambda: _where(Week.__table__, Week.school_id == SAMPLE_ID),
+    'periods in week': lambda: _where(Period.__table__, Period.week_id == SAMPLE_ID),
+    'timetable of lesson': lambda: _where(TimetabledLesson.__table__, TimetabledLesson.lesson_id == SAMPLE_ID),
+    'lessons in period': lambda: _where(TimetabledLesson.__table__, TimetabledLesson.period_id == SAMPLE_ID),
+    'week timetable of user': lambda: _statement(timetable_query(SAMPLE_ID, SAMPLE_ID, member_lessons(SAMPLE_ID))),
+    'week timetable of lesson': lambda: _statement(timetable_query(SAMPLE_ID, SAMPLE_ID, single_lesson(SAMPLE_ID))),
+    'first week timetable of user': lambda: _statement(timetable_query(SAMPLE_ID, None, member_lessons(SAMPLE_ID))),
+    'page of users in school': lambda: _page(User.__table__, User.school_id == SAMPLE_ID, User.id, User.id),
+    'page of permissions in school': lambda: _page(
+        Permission.__table__, Permission.school_id == SAMPLE_ID, Permission.id, Permission.id
+    ),
+    'page of lessons in school': lambda: _page(
+        Lesson.__table__, Lesson.school_id == SAMPLE_ID, Lesson.id, Lesson.id, cursor=(SAMPLE_ID, SAMPLE_ID)
+    ),
+    'page of lessons by name': lambda: _page(
+        Lesson.__table__, Lesson.school_id == SAMPLE_ID, Lesson.name, Lesson.id, cursor=('name', SAMPLE_ID)
+    ),
+    'page of submissions of user': lambda: _page(
+        Submission.__table__, Submission.user_id == SAMPLE_ID, Submission.id, Submission.id
+    ),
+    'page of submissions for homework': lambda: _page(
+        Submission.__table__, Submission.homework_id == SAMPLE_ID, Submission.id, Submission.id
+    ),
+    'page of homework status of user': lambda: _page(
+        HomeworkStatus.__table__, HomeworkStatus.user_id == SAMPLE_ID, HomeworkStatus.date_due,
+        HomeworkStatus.homework_id
+    ),
+    'page of homework status of user by date due': lambda: _page(
+        HomeworkStatus.__table__, HomeworkStatus.user_id == SAMPLE_ID, HomeworkStatus.date_due,
+        HomeworkStatus.homework_id, cursor=(datetime.date(2016, 9, 5), SAMPLE_ID)
+    ),
+    'page of homework status of user by date due descending': lambda: _page(
+        HomeworkStatus.__table__, HomeworkStatus.user_id == SAMPLE_ID, HomeworkStatus.date_due,
+        HomeworkStatus.homework_id, cursor=(datetime.date(2016, 9, 5), SAMPLE_ID), descending=True
+    ),
+    'page of homework status of homework': lambda: _page(
+        HomeworkStatus.__table__, HomeworkStatus.homework_id == SAMPLE_ID, HomeworkStatus.user_id,
+        HomeworkStatus.user_id, cursor=(SAMPLE_ID, SAMPLE_ID)
+    ),
+}
+
+# SQLite reports "SCAN user" (or "SCAN TABLE user") for a full scan and "SEARCH ... USING INDEX" otherwise
+SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?"?(\w+)"?(?: AS \w+)?$')
+POSTGRES_SCAN = re.compile(r'Seq Scan on "?(\w+)"?')
+# Plan lines for rows sorted after they are read, rather than read in order from an index
+SQLITE_SORT = re.compile(r'^USE TEMP B-TREE FOR (?:RIGHT PART OF |LAST TERM OF )?ORDER BY$')
+POSTGRES_SORT = re.compile(r'^(?:->\s*)?(?:Incremental )?Sort\s+\(')
+
+
+def explain(statement):
+    """Return the lines of the query plan for a statement."""
+    connection = db.session.connection()
+    dialect = connection.dialect.name
+    sql = str(statement.compile(dialect=connection.dialect, compile_kwargs={'literal_binds': True}))
+
+    if dialect == 'sqlite':
+        return [row[-1] for row in connection.execute('EXPLAIN QUERY PLAN ' + sql)]
+    if dialect == 'postgresql':
+        connection.execute('SET LOCAL enable_seqscan = off')
+        return [row[0] for row in connection.execute('EXPLAIN ' + sql)]
+    raise NotImplementedError("Can't read query plans for {}.".format(dialect))
+
+
+def sequential_scans(plan):
+    """Return the tables read with a sequential scan in a query plan, ignoring subqueries such as member_lesson."""
+    pattern = SQLITE_SCAN if db.session.connection().dialect.name == 'sqlite' else POSTGRES_SCAN
+    tables = []
+    for line in plan:
+        match = pattern.search(line.strip())
+        if match and match.group(1) in db.metadata.tables:
+            tables.append(match.group(1))
+    return tables
+
+
+def sorts(plan):
+    """Return the lines of a query plan which sort rows."""
+    pattern = SQLITE_SORT if db.session.connection().dialect.name == 'sqlite' else POSTGRES_SORT
+    return [line.strip() for line in plan if pattern.search(line.strip())]
+
+
+def audit_indexes(queries=None):
+    """
+    Return [{'query', 'plan', 'sequential_scans', 'sorts'}] for each hot query. Nothing is written to the database.
+
+    sorts is only filled in for pages, as other queries read every matching row anyway.
+    """
+    queries = queries or HOT_QUERIES
+    report = []
+    try:
+        for name, build in sorted(queries.items()):
+            statement = build()
+            plan = explain(statement)
+            report.append({
+                'query': name,
+                'plan': plan,
+                'sequential_scans': sequential_scans(plan),
+                'sorts': sorts(plan) if statement._limit is not None else []
+            })
+    finally:
+        db.session.rollback()
+    return report
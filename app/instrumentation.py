@@ -0,0 +1,178 @@
+"""
+Per request counts and timings of SQL statements, serialisation and responses.
+
+SQLAlchemy engine events add each statement's time to the current request's RequestStats. After the request the
+totals are recorded in app/metrics.py (served by /metrics), logged as one JSON line and, if INSTRUMENTATION_HEADERS
+is set, added to the response as X- headers. Statements run while a streamed response is generated finish after
+the request is recorded so aren't counted.
+
+The N+1 detector reports statements with the same shape, i.e. the same SQL once IN lists and literals are
+collapsed, executed N_PLUS_ONE_THRESHOLD or more times in one request. That is usually a lazy load in a loop.
+"""
+import json
+import logging
+import re
+import time
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app import metrics
+
+logger = logging.getLogger(__name__)
+
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+request_latency = metrics.histogram('http_request_duration_seconds', 'Time to handle a request.')
+request_count = metrics.counter('http_requests_total', 'Requests handled.')
+query_count = metrics.histogram('db_statements_per_request', 'SQL statements run by a request.', QUERY_COUNT_BUCKETS)
+query_time = metrics.histogram('db_time_seconds', 'Time a request spent running SQL statements.')
+serialisation_time = metrics.histogram('serialisation_seconds', 'Time a request spent encoding JSON.')
+response_size = metrics.histogram('http_response_size_bytes', 'Size of response bodies.', SIZE_BUCKETS)
+n_plus_one_count = metrics.counter('db_n_plus_one_total', 'Requests which repeated a statement shape.')
+
+# Bind parameters in the styles used by sqlite (?) and psycopg2 (%(name)s), and literals
+_PARAMETER = re.compile(r"\?|%\(\w+\)s|'(?:[^']|'')*'|\b\d+\b")
+_PARAMETER_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def statement_shape(statement):
+    """Return a statement with parameters, literals and IN lists collapsed, so repeats of it can be counted."""
+    shape = _PARAMETER.sub('?', statement)
+    shape = _PARAMETER_LIST.sub('(?)', shape)
+    return _WHITESPACE.sub(' ', shape).strip()
+
+
+class RequestStats:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.statement_count = 0
+        self.db_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_statement = None
+        self.serialisation_time = 0.0
+        self.shapes = {}
+
+    def add_statement(self, statement, duration):
+        self.statement_count += 1
+        self.db_time += duration
+        if duration >= self.slowest_time:
+            self.slowest_time = duration
+            self.slowest_statement = statement
+        shape = statement_shape(statement)
+        self.shapes[shape] = self.shapes.get(shape, 0) + 1
+
+    def repeated_shapes(self, threshold):
+        """Return [(shape, times run)] for shapes run at least threshold times, most repeated first."""
+        repeated = [(shape, count) for shape, count in self.shapes.items() if count >= threshold]
+        return sorted(repeated, key=lambda item: -item[1])
+
+
+def current_stats():
+    """Return the RequestStats for the current request, or None outside an instrumented request."""
+    if not has_request_context():
+        return None
+    return getattr(g, '_request_stats', None)
+
+
+def record_serialisation(seconds):
+    stats = current_stats()
+    if stats is not None:
+        stats.serialisation_time += seconds
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_statement_start', []).append(time.perf_counter())
+
+
+def _finish_statement(conn, statement):
+    starts = conn.info.get('_statement_start')
+    if not starts:
+        return
+    duration = time.perf_counter() - starts.pop()
+    stats = current_stats()
+    if stats is not None:
+        stats.add_statement(statement, duration)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _finish_statement(conn, statement)
+
+
+def _handle_error(exception_context):
+    # after_cursor_execute isn't called for a statement which raised, so its start is popped here
+    if exception_context.connection is not None and exception_context.statement is not None:
+        _finish_statement(exception_context.connection, exception_context.statement)
+
+
+def start_request():
+    g._request_stats = RequestStats()
+
+
+def finish_request(response):
+    stats = current_stats()
+    if stats is None:
+        return response
+    config = current_app.config
+
+    duration = time.perf_counter() - stats.start
+    endpoint = request.endpoint or 'unknown'
+    blueprint = request.blueprint or ''
+    size = None if response.is_streamed else response.calculate_content_length()
+    repeated = stats.repeated_shapes(config.get('N_PLUS_ONE_THRESHOLD', 5))
+
+    request_count.inc(blueprint=blueprint, endpoint=endpoint, status=response.status_code)
+    request_latency.observe(duration, blueprint=blueprint, endpoint=endpoint)
+    query_count.observe(stats.statement_count, blueprint=blueprint, endpoint=endpoint)
+    query_time.observe(stats.db_time, blueprint=blueprint, endpoint=endpoint)
+    serialisation_time.observe(stats.serialisation_time, blueprint=blueprint, endpoint=endpoint)
+    if size is not None:
+        response_size.observe(size, blueprint=blueprint, endpoint=endpoint)
+    if repeated:
+        n_plus_one_count.inc(blueprint=blueprint, endpoint=endpoint)
+
+    if config.get('INSTRUMENTATION_HEADERS'):
+        response.headers['X-DB-Statements'] = str(stats.statement_count)
+        response.headers['X-DB-Time-Ms'] = '{:.2f}'.format(stats.db_time * 1000)
+        response.headers['X-DB-Slowest-Ms'] = '{:.2f}'.format(stats.slowest_time * 1000)
+        response.headers['X-Serialisation-Time-Ms'] = '{:.2f}'.format(stats.serialisation_time * 1000)
+        response.headers['X-Response-Time-Ms'] = '{:.2f}'.format(duration * 1000)
+        if repeated:
+            response.headers['X-DB-Repeated-Statements'] = str(len(repeated))
+
+    if config.get('INSTRUMENTATION_LOG'):
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'blueprint': blueprint,
+            'endpoint': endpoint,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 2),
+            'db_statements': stats.statement_count,
+            'db_time_ms': round(stats.db_time * 1000, 2),
+            'db_slowest_ms': round(stats.slowest_time * 1000, 2),
+            'db_slowest_statement': stats.slowest_statement,
+            'serialisation_ms': round(stats.serialisation_time * 1000, 2),
+            'response_bytes': size
+        }))
+    for shape, count in repeated:
+        logger.warning("Possible N+1 in {}: statement run {} times: {}".format(endpoint, count, shape))
+
+    return response
+
+
+def init_instrumentation(app):
+    """Listen to every engine and add the request hooks, to be called before other after_request functions."""
+    if not app.config.get('INSTRUMENTATION_ENABLED'):
+        return
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+
+    app.before_request(start_request)
+    # after_request functions run in reverse order so this sees the compressed size
+    app.after_request(finish_request)
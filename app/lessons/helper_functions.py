@@ -1,27 +1,90 @@
+from sqlalchemy import and_
+
+from app import db
 from app.exceptions import CustomError
-from app.helper import get_record_by_id
+from app.homework.status_functions import lesson_students_changed
+from app.lessons.models import lesson_student, lesson_teacher
+from app.timetable.cache_functions import invalidate_timetable
 from app.user.models import User
 
 
-def add_teachers(teacher_ids, lesson):
-    for teacher_id in teacher_ids:
-        user = get_record_by_id(
-            teacher_id,
-            User,
-            custom_not_found_error=CustomError(
-                409, message="Invalid id in teacher_ids: {}".format(teacher_id))
+def validate_user_ids(user_ids, school_id, key):
+    """Check every id is a user in the school with one query, reporting all of the invalid ids together."""
+    if not isinstance(user_ids, list) or \
+            any(not isinstance(user_id, int) or isinstance(user_id, bool) for user_id in user_ids):
+        raise CustomError(409, message="{} must be a list of ids.".format(key))
+    user_ids = set(user_ids)
+    if not user_ids:
+        return user_ids
+
+    query = db.session.query(User.id).filter(User.id.in_(user_ids), User.school_id == school_id)
+    invalid_ids = user_ids - {user_id for (user_id,) in query}
+    if invalid_ids:
+        invalid_ids = sorted(invalid_ids)
+        raise CustomError(
+            409,
+            message="Invalid id in {}: {}".format(key, ", ".join(str(user_id) for user_id in invalid_ids)),
+            invalid_ids=invalid_ids
         )
-        #  TODO: Add role checking
-        lesson.teachers.append(user)
+    return user_ids
 
 
-def add_students(student_ids, lesson):
-    for student_id in student_ids:
-        user = get_record_by_id(
-            student_id,
-            User,
-            custom_not_found_error=CustomError(
-                409, message="Invalid id in student_ids: {}".format(student_id))
-        )
-        #  TODO: Add role checking
-        lesson.students.append(user)
+def set_members(table, lesson, user_ids):
+    """
+    Make user_ids the only members of a lesson in lesson_teacher or lesson_student.
+
+    Only the rows which change are inserted or deleted. Returns the sets of added and removed user ids.
+    """
+    new_lesson = lesson.id is None
+    if new_lesson:
+        # New lesson so it has no members yet
+        db.session.add(lesson)
+        db.session.flush()
+        current_ids = set()
+    else:
+        query = db.session.query(table.c.user_id).filter(table.c.lesson_id == lesson.id)
+        current_ids = {user_id for (user_id,) in query}
+
+    added_ids = user_ids - current_ids
+    removed_ids = current_ids - user_ids
+
+    if removed_ids:
+        db.session.execute(table.delete().where(and_(
+            table.c.lesson_id == lesson.id,
+            table.c.user_id.in_(removed_ids)
+        )))
+
+    if added_ids:
+        db.session.execute(table.insert(), [{'lesson_id': lesson.id, 'user_id': user_id} for user_id in added_ids])
+
+    # A new lesson isn't timetabled yet
+    if (added_ids or removed_ids) and not new_lesson:
+        invalidate_timetable(lesson.school_id)
+
+    return added_ids, removed_ids
+
+
+def set_teachers(teacher_ids, lesson):
+    """Set a lesson's teachers to ids already checked by validate_user_ids."""
+    #  TODO: Add role checking
+    changes = set_members(lesson_teacher, lesson, teacher_ids)
+    db.session.expire(lesson, ['teachers'])
+    return changes
+
+
+def set_students(student_ids, lesson):
+    """Set a lesson's students to ids already checked by validate_user_ids, updating their homework_status rows."""
+    #  TODO: Add role checking
+    added_ids, removed_ids = set_members(lesson_student, lesson, student_ids)
+    lesson_students_changed(lesson.id, added_ids, removed_ids)
+    db.session.expire(lesson, ['students'])
+    return added_ids, removed_ids
+
+
+def is_student(lesson_id, user_id):
+    """Check if a user attends a lesson without loading all of its students."""
+    query = db.session.query(lesson_student).filter(
+        lesson_student.c.lesson_id == lesson_id,
+        lesson_student.c.user_id == user_id
+    )
+    return db.session.query(query.exists()).scalar()
@@ -1,10 +1,13 @@
 from app import db
 from app.exceptions import FieldInUseError, NotFoundError, UnauthorizedError,CustomError
-from app.helper import json_from_request, check_keys, get_record_by_id, get_boolean_query_param
+from app.helper import json_from_request, check_keys, get_record_by_id, get_boolean_query_param, paginate
 from app.lessons.models import Lesson, Subject, lesson_teacher, lesson_student
-from flask import jsonify
+from app.encoding import jsonify
 from flask.globals import g
-from .helper_functions import add_students, add_teachers
+from app.homework.status_functions import remove_statuses
+from app.timetable.cache_functions import invalidate_timetable
+from .helper_functions import set_students, set_teachers, validate_user_ids
+from .schemas import lesson_schema
 
 
 def lesson_create(request):
@@ -25,23 +28,22 @@ def lesson_create(request):
     # Validate name
     validate_lesson_name(data['name'], g.user.school_id)
 
+    # Validate teachers and students (if supplied)
+    teacher_ids = validate_user_ids(data.get('teacher_ids', []), g.user.school_id, 'teacher_ids')
+    student_ids = validate_user_ids(data.get('student_ids', []), g.user.school_id, 'student_ids')
+
     # Create lesson
     lesson = Lesson(
         name=data['name'],
         school_id=g.user.school_id,
         subject_id=subject.id
     )
+    db.session.add(lesson)
 
+    # Add teachers and students
+    set_teachers(teacher_ids, lesson)
+    set_students(student_ids, lesson)
 
-    # Add teachers (if supplied)
-    if 'teacher_ids' in data.keys():
-        add_teachers(data['teacher_ids'], lesson)
-
-    # Add students (if supplied)
-    if 'student_ids' in data.keys():
-        add_students(data['student_ids'], lesson)
-
-    db.session.add(lesson)
     db.session.commit()
 
     return jsonify({'success': True, 'lesson': lesson.to_dict(nest_teachers=True, nest_students=True)}), 201
@@ -57,16 +59,20 @@ def validate_lesson_name(name, school_id):
 
 def lesson_listing(request):
     query = Lesson.query.filter_by(school_id=g.user.school_id)
+    schema = lesson_schema(
+        nest_teachers=get_boolean_query_param(request, 'nest-teachers'),
+        nest_students=get_boolean_query_param(request, 'nest-students'),
+        nest_subject=get_boolean_query_param(request, 'nest-subject')
+    )
 
-    # Filter by subject
-    subjects = request.args.get("subject")
-
-    if subjects is not None:
-        subjects = subjects.split(",")
-        query = query.filter(Lesson.subject_id.in_(subjects))
-
-    lessons = query.all()
-    return jsonify({'success': True, 'lessons': [lesson.to_dict() for lesson in lessons]})
+    # Filter by subject with ?subject=1,2
+    page = paginate(
+        request, query,
+        sort_columns={'id': Lesson.id, 'name': Lesson.name, 'subject_id': Lesson.subject_id},
+        filters={'subject': Lesson.subject_id},
+        schema=schema
+    )
+    return jsonify({'success': True, 'lessons': schema.dump_many(page.items), **page.metadata()})
 
 
 def lesson_detail(request, lesson_id):
@@ -86,6 +92,8 @@ def lesson_delete(request, lesson_id):
     # # lesson = Lesson.query.filter_by(id=lesson_id)
     # l = db.session.query(Lesson).filter(Lesson.id == lesson_id).first()
     # print(l)
+    remove_statuses(lesson_id=lesson.id)
+    invalidate_timetable(lesson.school_id)
     db.session.delete(lesson)
     db.session.commit()
 
@@ -101,6 +109,7 @@ def lesson_update(request, lesson_id):
         if json_data['name'] != lesson.name:
             validate_lesson_name(name=json_data['name'], school_id=g.user.school_id)
             lesson.name = json_data['name']
+            invalidate_timetable(lesson.school_id)
 
     if "subject_id" in json_data.keys():
         subject = get_record_by_id(
@@ -108,15 +117,25 @@ def lesson_update(request, lesson_id):
             Subject,
             custom_not_found_error=CustomError(409, message="Invalid subject_id.")
         )
-        lesson.subject_id = subject.id
+        if subject.id != lesson.subject_id:
+            lesson.subject_id = subject.id
+            invalidate_timetable(lesson.school_id)
 
+    # Validate all ids before changing anything
+    teacher_ids = None
     if "teacher_ids" in json_data.keys():
-        lesson.teachers = []
-        add_teachers(json_data['teacher_ids'], lesson)
+        teacher_ids = validate_user_ids(json_data['teacher_ids'], g.user.school_id, 'teacher_ids')
 
+    student_ids = None
     if "student_ids" in json_data.keys():
-        lesson.students = []
-        add_students(json_data['student_ids'], lesson)
+        student_ids = validate_user_ids(json_data['student_ids'], g.user.school_id, 'student_ids')
+
+    # Only the memberships which have changed are written
+    if teacher_ids is not None:
+        set_teachers(teacher_ids, lesson)
+
+    if student_ids is not None:
+        set_students(student_ids, lesson)
 
     db.session.add(lesson)
     db.session.commit()
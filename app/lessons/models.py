@@ -3,20 +3,23 @@ from app import db
 lesson_teacher = db.Table(
     'lesson_teacher',
     db.Column('lesson_id', db.Integer, db.ForeignKey('lesson.id'), primary_key=True),
-    db.Column('user_id', db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    db.Column('user_id', db.Integer, db.ForeignKey('user.id'), primary_key=True),
+    # The primary key covers lesson_id, this covers finding a user's lessons
+    db.Index('ix_lesson_teacher_user_id_lesson_id', 'user_id', 'lesson_id')
 )
 
 lesson_student = db.Table(
     'lesson_student',
     db.Column('lesson_id', db.Integer, db.ForeignKey('lesson.id'), primary_key=True),
-    db.Column('user_id', db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    db.Column('user_id', db.Integer, db.ForeignKey('user.id'), primary_key=True),
+    db.Index('ix_lesson_student_user_id_lesson_id', 'user_id', 'lesson_id')
 )
 
 
 class Subject(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120))
-    school_id = db.Column(db.Integer, db.ForeignKey('school.id'))
+    school_id = db.Column(db.Integer, db.ForeignKey('school.id'), index=True)
 
     def __init__(self, name, school_id):
         self.name = name
@@ -32,6 +35,11 @@ class Subject(db.Model):
 
 class Lesson(db.Model):
     __mapper_args__ = {'confirm_deleted_rows': False}
+    __table_args__ = (
+        db.Index('ix_lesson_school_id_name', 'school_id', 'name'),
+        db.Index('ix_lesson_school_id_id', 'school_id', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120))
     subject_id = db.Column(db.Integer, db.ForeignKey('subject.id'))
@@ -0,0 +1,19 @@
+from app.serializers import Schema
+from app.user.schemas import UserSchema
+
+from .models import Lesson, Subject
+
+SubjectSchema = Schema(Subject, ['id', 'name', 'school_id'])
+LessonSchema = Schema(Lesson, ['id', 'name', 'school_id', 'subject_id'])
+
+
+def lesson_schema(nest_teachers=False, nest_students=False, nest_subject=False):
+    """Return the LessonSchema matching Lesson.to_dict's nest_* flags."""
+    nested = {}
+    if nest_subject:
+        nested['subject'] = SubjectSchema
+    if nest_teachers:
+        nested['teachers'] = UserSchema
+    if nest_students:
+        nested['students'] = UserSchema
+    return LessonSchema.nest(**nested)
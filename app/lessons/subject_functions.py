@@ -1,9 +1,11 @@
-from flask import g, jsonify
+from flask import g
 
 from app import db
+from app.encoding import jsonify
 from app.exceptions import FieldInUseError, NotFoundError, UnauthorizedError
-from app.helper import json_from_request, check_keys, get_record_by_id
+from app.helper import json_from_request, check_keys, get_record_by_id, paginate
 from app.lessons.models import Subject, Lesson
+from app.timetable.cache_functions import invalidate_timetable
 
 
 def create_subject(name, school_id):
@@ -39,9 +41,11 @@ def subjects_for_school(school_id):
 
 
 def list_subject_view(request):
-    # Get subjects and convert to dicts
-    subjects = [s.to_dict() for s in subjects_for_school(g.user.school_id)]
-    return jsonify({'success': True, 'subjects': subjects})
+    # Get a page of subjects and convert to dicts
+    query = Subject.query.filter_by(school_id=g.user.school_id)
+    page = paginate(request, query, sort_columns={'id': Subject.id, 'name': Subject.name})
+    subjects = [s.to_dict() for s in page.items]
+    return jsonify({'success': True, 'subjects': subjects, **page.metadata()})
 
 
 def subject_detail_view(request, subject_id):
@@ -72,6 +76,7 @@ def subject_update_view(request, subject_id):
         if subject_name_in_use(data['name'], school_id=subject.school_id):
             raise FieldInUseError("name")
         subject.name = data['name']
+        invalidate_timetable(subject.school_id)
 
     db.session.add(subject)
     db.session.commit()
@@ -0,0 +1,137 @@
+"""Simple in-process metrics. Each worker process keeps its own values."""
+import threading
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+registry = {}
+_registry_lock = threading.Lock()
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+class Counter:
+    """A value which only goes up, e.g. number of rejected requests."""
+    kind = 'counter'
+
+    def __init__(self, name, description):
+        self.name = name
+        self.description = description
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self.values.get(_label_key(labels), 0)
+
+    def reset(self):
+        with self.lock:
+            self.values.clear()
+
+
+class Gauge(Counter):
+    """A value which can go up and down, e.g. connections checked out of the pool."""
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            self.values[key] = value
+
+
+class Histogram:
+    """Counts observations, e.g. latencies in seconds, into cumulative buckets."""
+    kind = 'histogram'
+
+    def __init__(self, name, description, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        # {labels: {'buckets': [count per bucket], 'count': n, 'sum': total}}
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            series = self.values.get(key)
+            if series is None:
+                series = self.values[key] = {'buckets': [0] * len(self.buckets), 'count': 0, 'sum': 0.0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['buckets'][i] += 1
+            series['count'] += 1
+            series['sum'] += value
+
+    def snapshot(self, **labels):
+        series = self.values.get(_label_key(labels))
+        if series is None:
+            return {'count': 0, 'sum': 0.0, 'buckets': dict.fromkeys(self.buckets, 0)}
+        return {'count': series['count'], 'sum': series['sum'], 'buckets': dict(zip(self.buckets, series['buckets']))}
+
+    def reset(self):
+        with self.lock:
+            self.values.clear()
+
+
+def _get_or_create(cls, name, *args):
+    with _registry_lock:
+        metric = registry.get(name)
+        if metric is None:
+            metric = registry[name] = cls(name, *args)
+        return metric
+
+
+def counter(name, description):
+    return _get_or_create(Counter, name, description)
+
+
+def gauge(name, description):
+    return _get_or_create(Gauge, name, description)
+
+
+def histogram(name, description, buckets=DEFAULT_BUCKETS):
+    return _get_or_create(Histogram, name, description, buckets)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = [
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels
+    ]
+    return '{' + ','.join(escaped) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus():
+    """Return every metric in the registry in the Prometheus text exposition format."""
+    lines = []
+    for name in sorted(registry):
+        metric = registry[name]
+        lines.append('# HELP {} {}'.format(name, metric.description))
+        lines.append('# TYPE {} {}'.format(name, metric.kind))
+        with metric.lock:
+            values = sorted(metric.values.items())
+            if metric.kind in ('counter', 'gauge'):
+                for labels, value in values:
+                    lines.append('{}{} {}'.format(name, _format_labels(labels), _format_value(value)))
+                continue
+
+            for labels, series in values:
+                for bound, count in zip(metric.buckets, series['buckets']):
+                    bucket_labels = labels + (('le', _format_value(float(bound))),)
+                    lines.append('{}_bucket{} {}'.format(name, _format_labels(bucket_labels), count))
+                lines.append('{}_bucket{} {}'.format(name, _format_labels(labels + (('le', '+Inf'),)), series['count']))
+                lines.append('{}_sum{} {}'.format(name, _format_labels(labels), _format_value(series['sum'])))
+                lines.append('{}_count{} {}'.format(name, _format_labels(labels), series['count']))
+    return '\n'.join(lines) + '\n'
@@ -1,6 +1,8 @@
-from flask import Blueprint, jsonify, g, request
+from flask import Blueprint, g, request
+from app.encoding import jsonify
 from flask_jwt import jwt_required
 
+from .cache_functions import reset_request_cache
 from .decorators import permissions_required
 
 from app.permissions.permission_functions import set_default_permissions, permission_create, permissions_list, \
@@ -18,6 +20,12 @@ from app.permissions.role_functions import (
 permissions_blueprint = Blueprint('permissions', __name__, url_prefix='/permissions')
 
 
+@permissions_blueprint.before_app_request
+def reset_permissions_cache():
+    """Permissions are only cached on g for the duration of a single request."""
+    reset_request_cache()
+
+
 @permissions_blueprint.route('/set-defaults', methods=["POST"])
 @jwt_required()
 def set_defaults_view():
@@ -0,0 +1,105 @@
+"""Functions to work out, and cache, which permissions and roles a user has."""
+from flask import current_app, g, has_app_context
+from sqlalchemy import literal
+
+from app import db
+from app.permissions.models import Permission, Role, role_permissions, user_permissions, user_roles
+from app.school.models import School
+
+DIRECT_PERMISSION = 'direct_permission'
+ROLE_PERMISSION = 'role_permission'
+ROLE = 'role'
+
+
+class AccessSummary:
+    """The names of the permissions and roles a user has."""
+    def __init__(self, direct_permissions=(), role_permissions=(), roles=()):
+        self.direct_permissions = frozenset(direct_permissions)
+        self.permissions = self.direct_permissions | frozenset(role_permissions)
+        self.roles = frozenset(roles)
+
+
+def load_access_summary(user_id):
+    """Fetch the permission and role names for a user with a single query."""
+    # select_from as SQLAlchemy 1.2 joins from the first entity, the literal
+    direct = db.session.query(literal(DIRECT_PERMISSION), Permission.name) \
+        .select_from(Permission) \
+        .join(user_permissions, user_permissions.c.permission_id == Permission.id) \
+        .filter(user_permissions.c.user_id == user_id)
+
+    through_roles = db.session.query(literal(ROLE_PERMISSION), Permission.name) \
+        .select_from(Permission) \
+        .join(role_permissions, role_permissions.c.permission_id == Permission.id) \
+        .join(user_roles, user_roles.c.role_id == role_permissions.c.role_id) \
+        .filter(user_roles.c.user_id == user_id)
+
+    roles = db.session.query(literal(ROLE), Role.name) \
+        .select_from(Role) \
+        .join(user_roles, user_roles.c.role_id == Role.id) \
+        .filter(user_roles.c.user_id == user_id)
+
+    names = {DIRECT_PERMISSION: set(), ROLE_PERMISSION: set(), ROLE: set()}
+    for kind, name in direct.union_all(through_roles, roles):
+        names[kind].add(name)
+
+    return AccessSummary(names[DIRECT_PERMISSION], names[ROLE_PERMISSION], names[ROLE])
+
+
+def get_access_summary(user):
+    """
+    Return the AccessSummary for a user.
+
+    The summary is computed at most once per request. If PERMISSIONS_CACHE_ENABLED is set it is also shared between
+    requests, keyed by the school's permissions_version so any change to the school's permissions is seen straight away.
+    """
+    if user.id is None:
+        # User has not been saved yet so only the relationships know what it has
+        return AccessSummary(
+            [p.name for p in user.permissions],
+            [p.name for r in user.roles for p in r.permissions],
+            [r.name for r in user.roles]
+        )
+
+    request_cache = _request_cache()
+    if request_cache is not None and user.id in request_cache:
+        return request_cache[user.id]
+
+    shared_cache = current_app.extensions.get('permissions_cache') if has_app_context() else None
+    if shared_cache is None:
+        summary = load_access_summary(user.id)
+    else:
+        key = (user.id, user.school_id, school_permissions_version(user.school_id))
+        summary = shared_cache.get(key)
+        if summary is None:
+            summary = load_access_summary(user.id)
+            shared_cache.set(key, summary)
+
+    if request_cache is not None:
+        request_cache[user.id] = summary
+    return summary
+
+
+def school_permissions_version(school_id):
+    return db.session.query(School.permissions_version).filter(School.id == school_id).scalar()
+
+
+def invalidate_permissions(school_id):
+    """Mark every cached permission in a school as stale. Call before committing the change."""
+    db.session.query(School).filter(School.id == school_id).update(
+        {School.permissions_version: School.permissions_version + 1},
+        synchronize_session=False
+    )
+    reset_request_cache()
+
+
+def reset_request_cache():
+    if has_app_context():
+        g.access_summaries = {}
+
+
+def _request_cache():
+    if not has_app_context():
+        return None
+    if getattr(g, 'access_summaries', None) is None:
+        g.access_summaries = {}
+    return g.access_summaries
@@ -3,19 +3,25 @@ from app import db
 role_permissions = db.Table(
     'role_permissions',
     db.Column('permission_id', db.Integer, db.ForeignKey('permission.id')),
-    db.Column('role_id', db.Integer, db.ForeignKey('role.id'))
+    db.Column('role_id', db.Integer, db.ForeignKey('role.id')),
+    db.Index('ix_role_permissions_role_id_permission_id', 'role_id', 'permission_id'),
+    db.Index('ix_role_permissions_permission_id', 'permission_id')
 )
 
 user_permissions = db.Table(
     'user_permissions',
     db.Column('user_id', db.Integer, db.ForeignKey('user.id')),
-    db.Column('permission_id', db.Integer, db.ForeignKey('permission.id'))
+    db.Column('permission_id', db.Integer, db.ForeignKey('permission.id')),
+    db.Index('ix_user_permissions_user_id_permission_id', 'user_id', 'permission_id'),
+    db.Index('ix_user_permissions_permission_id', 'permission_id')
 )
 
 user_roles = db.Table(
     'user_roles',
     db.Column('user_id', db.Integer, db.ForeignKey('user.id')),
-    db.Column('role_id', db.Integer, db.ForeignKey('role.id'))
+    db.Column('role_id', db.Integer, db.ForeignKey('role.id')),
+    db.Index('ix_user_roles_user_id_role_id', 'user_id', 'role_id'),
+    db.Index('ix_user_roles_role_id', 'role_id')
 )
 
 
@@ -23,6 +29,7 @@ class Permission(db.Model):
     """Model representing a permission a user can have."""
     __table_args__ = (
         db.UniqueConstraint('school_id', 'name'),
+        db.Index('ix_permission_school_id_id', 'school_id', 'id'),
         {}
     )
 
@@ -88,7 +95,7 @@ class Role(db.Model):
     """
 
     id = db.Column(db.Integer, primary_key=True)
-    school_id = db.Column(db.Integer, db.ForeignKey('school.id'))
+    school_id = db.Column(db.Integer, db.ForeignKey('school.id'), index=True)
     name = db.Column(db.String(120))
     permissions = db.relationship(
         'Permission', secondary=role_permissions,
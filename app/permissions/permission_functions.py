@@ -1,11 +1,13 @@
 from app.user.models import User
-from flask import g, jsonify
+from flask import g
 
 from app import CustomError, db
+from app.encoding import jsonify
 from app.exceptions import FieldInUseError, NotFoundError, UnauthorizedError, MissingKeyError
-from app.helper import json_from_request, check_keys, get_record_by_id
+from app.helper import json_from_request, check_keys, get_record_by_id, paginate
 # from app.user.helper_functions import get_user_by_id
 
+from .cache_functions import invalidate_permissions
 from .models import Permission, Role
 
 
@@ -36,7 +38,7 @@ def set_default_permissions(request):
     #  Assign user to admin role
     role = Role.query.filter_by(name="ADMINISTRATOR", school_id=school_id).first()
     g.user.roles.append(role)
-    db.session.add(g.user)
+    invalidate_permissions(school_id)
     db.session.commit()
 
     # Return success status
@@ -63,8 +65,11 @@ def permission_create(request):
 def permissions_list(request):
     """Returns a list of permissions."""
     permissions = Permission.query.filter_by(school_id=g.user.school_id)
+    page = paginate(request, permissions, sort_columns={'id': Permission.id, 'name': Permission.name})
     return jsonify({
-        'permissions': [p.to_dict() for p in permissions]
+        'success': True,
+        'permissions': [p.to_dict() for p in page.items],
+        **page.metadata()
     }), 200
 
 
@@ -76,6 +81,7 @@ def permission_detail(request, permission_id):
 def permission_delete(request, permission_id):
     permission = get_permission_by_id(permission_id)
     db.session.delete(permission)
+    invalidate_permissions(permission.school_id)
     db.session.commit()
     return jsonify({'success': True, "message": "Deleted."})
 
@@ -87,6 +93,7 @@ def permission_update(request, permission_id):
         permission.name = data['name']
     if "description" in data.keys():
         permission.description = data['description']
+    invalidate_permissions(permission.school_id)
     db.session.add(permission)
     db.session.commit()
 
@@ -112,6 +119,7 @@ def grant_permission(request):
                 data['user_id'], data['permission_id']))
 
     user.permissions.append(permission)
+    invalidate_permissions(user.school_id)
     db.session.add(user)
     db.session.commit()
 
@@ -147,6 +155,7 @@ def remove_permission(request):
 
         user.permissions.remove(permission)
 
+    invalidate_permissions(user.school_id)
     db.session.add(user)
     db.session.commit()
 
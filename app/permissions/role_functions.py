@@ -1,11 +1,14 @@
-from flask import jsonify, g
+from flask import g
 
 from app import CustomError, db
+from app.encoding import jsonify
 from app.exceptions import FieldInUseError, NotFoundError, UnauthorizedError
-from app.helper import json_from_request, check_keys
+from app.helper import json_from_request, check_keys, paginate
 from app.user.helper_functions import get_user_by_id
 
+from .cache_functions import invalidate_permissions
 from .models import Role, Permission
+from .schemas import RoleWithPermissionsSchema
 
 
 def grant_role(request):
@@ -25,6 +28,7 @@ def grant_role(request):
                 data['user_id'], data['role_id']))
 
     user.roles.append(role)
+    invalidate_permissions(user.school_id)
 
     db.session.add(user)
     db.session.commit()
@@ -51,6 +55,7 @@ def remove_role(request):
         )
 
     user.roles.remove(role)
+    invalidate_permissions(user.school_id)
 
     db.session.add(user)
     db.session.commit()
@@ -93,9 +98,15 @@ def role_create(request):
 def role_listing(request):
     #  Return a listing of all roles
     roles = Role.query.filter_by(school_id=g.user.school_id)
+    page = paginate(
+        request, roles,
+        sort_columns={'id': Role.id, 'name': Role.name},
+        schema=RoleWithPermissionsSchema
+    )
     return jsonify({
         'success': True,
-        'roles': [r.to_dict(nest_permissions=True) for r in roles]
+        'roles': RoleWithPermissionsSchema.dump_many(page.items),
+        **page.metadata()
     })
 
 
@@ -108,6 +119,7 @@ def role_detail(request, role_id):
 def role_delete(request, role_id):
     role = get_role_by_id(role_id)
     db.session.delete(role)
+    invalidate_permissions(role.school_id)
     db.session.commit()
     return jsonify({'success': True, "message": "Deleted."})
 
@@ -129,6 +141,7 @@ def role_update(request, role_id):
 
         role.permissions = [p for p in permissions]
 
+    invalidate_permissions(role.school_id)
     db.session.add(role)
     db.session.commit()
     return jsonify({'success': True, "message": "Updated."})
@@ -0,0 +1,7 @@
+from app.serializers import Schema
+
+from .models import Permission, Role
+
+PermissionSchema = Schema(Permission, ['id', 'school_id', 'name', 'description'])
+RoleSchema = Schema(Role, ['id', 'school_id', 'name'])
+RoleWithPermissionsSchema = RoleSchema.nest(permissions=PermissionSchema)
@@ -1,5 +1,6 @@
 from app.school.school_functions import signup_school
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request
+from app.encoding import jsonify
 
 from .school_functions import create_school
 
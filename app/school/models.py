@@ -6,6 +6,13 @@ class School(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)  # Represents id column
     name = db.Column(db.String(120), unique=True)  # Represents name column
+    # Incremented whenever a permission or role in the school changes, used to invalidate cached permissions
+    permissions_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Incremented whenever a lesson, period or timetabled lesson in the school changes, used to invalidate cached
+    # timetables
+    timetable_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # When timetable_version was last incremented, for the Last-Modified of iCalendar feeds
+    timetable_modified_at = db.Column(db.DateTime, nullable=True)
 
     def __init__(self, school_name):
         """Constructor"""
@@ -1,4 +1,4 @@
-from flask import jsonify
+from app.encoding import jsonify
 
 from app import db
 from app.exceptions import FieldInUseError, CustomError
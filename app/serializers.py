@@ -0,0 +1,107 @@
+"""
+Declarative output shapes for models.
+
+A view describes what it returns with a Schema, e.g. users with their roles and each role's permissions. The
+loader options for a query are derived from the same Schema, so every nested relationship is loaded before the
+rows are serialised. Nested responses then cost one query per relationship rather than one per row.
+"""
+from sqlalchemy.orm import joinedload, selectinload, with_polymorphic
+
+from app import db
+
+
+class Schema:
+    """
+    The shape of a model as a dict.
+
+    fields are attribute names, or (name, function) pairs for values computed from the object. nested maps
+    relationship names to the Schema of the related objects. subtypes maps subclasses of a polymorphic model to a
+    Schema whose fields and nested are added for objects of that class.
+    """
+    def __init__(self, model, fields, nested=None, subtypes=None):
+        self.model = model
+        self.fields = [field if isinstance(field, tuple) else (field, None) for field in fields]
+        self.nested = nested or {}
+        self.subtypes = subtypes or {}
+        self._entity = None
+
+    def nest(self, **nested):
+        """Return a copy of the schema which also includes these relationships."""
+        return Schema(self.model, self.fields, nested={**self.nested, **nested}, subtypes=self.subtypes)
+
+    def only(self, *names):
+        """Return a copy of the schema with only these fields, keeping nested relationships."""
+        return Schema(
+            self.model,
+            [field for field in self.fields if field[0] in names],
+            nested=self.nested,
+            subtypes=self.subtypes
+        )
+
+    def field_names(self):
+        return [name for name, _ in self.fields]
+
+    @property
+    def entity(self):
+        """The model, or for a polymorphic model one with_polymorphic entity shared by query and loader_options."""
+        if self._entity is None:
+            self._entity = with_polymorphic(self.model, list(self.subtypes.keys())) if self.subtypes else self.model
+        return self._entity
+
+    def _relationships(self):
+        entity = self.entity
+        for name, schema in self.nested.items():
+            yield getattr(entity, name), schema
+        for subtype, subtype_schema in self.subtypes.items():
+            for name, schema in subtype_schema.nested.items():
+                yield getattr(getattr(entity, subtype.__name__), name), schema
+
+    def loader_options(self, parent=None):
+        """
+        Return loader options which load every nested relationship up front.
+
+        Collections use selectinload so rows aren't duplicated, single objects use joinedload. A polymorphic object is
+        selectinloaded with its subclasses, as relationships of a subclass can't be loaded through a joinedload.
+        """
+        options = []
+        for attribute, schema in self._relationships():
+            relationship = attribute.property
+            if relationship.lazy == 'dynamic':
+                raise ValueError("{} is a dynamic relationship so can't be nested.".format(attribute))
+
+            if schema.subtypes:
+                attribute = attribute.of_type(schema.entity)
+            if relationship.uselist or schema.subtypes:
+                loader = parent.selectinload(attribute) if parent is not None else selectinload(attribute)
+            else:
+                loader = parent.joinedload(attribute) if parent is not None else joinedload(attribute)
+            options.append(loader)
+            options.extend(schema.loader_options(parent=loader))
+        return options
+
+    def query(self):
+        """
+        Start a query for the model. Subclasses of a polymorphic model are loaded in the same query so their
+        fields can be serialised.
+        """
+        return db.session.query(self.entity)
+
+    def dump(self, obj):
+        if obj is None:
+            return None
+
+        dictionary = {}
+        for name, function in self.fields:
+            dictionary[name] = function(obj) if function is not None else getattr(obj, name)
+
+        for name, schema in self.nested.items():
+            value = getattr(obj, name)
+            dictionary[name] = schema.dump_many(value) if isinstance(value, list) else schema.dump(value)
+
+        for subtype, subtype_schema in self.subtypes.items():
+            if isinstance(obj, subtype):
+                dictionary.update(subtype_schema.dump(obj))
+        return dictionary
+
+    def dump_many(self, objects):
+        return [self.dump(obj) for obj in objects]
@@ -0,0 +1,56 @@
+"""Functions to cache built timetables between requests."""
+import datetime
+
+from flask import current_app, has_app_context
+from sqlalchemy import select, union
+
+from app import db
+from app.lessons.models import lesson_student, lesson_teacher
+from app.school.models import School
+from app.user.models import User
+
+
+def school_timetable_version(school_id):
+    return db.session.query(School.timetable_version).filter(School.id == school_id).scalar()
+
+
+def invalidate_timetable(school_id):
+    """Mark every cached timetable in a school as stale. Call before committing the change."""
+    db.session.query(School).filter(School.id == school_id).update(
+        {
+            School.timetable_version: School.timetable_version + 1,
+            School.timetable_modified_at: datetime.datetime.utcnow()
+        },
+        synchronize_session=False
+    )
+
+
+def invalidate_calendars(lesson_id):
+    """Mark the iCalendar feeds of a lesson's students and teachers as changed. Call before committing the change."""
+    members = union(
+        select([lesson_student.c.user_id]).where(lesson_student.c.lesson_id == lesson_id),
+        select([lesson_teacher.c.user_id]).where(lesson_teacher.c.lesson_id == lesson_id)
+    )
+    db.session.query(User).filter(User.id.in_(members)).update(
+        {User.calendar_version: User.calendar_version + 1, User.calendar_modified_at: datetime.datetime.utcnow()},
+        synchronize_session=False
+    )
+
+
+def cached_timetable(school_id, key, build):
+    """
+    Return build() for a timetable, e.g. ('user', user_id, week_id).
+
+    If TIMETABLE_CACHE_ENABLED is set the result is shared between requests, keyed by the school's timetable_version
+    so any change to the school's timetables is seen straight away.
+    """
+    cache = current_app.extensions.get('timetable_cache') if has_app_context() else None
+    if cache is None:
+        return build()
+
+    key = (school_id, school_timetable_version(school_id)) + key
+    timetable = cache.get(key)
+    if timetable is None:
+        timetable = build()
+        cache.set(key, timetable)
+    return timetable
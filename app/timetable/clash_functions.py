@@ -0,0 +1,176 @@
+"""
+Functions to find timetable clashes, i.e. a teacher or student in two lessons at once.
+
+Two timetabled lessons clash for a user who is a member of both lessons when their periods are in the same week
+and day and overlap in time, including when they are the same period. Overlapping periods are found with an
+IntervalIndex rather than by comparing every pair, and members are compared as sets per user.
+"""
+from bisect import bisect_left
+from itertools import accumulate, combinations, product
+
+from flask import g
+from sqlalchemy import select, union_all
+
+from app import db
+from app.encoding import jsonify
+from app.helper import get_int_query_param
+from app.lessons.models import lesson_student, lesson_teacher
+from app.timetable.models import Period, TimetabledLesson, Week
+
+
+class IntervalIndex:
+    """
+    Periods grouped by week and day and sorted by start time, to find the periods overlapping a time in O(log n).
+
+    max_ends[i] is the latest end of the first i + 1 periods of a day, so the scan back from the last period to start
+    before the end of the time stops once no earlier period can still be running.
+    """
+    def __init__(self, periods):
+        """periods is an iterable of (id, week_id, day, start_time, end_time)."""
+        self.periods = {}
+        by_day = {}
+        for period_id, week_id, day, start_time, end_time in periods:
+            self.periods[period_id] = (week_id, day, start_time, end_time)
+            if start_time is not None and end_time is not None:
+                by_day.setdefault((week_id, day), []).append((start_time, end_time, period_id))
+
+        self.days = {}
+        for key, intervals in by_day.items():
+            intervals.sort()
+            self.days[key] = (
+                [start_time for start_time, _, _ in intervals],
+                list(accumulate((end_time for _, end_time, _ in intervals), max)),
+                intervals
+            )
+
+    def overlapping(self, week_id, day, start_time, end_time):
+        """Return the ids of periods on a day of a week which overlap start_time to end_time."""
+        if (week_id, day) not in self.days:
+            return []
+        starts, max_ends, intervals = self.days[(week_id, day)]
+        period_ids = []
+        i = bisect_left(starts, end_time) - 1
+        while i >= 0 and max_ends[i] > start_time:
+            interval_start, interval_end, period_id = intervals[i]
+            if interval_end > start_time:
+                period_ids.append(period_id)
+            i -= 1
+        return period_ids
+
+    def overlapping_period(self, period_id):
+        """Return the ids of periods overlapping a period, including itself."""
+        week_id, day, start_time, end_time = self.periods[period_id]
+        period_ids = set()
+        if start_time is not None and end_time is not None:
+            period_ids.update(self.overlapping(week_id, day, start_time, end_time))
+        period_ids.add(period_id)
+        return period_ids
+
+
+def memberships(name='membership'):
+    """Every (user_id, lesson_id) of a student or teacher in a lesson."""
+    return union_all(
+        select([lesson_student.c.user_id, lesson_student.c.lesson_id]),
+        select([lesson_teacher.c.user_id, lesson_teacher.c.lesson_id])
+    ).alias(name)
+
+
+def period_index(school_id, week_id=None):
+    query = db.session.query(Period.id, Period.week_id, Period.day, Period.start_time, Period.end_time) \
+        .join(Week, Week.id == Period.week_id) \
+        .filter(Week.school_id == school_id)
+    if week_id is not None:
+        query = query.filter(Week.id == week_id)
+    return IntervalIndex(query)
+
+
+def clash(user_id, first, second):
+    """first and second are (period_id, lesson_id)."""
+    first, second = sorted([first, second])
+    return {
+        'user_id': user_id,
+        'period_ids': [first[0], second[0]],
+        'lesson_ids': [first[1], second[1]]
+    }
+
+
+def find_clashes(school_id, period, lesson_id):
+    """Return the clashes timetabling a lesson in a period would cause, using one query for the lesson's members."""
+    index = period_index(school_id, week_id=period.week_id)
+    overlapping_ids = index.overlapping_period(period.id)
+
+    new_members = memberships('new_membership')
+    other_members = memberships('other_membership')
+    timetabled = TimetabledLesson.__table__
+    query = db.session.query(new_members.c.user_id, timetabled.c.period_id, timetabled.c.lesson_id) \
+        .select_from(timetabled) \
+        .join(other_members, other_members.c.lesson_id == timetabled.c.lesson_id) \
+        .join(new_members, new_members.c.user_id == other_members.c.user_id) \
+        .filter(new_members.c.lesson_id == lesson_id, timetabled.c.period_id.in_(overlapping_ids)) \
+        .order_by(new_members.c.user_id, timetabled.c.period_id, timetabled.c.lesson_id)
+    return [clash(user_id, (period.id, lesson_id), (period_id, other_id)) for user_id, period_id, other_id in query]
+
+
+def clash_report(school_id, week_id=None):
+    """
+    Return every clash in a school's timetable, or one week of it.
+
+    The periods and each member's timetabled lessons are fetched with one query each, then each member's periods are
+    checked against the periods overlapping them, so the work grows with the number of lessons members have rather
+    than with the square of the number of timetabled lessons.
+    """
+    index = period_index(school_id, week_id=week_id)
+    # Each pair of different periods is only checked from the one with the lower id
+    later_overlapping = {
+        period_id: sorted(other_id for other_id in index.overlapping_period(period_id) if other_id > period_id)
+        for period_id in index.periods
+    }
+
+    members = memberships()
+    timetabled = TimetabledLesson.__table__
+    period = Period.__table__
+    week = Week.__table__
+    query = select([members.c.user_id, timetabled.c.period_id, timetabled.c.lesson_id]) \
+        .select_from(
+            timetabled
+            .join(members, members.c.lesson_id == timetabled.c.lesson_id)
+            .join(period, period.c.id == timetabled.c.period_id)
+            .join(week, week.c.id == period.c.week_id)
+        ) \
+        .where(week.c.school_id == school_id)
+    if week_id is not None:
+        query = query.where(week.c.id == week_id)
+
+    # {user_id: {period_id: [lesson_id]}}, from plain rows as there can be one per member per timetabled lesson
+    timetables = {}
+    for user_id, period_id, lesson_id in db.session.execute(query):
+        timetables.setdefault(user_id, {}).setdefault(period_id, []).append(lesson_id)
+
+    clashes = []
+    for user_id, periods in timetables.items():
+        for period_id, lesson_ids in periods.items():
+            if len(lesson_ids) > 1:
+                clashes.extend(
+                    clash(user_id, (period_id, first), (period_id, second))
+                    for first, second in combinations(lesson_ids, 2)
+                )
+            for other_id in later_overlapping[period_id]:
+                if other_id in periods:
+                    clashes.extend(
+                        clash(user_id, (period_id, first), (other_id, second))
+                        for first, second in product(lesson_ids, periods[other_id])
+                    )
+
+    clashes.sort(key=lambda c: (c['user_id'], c['period_ids'], c['lesson_ids']))
+    return clashes
+
+
+def clash_report_view(request):
+    week_id = get_int_query_param(request, 'week_id')
+    clashes = clash_report(g.user.school_id, week_id=week_id)
+    return jsonify({
+        'success': True,
+        'clash_count': len(clashes),
+        'user_count': len({c['user_id'] for c in clashes}),
+        'clashes': clashes
+    })
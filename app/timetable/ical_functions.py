@@ -0,0 +1,299 @@
+"""
+Functions to serve a user's timetable and homework due dates as an iCalendar feed.
+
+Feed URLs contain a token signed with SECRET_KEY, so they can be added to a calendar app without logging in. The
+token includes the user's feed_token_version, checked by the same query as the feed's versions, so resetting it revokes
+that user's feed URLs. Changing SECRET_KEY revokes every feed URL.
+
+Calendar apps poll feeds often, so each feed has a strong ETag and Last-Modified made from its school's
+timetable_version and the user's calendar_version, which are looked up with one query without loading any models.
+An unchanged feed is answered with 304 after that query. If ICAL_CACHE_ENABLED is set the timetable and homework parts
+of a feed are cached separately, so a new homework only rebuilds the homework part.
+
+Weeks have no dates, so the school's weeks repeat in id order starting with the week of ICAL_TIMETABLE_START.
+"""
+import datetime
+import hashlib
+
+from flask import current_app, url_for, g
+from itsdangerous import BadSignature, URLSafeSerializer
+from sqlalchemy import select
+
+from app import db
+from app.encoding import jsonify
+from app.exceptions import NotFoundError
+from app.lessons.models import Lesson, Subject
+from app.homework.models import Homework
+from app.school.models import School
+from app.timetable.models import Period, TimetabledLesson, Week
+from app.timetable.timetable_functions import member_lessons
+from app.user.models import User
+
+TOKEN_SALT = 'ical-feed'
+# Changing how feeds are written changes every ETag
+FEED_FORMAT = 1
+UID_DOMAIN = 'vle'
+PRODID = '-//VLE//Timetable//EN'
+# The most octets in a line, longer lines are folded
+LINE_LENGTH = 75
+
+
+def token_serializer():
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt=TOKEN_SALT)
+
+
+def feed_token(user_id, school_id, token_version=0):
+    return token_serializer().dumps([user_id, school_id, token_version])
+
+
+def load_feed_token(token):
+    """Return (user_id, school_id, token_version) from a feed token, raising NotFoundError if it wasn't signed by us."""
+    try:
+        user_id, school_id, token_version = token_serializer().loads(token)
+    except (BadSignature, TypeError, ValueError):
+        raise NotFoundError()
+    return user_id, school_id, token_version
+
+
+def feed_versions(user_id, school_id):
+    """
+    Return (timetable_version, timetable_modified_at, calendar_version, calendar_modified_at, feed_token_version) or
+    None.
+    """
+    user = User.__table__
+    school = School.__table__
+    query = select([
+        school.c.timetable_version, school.c.timetable_modified_at, user.c.calendar_version, user.c.calendar_modified_at,
+        user.c.feed_token_version
+    ]) \
+        .select_from(user.join(school, school.c.id == user.c.school_id)) \
+        .where(user.c.id == user_id) \
+        .where(school.c.id == school_id)
+    return db.session.execute(query).first()
+
+
+def feed_etag(user_id, timetable_version, calendar_version):
+    start = current_app.config.get('ICAL_TIMETABLE_START')
+    key = '{}:{}:{}:{}:{}'.format(FEED_FORMAT, start, user_id, timetable_version, calendar_version)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:24]
+
+
+def representation_etags(etag):
+    """The ETag of the feed as sent uncompressed and as compressed by app.encoding.compress_response."""
+    return [etag, etag + '-gzip', etag + '-br']
+
+
+def not_modified_etag(request, etag, last_modified):
+    """Return the ETag to send with a 304 if the client's copy of the feed is current, otherwise None."""
+    if request.if_none_match:
+        for tag in representation_etags(etag):
+            if request.if_none_match.contains(tag):
+                return tag
+        return None
+    if last_modified is not None and request.if_modified_since is not None and \
+            last_modified.replace(microsecond=0) <= request.if_modified_since:
+        return etag
+    return None
+
+
+def escape_text(value):
+    return str(value).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,') \
+        .replace('\r\n', '\\n').replace('\n', '\\n')
+
+
+def fold(line):
+    """Split a content line into lines of at most LINE_LENGTH octets, each continuation starting with a space."""
+    if len(line.encode('utf-8')) <= LINE_LENGTH:
+        return line
+    parts, current, size, limit = [], '', 0, LINE_LENGTH
+    for char in line:
+        char_size = len(char.encode('utf-8'))
+        if size + char_size > limit:
+            parts.append(current)
+            # The leading space counts towards the length of continuation lines
+            current, size, limit = '', 0, LINE_LENGTH - 1
+        current += char
+        size += char_size
+    parts.append(current)
+    return '\r\n '.join(parts)
+
+
+def format_datetime(value):
+    return value.strftime('%Y%m%dT%H%M%S')
+
+
+def event(uid, stamp, properties):
+    """Lines of a VEVENT, properties being (name, value) with values already escaped."""
+    lines = ['BEGIN:VEVENT', 'UID:{}@{}'.format(uid, UID_DOMAIN), 'DTSTAMP:{}Z'.format(format_datetime(stamp))]
+    lines.extend('{}:{}'.format(name, value) for name, value in properties)
+    lines.append('END:VEVENT')
+    return lines
+
+
+def timetable_events(user_id, school_id, stamp):
+    """A weekly repeating event for each lesson the user attends or teaches, repeating every len(weeks) weeks."""
+    start = current_app.config.get('ICAL_TIMETABLE_START')
+    first_monday = start - datetime.timedelta(days=start.weekday())
+    week_ids = [week_id for (week_id,) in db.session.execute(
+        select([Week.__table__.c.id]).where(Week.__table__.c.school_id == school_id).order_by(Week.__table__.c.id)
+    )]
+    week_numbers = {week_id: number for number, week_id in enumerate(week_ids)}
+
+    timetabled = TimetabledLesson.__table__
+    period = Period.__table__
+    lesson = Lesson.__table__
+    subject = Subject.__table__
+    lessons = member_lessons(user_id)
+    query = select([
+        timetabled.c.id, period.c.week_id, period.c.day, period.c.start_time, period.c.end_time, period.c.name,
+        lesson.c.name, subject.c.name
+    ]) \
+        .select_from(
+            timetabled
+            .join(lessons, lessons.c.lesson_id == timetabled.c.lesson_id)
+            .join(period, period.c.id == timetabled.c.period_id)
+            .join(lesson, lesson.c.id == timetabled.c.lesson_id)
+            .outerjoin(subject, subject.c.id == lesson.c.subject_id)
+        ) \
+        .where(lesson.c.school_id == school_id) \
+        .order_by(period.c.week_id, period.c.day, period.c.start_time, timetabled.c.id)
+
+    lines = []
+    seen = set()
+    for timetabled_id, week_id, day, start_time, end_time, period_name, lesson_name, subject_name in \
+            db.session.execute(query):
+        # Someone both attending and teaching a lesson gets one event for it
+        if timetabled_id in seen or week_id not in week_numbers or None in (day, start_time, end_time):
+            continue
+        seen.add(timetabled_id)
+        date = first_monday + datetime.timedelta(days=7 * week_numbers[week_id] + day - 1)
+        description = ', '.join(str(part) for part in (subject_name, period_name) if part is not None)
+        lines.extend(event('timetabled-lesson-{}'.format(timetabled_id), stamp, [
+            ('SUMMARY', escape_text(lesson_name or '')),
+            ('DESCRIPTION', escape_text(description)),
+            ('DTSTART', format_datetime(datetime.datetime.combine(date, start_time))),
+            ('DTEND', format_datetime(datetime.datetime.combine(date, end_time))),
+            ('RRULE', 'FREQ=WEEKLY;INTERVAL={}'.format(len(week_ids)))
+        ]))
+    return lines
+
+
+def homework_events(user_id, school_id, stamp):
+    """An all day event on the due date of each homework set for a lesson the user attends or teaches."""
+    homework = Homework.__table__
+    lesson = Lesson.__table__
+    lessons = member_lessons(user_id)
+    query = select([homework.c.id, homework.c.title, homework.c.date_due, lesson.c.name]) \
+        .select_from(
+            homework
+            .join(lessons, lessons.c.lesson_id == homework.c.lesson_id)
+            .join(lesson, lesson.c.id == homework.c.lesson_id)
+        ) \
+        .where(lesson.c.school_id == school_id) \
+        .where(homework.c.date_due.isnot(None)) \
+        .order_by(homework.c.date_due, homework.c.id)
+
+    lines = []
+    seen = set()
+    for homework_id, title, date_due, lesson_name in db.session.execute(query):
+        if homework_id in seen:
+            continue
+        seen.add(homework_id)
+        lines.extend(event('homework-{}'.format(homework_id), stamp, [
+            ('SUMMARY', escape_text('Due: {}'.format(title or ''))),
+            ('DESCRIPTION', escape_text(lesson_name or '')),
+            ('DTSTART;VALUE=DATE', date_due.strftime('%Y%m%d')),
+            ('DTEND;VALUE=DATE', (date_due + datetime.timedelta(days=1)).strftime('%Y%m%d'))
+        ]))
+    return lines
+
+
+def cached_part(key, build):
+    cache = current_app.extensions.get('ical_cache')
+    if cache is None:
+        return build()
+    part = cache.get(key)
+    if part is None:
+        part = build()
+        cache.set(key, part)
+    return part
+
+
+def build_feed(user_id, school_id, versions):
+    """
+    The feed's text, built from the cached parts of it still current.
+
+    Each part's DTSTAMP is the time it last changed, so the same versions always give the same bytes.
+    """
+    timetable_version, timetable_modified_at, calendar_version, calendar_modified_at = versions
+    start = current_app.config.get('ICAL_TIMETABLE_START')
+    never = datetime.datetime.combine(start, datetime.time())
+    timetable_stamp = timetable_modified_at or never
+    homework_stamp = max(timetable_stamp, calendar_modified_at or never)
+
+    timetable = cached_part(
+        ('timetable', user_id, school_id, timetable_version, start),
+        lambda: timetable_events(user_id, school_id, timetable_stamp)
+    )
+    # Membership changes bump the timetable_version, so it is part of the key too
+    homework = cached_part(
+        ('homework', user_id, school_id, timetable_version, calendar_version),
+        lambda: homework_events(user_id, school_id, homework_stamp)
+    )
+    lines = ['BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:{}'.format(PRODID), 'CALSCALE:GREGORIAN',
+             'X-WR-CALNAME:Timetable']
+    lines.extend(timetable)
+    lines.extend(homework)
+    lines.append('END:VCALENDAR')
+    return ''.join(fold(line) + '\r\n' for line in lines)
+
+
+def ical_feed(request, token):
+    user_id, school_id, token_version = load_feed_token(token)
+    row = feed_versions(user_id, school_id)
+    if row is None or row.feed_token_version != token_version:
+        raise NotFoundError()
+    versions = tuple(row)[:4]
+    timetable_version, timetable_modified_at, calendar_version, calendar_modified_at = versions
+
+    etag = feed_etag(user_id, timetable_version, calendar_version)
+    modified = [value for value in (timetable_modified_at, calendar_modified_at) if value is not None]
+    last_modified = max(modified).replace(microsecond=0) if modified else None
+
+    matched_etag = not_modified_etag(request, etag, last_modified)
+    if matched_etag is not None:
+        response = current_app.response_class(status=304)
+        response.set_etag(matched_etag)
+    else:
+        body = build_feed(user_id, school_id, versions)
+        response = current_app.response_class(body, mimetype='text/calendar')
+        response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def feed_url(user_id, school_id, token_version):
+    token = feed_token(user_id, school_id, token_version)
+    return url_for('timetable.ical_feed_view', token=token, _external=True)
+
+
+def ical_feed_url(request):
+    return jsonify({
+        'success': True,
+        'url': feed_url(g.user.id, g.user.school_id, g.user.feed_token_version)
+    })
+
+
+def reset_ical_feed_url(request):
+    """Revoke the current user's feed URLs and return a new one."""
+    user_id = g.user.id
+    db.session.query(User).filter(User.id == user_id).update(
+        {User.feed_token_version: User.feed_token_version + 1},
+        synchronize_session=False
+    )
+    db.session.commit()
+    token_version = db.session.query(User.feed_token_version).filter(User.id == user_id).scalar()
+    return jsonify({'success': True, 'url': feed_url(user_id, g.user.school_id, token_version)})
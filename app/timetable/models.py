@@ -1,3 +1,5 @@
+import datetime
+import json
 from enum import Enum
 from datetime import time
 from app import db
@@ -7,7 +9,7 @@ from app.lessons.models import Lesson
 class Week(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120))
-    school_id = db.Column(db.Integer, db.ForeignKey('school.id'))
+    school_id = db.Column(db.Integer, db.ForeignKey('school.id'), index=True)
 
     def __init__(self, name, school_id):
         self.name = name
@@ -30,6 +32,10 @@ class Day(Enum):
 
 
 class Period(db.Model):
+    __table_args__ = (
+        db.Index('ix_period_week_id_day_start_time', 'week_id', 'day', 'start_time'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     week_id = db.Column(db.Integer, db.ForeignKey('week.id'))
     day = db.Column(db.Integer)
@@ -61,8 +67,8 @@ class Period(db.Model):
 
 class TimetabledLesson(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    period_id = db.Column(db.Integer, db.ForeignKey('period.id'))
-    lesson_id = db.Column(db.Integer, db.ForeignKey('lesson.id'))
+    period_id = db.Column(db.Integer, db.ForeignKey('period.id'), index=True)
+    lesson_id = db.Column(db.Integer, db.ForeignKey('lesson.id'), index=True)
 
     period = db.relationship('Period', backref=db.backref('period', lazy='dynamic'))
     lesson = db.relationship('Lesson', backref=db.backref('lesson', lazy='dynamic'))
@@ -77,7 +83,53 @@ class TimetabledLesson(db.Model):
             'lesson': self.lesson.to_dict()
         }
 
-"""
-for lesson in user.lessons_attending:
-    periods = lesson.timetabled_lessons
-"""
\ No newline at end of file
+
+class SolverJobStatus(Enum):
+    QUEUED = 0
+    RUNNING = 1
+    SUCCEEDED = 2
+    FAILED = 3
+
+
+class SolverJob(db.Model):
+    """A run of the timetable solver for a week, see app/timetable/solver_functions.py."""
+    __tablename__ = 'solver_job'
+
+    id = db.Column(db.Integer, primary_key=True)
+    school_id = db.Column(db.Integer, db.ForeignKey('school.id'), index=True)
+    week_id = db.Column(db.Integer, db.ForeignKey('week.id', ondelete='CASCADE'), index=True)
+    status = db.Column(db.Integer, nullable=False, default=SolverJobStatus.QUEUED.value)
+    # JSON, what to solve and the outcome
+    parameters = db.Column(db.Text)
+    result = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def __init__(self, school_id, week_id, parameters):
+        self.school_id = school_id
+        self.week_id = week_id
+        self.status = SolverJobStatus.QUEUED.value
+        self.parameters = json.dumps(parameters)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'school_id': self.school_id,
+            'week_id': self.week_id,
+            'status': SolverJobStatus(self.status).name,
+            'parameters': json.loads(self.parameters) if self.parameters else None,
+            'result': json.loads(self.result) if self.result else None,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+
+# At most one queued or running job per week, so two requests at once can't start solvers which overwrite each other
+ACTIVE_SOLVER_STATUSES = [SolverJobStatus.QUEUED.value, SolverJobStatus.RUNNING.value]
+db.Index(
+    'ix_solver_job_week_id_active', SolverJob.week_id, unique=True,
+    postgresql_where=SolverJob.status.in_(ACTIVE_SOLVER_STATUSES),
+    sqlite_where=SolverJob.status.in_(ACTIVE_SOLVER_STATUSES)
+)
@@ -0,0 +1,185 @@
+"""
+Functions to fill weeks with periods in bulk.
+
+A template is a day of periods, e.g. six periods with gaps between them for breaks, stamped onto some days of one or
+more weeks with a single executemany INSERT. Copying a week copies its periods and then its timetabled lessons with
+one INSERT ... SELECT each, so the rows never leave the database.
+"""
+import datetime
+
+from flask import g
+from sqlalchemy import and_, literal, select
+
+from app import db
+from app.encoding import jsonify
+from app.exceptions import CustomError
+from app.helper import check_keys, json_from_request
+from app.timetable.cache_functions import invalidate_timetable
+from app.timetable.models import Day, Period, TimetabledLesson, Week
+
+TIME_FORMATS = ('%H:%M', '%H:%M:%S')
+PERIOD_COLUMNS = ['week_id', 'day', 'start_time', 'end_time', 'name']
+
+
+def parse_time(value, key):
+    for time_format in TIME_FORMATS:
+        try:
+            return datetime.datetime.strptime(str(value), time_format).time()
+        except ValueError:
+            pass
+    raise CustomError(409, message="Invalid time for {}: {}. Use HH:MM.".format(key, value))
+
+
+def parse_template(periods):
+    """Return [(start_time, end_time, name)] sorted by start time, checking none of them overlap."""
+    if not isinstance(periods, list) or not periods:
+        raise CustomError(409, message="periods must be a list of periods.")
+
+    template = []
+    for period in periods:
+        if not isinstance(period, dict):
+            raise CustomError(409, message="periods must be a list of periods.")
+        check_keys(['start_time', 'end_time'], period)
+        start_time = parse_time(period['start_time'], 'start_time')
+        end_time = parse_time(period['end_time'], 'end_time')
+        if start_time >= end_time:
+            raise CustomError(409, message="Period starting at {} must end after it starts.".format(start_time))
+        template.append((start_time, end_time, period.get('name')))
+
+    template.sort(key=lambda period: period[0])
+    for (_, end_time, _), (start_time, _, _) in zip(template, template[1:]):
+        if start_time < end_time:
+            raise CustomError(409, message="Periods overlap at {}.".format(start_time))
+    return template
+
+
+def parse_days(days):
+    valid_days = {day.value for day in Day}
+    if not isinstance(days, list) or not days or any(day not in valid_days for day in days):
+        raise CustomError(409, message="days must be a list of days from 1 (Monday) to 5 (Friday).")
+    return sorted(set(days))
+
+
+def get_weeks(week_ids, school_id):
+    """Return the weeks with the given ids, checking they are all in the school."""
+    if any(not isinstance(week_id, int) or isinstance(week_id, bool) for week_id in week_ids):
+        raise CustomError(409, message="Week ids must be integers.")
+    week_ids = set(week_ids)
+    weeks = Week.query.filter(Week.id.in_(week_ids), Week.school_id == school_id).all()
+    invalid_ids = week_ids - {week.id for week in weeks}
+    if invalid_ids:
+        invalid_ids = sorted(invalid_ids, key=str)
+        raise CustomError(
+            409,
+            message="Invalid id in week_ids: {}".format(", ".join(str(week_id) for week_id in invalid_ids)),
+            invalid_ids=invalid_ids
+        )
+    return weeks
+
+
+def clear_weeks(week_ids, replace):
+    """
+    Delete the weeks' periods and their timetabled lessons if replace is set, otherwise check they have no periods.
+
+    Either way the weeks are empty afterwards, so copies can be matched to the periods they were copied from.
+    """
+    week_periods = db.session.query(Period.id).filter(Period.week_id.in_(week_ids))
+    if not replace:
+        if week_periods.first() is not None:
+            raise CustomError(409, message="Week already has periods. Set replace to replace them.")
+        return
+
+    TimetabledLesson.query.filter(TimetabledLesson.period_id.in_(week_periods.subquery())) \
+        .delete(synchronize_session=False)
+    Period.query.filter(Period.week_id.in_(week_ids)).delete(synchronize_session=False)
+
+
+def create_periods_from_template(request):
+    json_data = json_from_request(request)
+    check_keys(['week_ids', 'periods'], json_data)
+    school_id = g.user.school_id
+
+    template = parse_template(json_data['periods'])
+    days = parse_days(json_data.get('days', [day.value for day in Day]))
+    if not isinstance(json_data['week_ids'], list) or not json_data['week_ids']:
+        raise CustomError(409, message="week_ids must be a list of ids.")
+    weeks = get_weeks(json_data['week_ids'], school_id)
+    week_ids = [week.id for week in weeks]
+
+    clear_weeks(week_ids, json_data.get('replace', False))
+    rows = [
+        {'week_id': week_id, 'day': day, 'start_time': start_time, 'end_time': end_time, 'name': name}
+        for week_id in week_ids for day in days for start_time, end_time, name in template
+    ]
+    if rows:
+        db.session.execute(Period.__table__.insert(), rows)
+    invalidate_timetable(school_id)
+    db.session.commit()
+
+    return jsonify({'success': True, 'week_ids': sorted(week_ids), 'periods_created': len(rows)}), 201
+
+
+def copy_week_query(source_week_id, target_week_id):
+    """INSERT ... SELECT copying the source week's periods into the target week."""
+    period = Period.__table__
+    return period.insert().from_select(
+        PERIOD_COLUMNS,
+        select([
+            literal(target_week_id, db.Integer), period.c.day, period.c.start_time, period.c.end_time, period.c.name
+        ]).where(period.c.week_id == source_week_id)
+    )
+
+
+def copy_timetabled_lessons_query(source_week_id, target_week_id):
+    """
+    INSERT ... SELECT copying the source week's timetabled lessons to the matching periods of the target week.
+
+    Copied periods are matched by day, times and name, as the target week had no periods before they were copied.
+    """
+    timetabled = TimetabledLesson.__table__
+    source = Period.__table__.alias('source_period')
+    target = Period.__table__.alias('target_period')
+    return timetabled.insert().from_select(
+        ['period_id', 'lesson_id'],
+        select([target.c.id, timetabled.c.lesson_id])
+        .select_from(
+            timetabled
+            .join(source, source.c.id == timetabled.c.period_id)
+            .join(target, and_(
+                target.c.week_id == target_week_id,
+                target.c.day.isnot_distinct_from(source.c.day),
+                target.c.start_time.isnot_distinct_from(source.c.start_time),
+                target.c.end_time.isnot_distinct_from(source.c.end_time),
+                target.c.name.isnot_distinct_from(source.c.name)
+            ))
+        )
+        .where(source.c.week_id == source_week_id)
+    )
+
+
+def copy_week(request, week_id):
+    json_data = json_from_request(request)
+    check_keys(['week_id'], json_data)
+    school_id = g.user.school_id
+
+    source_week, = get_weeks([week_id], school_id)
+    target_week, = get_weeks([json_data['week_id']], school_id)
+    if source_week.id == target_week.id:
+        raise CustomError(409, message="Can't copy a week to itself.")
+
+    clear_weeks([target_week.id], json_data.get('replace', False))
+    periods_created = db.session.execute(copy_week_query(source_week.id, target_week.id)).rowcount
+    lessons_created = 0
+    if json_data.get('include_lessons', True):
+        lessons_created = db.session.execute(
+            copy_timetabled_lessons_query(source_week.id, target_week.id)
+        ).rowcount
+    invalidate_timetable(school_id)
+    db.session.commit()
+
+    return jsonify({
+        'success': True,
+        'week_id': target_week.id,
+        'periods_created': periods_created,
+        'timetabled_lessons_created': lessons_created
+    }), 201
@@ -0,0 +1,233 @@
+"""
+Schedule lessons into the periods of a week so no teacher or student is in two at once.
+
+Each lesson needs some number of sessions, each placed in a period. Two sessions conflict when their lessons share
+members and their periods overlap, weighted by the number of members shared. Members' existing timetabled lessons
+are fixed and count against a period too.
+
+A greedy pass places the most constrained sessions first, each in its least conflicting period. Local repair then
+makes the best move of a conflicting session to another period, with a tabu list so it doesn't undo its recent
+moves, until there are no conflicts or the time limit is reached. conflicts[lesson][period], the conflict of placing
+a session of the lesson in the period, is updated as sessions move rather than recounted, so each move costs the
+lesson's neighbours times the periods overlapping. Sessions still in conflict at the end are left unplaced, so the
+result never double books anyone.
+
+Works on plain ids so it can be run and tested without the database, see app/timetable/solver_functions.py.
+"""
+import random
+import time
+
+# Moving a session back to a period it left is tabu for TABU_TENURE times the conflicting sessions plus up to
+# TABU_RANDOM_TENURE iterations, as in TabuCol
+TABU_TENURE = 0.6
+TABU_RANDOM_TENURE = 10
+
+
+class SolverResult:
+    def __init__(self, placements, unplaced, iterations, seconds):
+        # [(lesson_id, period_id)] and [lesson_id] once per session which couldn't be placed
+        self.placements = placements
+        self.unplaced = unplaced
+        self.iterations = iterations
+        self.seconds = seconds
+
+    def to_dict(self):
+        return {
+            'placed': len(self.placements),
+            'unplaced': len(self.unplaced),
+            'unplaced_lesson_ids': sorted(set(self.unplaced)),
+            'iterations': self.iterations,
+            'seconds': round(self.seconds, 2)
+        }
+
+
+class Solver:
+    def __init__(self, periods, overlapping, lessons, busy=None, random_seed=None):
+        """
+        periods is [(period_id, day)], overlapping maps each period_id to the ids of periods overlapping it, itself
+        included. lessons maps lesson_id to (sessions needed, member ids) and busy maps a member id to the ids of
+        periods they are already timetabled in.
+        """
+        self.random = random.Random(random_seed)
+        self.period_ids = [period_id for period_id, _ in periods]
+        self.days = [day for _, day in periods]
+        period_index = {period_id: i for i, period_id in enumerate(self.period_ids)}
+        self.overlapping = [
+            [period_index[other_id] for other_id in overlapping[period_id] if other_id in period_index]
+            for period_id in self.period_ids
+        ]
+
+        self.lesson_ids = list(lessons)
+        lesson_index = {lesson_id: i for i, lesson_id in enumerate(self.lesson_ids)}
+        self.sessions = [i for i, lesson_id in enumerate(self.lesson_ids) for _ in range(lessons[lesson_id][0])]
+        self.lesson_sessions = [[] for _ in self.lesson_ids]
+        for session, lesson in enumerate(self.sessions):
+            self.lesson_sessions[lesson].append(session)
+
+        # Lessons sharing members, with how many they share, including each lesson with itself for its own sessions
+        lessons_of_member = {}
+        for lesson_id, (_, member_ids) in lessons.items():
+            for member_id in member_ids:
+                lessons_of_member.setdefault(member_id, []).append(lesson_index[lesson_id])
+        shared = [{} for _ in self.lesson_ids]
+        for member_lessons in lessons_of_member.values():
+            for i in member_lessons:
+                for j in member_lessons:
+                    shared[i][j] = shared[i].get(j, 0) + 1
+        self.neighbours = [list(weights.items()) for weights in shared]
+        self.self_weight = [weights.get(i, 0) for i, weights in enumerate(shared)]
+
+        # Members already busy in or overlapping each period
+        self.fixed = [[0] * len(self.period_ids) for _ in self.lesson_ids]
+        for member_id, busy_period_ids in (busy or {}).items():
+            blocked = set()
+            for period_id in busy_period_ids:
+                if period_id in period_index:
+                    blocked.update(self.overlapping[period_index[period_id]])
+            for i in lessons_of_member.get(member_id, ()):
+                for p in blocked:
+                    self.fixed[i][p] += 1
+
+        self.conflicts = [list(fixed) for fixed in self.fixed]
+        self.assignment = [None] * len(self.sessions)
+
+    def _add(self, session, period, sign):
+        for neighbour, weight in self.neighbours[self.sessions[session]]:
+            row = self.conflicts[neighbour]
+            for p in self.overlapping[period]:
+                row[p] += sign * weight
+
+    def place(self, session, period):
+        if self.assignment[session] is not None:
+            self._add(session, self.assignment[session], -1)
+        self.assignment[session] = period
+        if period is not None:
+            self._add(session, period, 1)
+
+    def cost(self, session, period):
+        """The conflict of a session being in a period, not counting the session itself where it is now."""
+        lesson = self.sessions[session]
+        cost = self.conflicts[lesson][period]
+        current = self.assignment[session]
+        if current is not None and period in self.overlapping[current]:
+            cost -= self.self_weight[lesson]
+        return cost
+
+    def best_period(self, session, tabu=()):
+        """The least conflicting period, preferring days the lesson has fewer sessions on, then at random."""
+        lesson = self.sessions[session]
+        sessions_on_day = {}
+        for other in self.lesson_sessions[lesson]:
+            period = self.assignment[other]
+            if other != session and period is not None:
+                sessions_on_day[self.days[period]] = sessions_on_day.get(self.days[period], 0) + 1
+
+        best, best_key = None, None
+        for period in range(len(self.period_ids)):
+            if period in tabu:
+                continue
+            key = (self.cost(session, period), sessions_on_day.get(self.days[period], 0), self.random.random())
+            if best_key is None or key < best_key:
+                best, best_key = period, key
+        return best
+
+    def total_conflicts(self):
+        """Conflicts between pairs of sessions are counted once, conflicts with fixed lessons once per session."""
+        total = 0
+        for session, period in enumerate(self.assignment):
+            if period is not None:
+                lesson = self.sessions[session]
+                total += self.cost(session, period) + self.fixed[lesson][period]
+        return total // 2
+
+    def conflicting_sessions(self):
+        return [
+            session for session, period in enumerate(self.assignment)
+            if period is not None and self.cost(session, period) > 0
+        ]
+
+    def greedy(self):
+        # Sessions of lessons sharing the most members with others first, they have the fewest good periods
+        order = sorted(
+            range(len(self.sessions)),
+            key=lambda s: -sum(weight for _, weight in self.neighbours[self.sessions[s]])
+        )
+        for session in order:
+            self.place(session, self.best_period(session))
+
+    def repair(self, deadline):
+        """
+        Tabu search until there are no conflicts or the deadline passes, keeping the best assignment found.
+
+        Each iteration makes the best move of a conflicting session to another period, even if it makes things worse,
+        unless it is tabu, i.e. moves a session back to a period it recently left, and doesn't beat the best found.
+        """
+        period_count = len(self.period_ids)
+        total = self.total_conflicts()
+        best_total, best_assignment = total, list(self.assignment)
+        # {(session, period): iteration until which moving the session back to the period is tabu}
+        tabu = {}
+        iterations = 0
+
+        while total > 0 and time.perf_counter() < deadline:
+            iterations += 1
+            conflicting = self.conflicting_sessions()
+            best_move, best_delta = None, None
+            for session in conflicting:
+                lesson = self.sessions[session]
+                row = self.conflicts[lesson]
+                current = self.assignment[session]
+                own = self.self_weight[lesson]
+                overlapping = self.overlapping[current]
+                current_cost = row[current] - own
+                for period in range(period_count):
+                    if period == current:
+                        continue
+                    delta = row[period] - (own if period in overlapping else 0) - current_cost
+                    if tabu.get((session, period), 0) > iterations and total + delta >= best_total:
+                        continue
+                    if best_delta is None or delta < best_delta or \
+                            (delta == best_delta and self.random.random() < 0.5):
+                        best_move, best_delta = (session, period), delta
+            if best_move is None:
+                break
+
+            session, period = best_move
+            tabu[(session, self.assignment[session])] = \
+                iterations + int(TABU_TENURE * len(conflicting)) + self.random.randrange(TABU_RANDOM_TENURE)
+            self.place(session, period)
+            total += best_delta
+            if total < best_total:
+                best_total, best_assignment = total, list(self.assignment)
+
+        for session, period in enumerate(best_assignment):
+            if self.assignment[session] != period:
+                self.place(session, period)
+        return iterations
+
+    def unplace_conflicts(self):
+        """Remove the most conflicting session until none conflict."""
+        while True:
+            conflicting = self.conflicting_sessions()
+            if not conflicting:
+                return
+            worst = max(conflicting, key=lambda s: self.cost(s, self.assignment[s]))
+            self.place(worst, None)
+
+    def solve(self, time_limit):
+        start = time.perf_counter()
+        if self.period_ids:
+            self.greedy()
+            iterations = self.repair(start + time_limit)
+            self.unplace_conflicts()
+        else:
+            iterations = 0
+
+        placements, unplaced = [], []
+        for session, period in enumerate(self.assignment):
+            lesson_id = self.lesson_ids[self.sessions[session]]
+            if period is None:
+                unplaced.append(lesson_id)
+            else:
+                placements.append((lesson_id, self.period_ids[period]))
+        return SolverResult(placements, unplaced, iterations, time.perf_counter() - start)
@@ -0,0 +1,206 @@
+"""
+Functions to run the timetable solver for a week as a background job and write its placements in bulk.
+
+POST /timetable/solve records a SolverJob and runs it on a pool of TIMETABLE_SOLVER_WORKERS threads, or before
+returning if TIMETABLE_SOLVER_BACKGROUND is off. GET /timetable/solve/<id> reports how it went. Solving is CPU bound
+and slows the other requests of the worker process running it, so large schools may prefer
+manage.py solve_timetable, which runs it in its own process. A job left RUNNING by a process which stopped has to be
+started again.
+"""
+import datetime
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, g
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.encoding import jsonify
+from app.exceptions import CustomError, NotFoundError
+from app.helper import check_keys, json_from_request
+from app.lessons.models import Lesson
+from app.timetable.cache_functions import invalidate_timetable
+from app.timetable.clash_functions import memberships, period_index
+from app.timetable.models import ACTIVE_SOLVER_STATUSES, Period, SolverJob, SolverJobStatus, TimetabledLesson, Week
+from app.timetable.solver import Solver
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=current_app.config.get('TIMETABLE_SOLVER_WORKERS', 1))
+        return _executor
+
+
+def solver_input(job):
+    """Return the periods, overlapping periods, lessons to place and members' fixed lessons for a job's week."""
+    parameters = json.loads(job.parameters)
+    index = period_index(job.school_id, week_id=job.week_id)
+    periods = [(period_id, day) for period_id, (_, day, _, _) in sorted(index.periods.items())]
+    overlapping = {period_id: index.overlapping_period(period_id) for period_id in index.periods}
+
+    lesson_ids = set(parameters['lesson_ids'])
+    sessions = {int(lesson_id): count for lesson_id, count in parameters.get('lesson_periods', {}).items()}
+    lessons = {
+        lesson_id: (sessions.get(lesson_id, parameters['periods_per_lesson']), set())
+        for lesson_id in lesson_ids
+    }
+
+    members = memberships()
+    for user_id, lesson_id in db.session.query(members.c.user_id, members.c.lesson_id) \
+            .filter(members.c.lesson_id.in_(lesson_ids)):
+        lessons[lesson_id][1].add(user_id)
+
+    # Lessons not being placed keep their periods in the week
+    timetabled = TimetabledLesson.__table__
+    busy = {}
+    fixed = db.session.query(members.c.user_id, timetabled.c.period_id) \
+        .select_from(timetabled) \
+        .join(members, members.c.lesson_id == timetabled.c.lesson_id) \
+        .join(Period, Period.id == timetabled.c.period_id) \
+        .filter(Period.week_id == job.week_id, ~timetabled.c.lesson_id.in_(lesson_ids))
+    for user_id, period_id in fixed:
+        busy.setdefault(user_id, set()).add(period_id)
+
+    return periods, overlapping, lessons, busy
+
+
+def write_placements(job, lesson_ids, placements):
+    """Replace the lessons' periods in the week with the placements, with one DELETE and one INSERT."""
+    week_period_ids = db.session.query(Period.id).filter(Period.week_id == job.week_id).subquery()
+    TimetabledLesson.query \
+        .filter(TimetabledLesson.lesson_id.in_(lesson_ids), TimetabledLesson.period_id.in_(week_period_ids)) \
+        .delete(synchronize_session=False)
+    if placements:
+        db.session.execute(
+            TimetabledLesson.__table__.insert(),
+            [{'lesson_id': lesson_id, 'period_id': period_id} for lesson_id, period_id in placements]
+        )
+    invalidate_timetable(job.school_id)
+
+
+def run_job(job_id):
+    job = SolverJob.query.get(job_id)
+    job.status = SolverJobStatus.RUNNING.value
+    job.started_at = datetime.datetime.utcnow()
+    db.session.commit()
+
+    try:
+        parameters = json.loads(job.parameters)
+        periods, overlapping, lessons, busy = solver_input(job)
+        solver = Solver(periods, overlapping, lessons, busy=busy, random_seed=parameters.get('random_seed'))
+        result = solver.solve(parameters['time_limit'])
+        write_placements(job, list(lessons), result.placements)
+
+        job.status = SolverJobStatus.SUCCEEDED.value
+        job.result = json.dumps(result.to_dict())
+    except Exception as e:
+        logger.exception("Timetable solver job {} failed".format(job_id))
+        db.session.rollback()
+        job = SolverJob.query.get(job_id)
+        job.status = SolverJobStatus.FAILED.value
+        job.result = json.dumps({'error': str(e)})
+    job.finished_at = datetime.datetime.utcnow()
+    db.session.commit()
+
+
+def _run_in_background(app, job_id):
+    with app.app_context():
+        try:
+            run_job(job_id)
+        finally:
+            db.session.remove()
+
+
+def parse_positive_int(data, key, default=None):
+    value = data.get(key, default)
+    if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+        raise CustomError(409, message="{} must be a positive integer.".format(key))
+    return value
+
+
+def create_solver_job(request):
+    json_data = json_from_request(request)
+    check_keys(['week_id'], json_data)
+    config = current_app.config
+    school_id = g.user.school_id
+
+    week = Week.query.filter_by(id=json_data['week_id'], school_id=school_id).first()
+    if week is None:
+        raise CustomError(409, message="Invalid week_id.")
+
+    periods_per_lesson = parse_positive_int(json_data, 'periods_per_lesson', 1)
+    time_limit = min(
+        parse_positive_int(json_data, 'time_limit', config.get('TIMETABLE_SOLVER_TIME_LIMIT')),
+        config.get('TIMETABLE_SOLVER_MAX_TIME_LIMIT')
+    )
+    # {lesson_id: periods} for lessons which need a different number of periods
+    lesson_periods = json_data.get('lesson_periods', {})
+    if not isinstance(lesson_periods, dict):
+        raise CustomError(409, message="lesson_periods must be an object of lesson ids to periods.")
+    for lesson_id in lesson_periods:
+        if not str(lesson_id).isdigit():
+            raise CustomError(409, message="Invalid lesson id in lesson_periods: {}".format(lesson_id))
+        parse_positive_int(lesson_periods, lesson_id)
+
+    # Every lesson in the school unless given
+    lesson_query = db.session.query(Lesson.id).filter(Lesson.school_id == school_id)
+    if 'lesson_ids' in json_data:
+        requested_ids = json_data['lesson_ids']
+        if not isinstance(requested_ids, list) or \
+                any(not isinstance(lesson_id, int) or isinstance(lesson_id, bool) for lesson_id in requested_ids):
+            raise CustomError(409, message="lesson_ids must be a list of ids.")
+        requested_ids = set(requested_ids)
+        lesson_ids = {lesson_id for (lesson_id,) in lesson_query.filter(Lesson.id.in_(requested_ids))}
+        invalid_ids = requested_ids - lesson_ids
+        if invalid_ids:
+            invalid_ids = sorted(invalid_ids, key=str)
+            raise CustomError(
+                409,
+                message="Invalid id in lesson_ids: {}".format(", ".join(str(lesson_id) for lesson_id in invalid_ids)),
+                invalid_ids=invalid_ids
+            )
+    else:
+        lesson_ids = {lesson_id for (lesson_id,) in lesson_query}
+
+    job = SolverJob(school_id, week.id, {
+        'lesson_ids': sorted(lesson_ids),
+        'periods_per_lesson': periods_per_lesson,
+        'lesson_periods': lesson_periods,
+        'time_limit': time_limit,
+        'random_seed': json_data.get('random_seed')
+    })
+    db.session.add(job)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # ix_solver_job_week_id_active allows one queued or running job per week
+        db.session.rollback()
+        active = SolverJob.query.filter(
+            SolverJob.week_id == week.id, SolverJob.status.in_(ACTIVE_SOLVER_STATUSES)
+        ).first()
+        raise CustomError(
+            409, message="A solver job is already running for this week.", job_id=active.id if active else None
+        )
+
+    if config.get('TIMETABLE_SOLVER_BACKGROUND'):
+        get_executor().submit(_run_in_background, current_app._get_current_object(), job.id)
+    else:
+        run_job(job.id)
+
+    return jsonify({'success': True, 'job': job.to_dict()}), 202
+
+
+def solver_job_detail(request, job_id):
+    job = SolverJob.query.filter_by(id=job_id, school_id=g.user.school_id).first()
+    if job is None:
+        raise NotFoundError()
+    return jsonify({'success': True, 'job': job.to_dict()})
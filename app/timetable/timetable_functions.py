@@ -0,0 +1,143 @@
+"""Functions to build a week's timetable grid, of days and their periods, with one query."""
+from flask import g
+from sqlalchemy import func, literal, null, select, union_all
+
+from app import db
+from app.encoding import jsonify
+from app.exceptions import NotFoundError
+from app.helper import get_int_query_param
+from app.lessons.models import Lesson, Subject, lesson_student, lesson_teacher
+from app.timetable.cache_functions import cached_timetable
+from app.timetable.models import Day, Period, TimetabledLesson, Week
+
+STUDENT = 'student'
+TEACHER = 'teacher'
+
+
+def member_lessons(user_id):
+    """The lessons a user attends or teaches as (lesson_id, role) rows."""
+    attending = select([lesson_student.c.lesson_id, literal(STUDENT).label('role')]) \
+        .where(lesson_student.c.user_id == user_id)
+    teaching = select([lesson_teacher.c.lesson_id, literal(TEACHER).label('role')]) \
+        .where(lesson_teacher.c.user_id == user_id)
+    return union_all(attending, teaching).alias('member_lesson')
+
+
+def single_lesson(lesson_id):
+    return select([literal(lesson_id).label('lesson_id'), null().label('role')]).alias('member_lesson')
+
+
+def timetable_query(school_id, week_id, lessons):
+    """
+    One row per period of the week and lesson from lessons timetabled in it.
+
+    Every period is returned, with None for the lesson when it is free, as is the week when it has no periods yet.
+    If week_id is None the school's first week is used.
+    """
+    week = Week.__table__
+    period = Period.__table__
+    timetabled = TimetabledLesson.__table__
+    lesson = Lesson.__table__
+    subject = Subject.__table__
+
+    slot = select([
+        timetabled.c.period_id,
+        lesson.c.id.label('lesson_id'),
+        lesson.c.name.label('lesson_name'),
+        subject.c.id.label('subject_id'),
+        subject.c.name.label('subject_name'),
+        lessons.c.role
+    ]) \
+        .select_from(
+            timetabled
+            .join(lessons, lessons.c.lesson_id == timetabled.c.lesson_id)
+            .join(lesson, lesson.c.id == timetabled.c.lesson_id)
+            .outerjoin(subject, subject.c.id == lesson.c.subject_id)
+        ) \
+        .alias('slot')
+
+    if week_id is None:
+        week_id = select([func.min(week.c.id)]).where(week.c.school_id == school_id).as_scalar()
+
+    return db.session.query(
+        week.c.id, week.c.name,
+        period.c.id, period.c.day, period.c.start_time, period.c.end_time, period.c.name,
+        slot.c.lesson_id, slot.c.lesson_name, slot.c.subject_id, slot.c.subject_name, slot.c.role
+    ) \
+        .select_from(
+            week
+            .outerjoin(period, period.c.week_id == week.c.id)
+            .outerjoin(slot, slot.c.period_id == period.c.id)
+        ) \
+        .filter(week.c.school_id == school_id, week.c.id == week_id) \
+        .order_by(period.c.day, period.c.start_time, period.c.id, slot.c.lesson_name, slot.c.lesson_id)
+
+
+def build_timetable(rows):
+    """Turn the rows of timetable_query into the week with each day's periods, or None if the week wasn't found."""
+    timetable = None
+    days = {}
+    periods = {}
+    for week_id, week_name, period_id, day, start_time, end_time, period_name, \
+            lesson_id, lesson_name, subject_id, subject_name, role in rows:
+        if timetable is None:
+            timetable = {
+                'week': {'id': week_id, 'name': week_name},
+                'days': [{'day': d.value, 'name': d.name, 'periods': []} for d in Day]
+            }
+            days = {d['day']: d for d in timetable['days']}
+        if period_id is None:
+            continue
+
+        period = periods.get(period_id)
+        if period is None:
+            period = periods[period_id] = {
+                'id': period_id,
+                'name': period_name,
+                'start_time': start_time,
+                'end_time': end_time,
+                'lessons': []
+            }
+            if day not in days:
+                days[day] = {'day': day, 'name': None, 'periods': []}
+                timetable['days'].append(days[day])
+            days[day]['periods'].append(period)
+
+        if lesson_id is not None:
+            period['lessons'].append({
+                'id': lesson_id,
+                'name': lesson_name,
+                'subject': {'id': subject_id, 'name': subject_name} if subject_id is not None else None,
+                'role': role
+            })
+    return timetable
+
+
+def my_timetable(request):
+    week_id = get_int_query_param(request, 'week_id')
+    school_id = g.user.school_id
+    user_id = g.user.id
+    timetable = cached_timetable(
+        school_id,
+        ('user', user_id, week_id),
+        lambda: build_timetable(timetable_query(school_id, week_id, member_lessons(user_id)))
+    )
+    if timetable is None:
+        raise NotFoundError()
+    return jsonify({'success': True, 'timetable': timetable})
+
+
+def lesson_timetable(request, lesson_id):
+    week_id = get_int_query_param(request, 'week_id')
+    school_id = g.user.school_id
+
+    def build():
+        # Deleting a lesson invalidates the cache, so it only needs checking when the timetable is built
+        if db.session.query(Lesson.id).filter(Lesson.id == lesson_id, Lesson.school_id == school_id).first() is None:
+            return None
+        return build_timetable(timetable_query(school_id, week_id, single_lesson(lesson_id)))
+
+    timetable = cached_timetable(school_id, ('lesson', lesson_id, week_id), build)
+    if timetable is None:
+        raise NotFoundError()
+    return jsonify({'success': True, 'timetable': timetable})
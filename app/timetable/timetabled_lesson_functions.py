@@ -0,0 +1,49 @@
+from flask import g
+
+from app import db
+from app.encoding import jsonify
+from app.exceptions import CustomError
+from app.helper import check_keys, get_record_by_id, json_from_request
+from app.lessons.models import Lesson
+from app.timetable.cache_functions import invalidate_timetable
+from app.timetable.clash_functions import find_clashes
+from app.timetable.models import Period, TimetabledLesson, Week
+
+
+def get_period(period_id, school_id):
+    period = Period.query.join(Week, Week.id == Period.week_id) \
+        .filter(Period.id == period_id, Week.school_id == school_id) \
+        .first()
+    if period is None:
+        raise CustomError(409, message="Invalid period_id.")
+    return period
+
+
+def create_timetabled_lesson(request):
+    json_data = json_from_request(request)
+    check_keys(['period_id', 'lesson_id'], json_data)
+
+    period = get_period(json_data['period_id'], g.user.school_id)
+    lesson = get_record_by_id(
+        json_data['lesson_id'],
+        Lesson,
+        custom_not_found_error=CustomError(409, message="Invalid lesson_id.")
+    )
+
+    clashes = find_clashes(g.user.school_id, period, lesson.id)
+    if clashes:
+        raise CustomError(409, message="Timetable clash.", clashes=clashes)
+
+    timetabled_lesson = TimetabledLesson(period_id=period.id, lesson_id=lesson.id)
+    db.session.add(timetabled_lesson)
+    invalidate_timetable(g.user.school_id)
+    db.session.commit()
+
+    return jsonify({
+        'success': True,
+        'timetabled_lesson': {
+            'id': timetabled_lesson.id,
+            'period_id': timetabled_lesson.period_id,
+            'lesson_id': timetabled_lesson.lesson_id
+        }
+    }), 201
@@ -1,4 +1,10 @@
 from app.permissions.decorators import permissions_required
+from app.timetable.clash_functions import clash_report_view
+from app.timetable.ical_functions import ical_feed, ical_feed_url, reset_ical_feed_url
+from app.timetable.period_functions import copy_week, create_periods_from_template
+from app.timetable.solver_functions import create_solver_job, solver_job_detail
+from app.timetable.timetable_functions import lesson_timetable, my_timetable
+from app.timetable.timetabled_lesson_functions import create_timetabled_lesson
 from app.timetable.week_functions import create_week
 from flask import Blueprint, request, g
 from flask_jwt import jwt_required
@@ -18,3 +24,75 @@ def index():
 def week_create_or_list():
     if request.method == "POST":
         return create_week(request)
+
+
+@timetable_blueprint.route('/week/<int:week_id>/copy', methods=("POST",))
+@jwt_required()
+@permissions_required({'Administrator'})
+def week_copy(week_id):
+    return copy_week(request, week_id)
+
+
+@timetable_blueprint.route('/period-template', methods=("POST",))
+@jwt_required()
+@permissions_required({'Administrator'})
+def period_template_create():
+    return create_periods_from_template(request)
+
+
+@timetable_blueprint.route('/me')
+@jwt_required()
+def my_timetable_view():
+    return my_timetable(request)
+
+
+@timetable_blueprint.route('/lesson/<int:lesson_id>')
+@jwt_required()
+def lesson_timetable_view(lesson_id):
+    return lesson_timetable(request, lesson_id)
+
+
+@timetable_blueprint.route('/timetabled-lesson', methods=("POST",))
+@jwt_required()
+@permissions_required({'Administrator'})
+def timetabled_lesson_create():
+    return create_timetabled_lesson(request)
+
+
+@timetable_blueprint.route('/clashes')
+@jwt_required()
+@permissions_required({'Administrator'})
+def clash_report_list():
+    return clash_report_view(request)
+
+
+@timetable_blueprint.route('/solve', methods=("POST",))
+@jwt_required()
+@permissions_required({'Administrator'})
+def solver_job_create():
+    return create_solver_job(request)
+
+
+@timetable_blueprint.route('/solve/<int:job_id>')
+@jwt_required()
+@permissions_required({'Administrator'})
+def solver_job_view(job_id):
+    return solver_job_detail(request, job_id)
+
+
+@timetable_blueprint.route('/ical')
+@jwt_required()
+def ical_feed_url_view():
+    return ical_feed_url(request)
+
+
+@timetable_blueprint.route('/ical/reset', methods=['POST'])
+@jwt_required()
+def reset_ical_feed_url_view():
+    return reset_ical_feed_url(request)
+
+
+# No JWT, calendar apps authenticate with the signed token in the URL
+@timetable_blueprint.route('/ical/<token>.ics')
+def ical_feed_view(token):
+    return ical_feed(request, token)
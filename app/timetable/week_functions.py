@@ -1,7 +1,9 @@
 from app import db
 from app.helper import check_keys, json_from_request
+from app.timetable.cache_functions import invalidate_timetable
 from app.timetable.models import Week
-from flask import g, jsonify
+from flask import g
+from app.encoding import jsonify
 
 
 def create_week(request):
@@ -17,6 +19,8 @@ def create_week(request):
     )
 
     db.session.add(week)
+    # Timetables and iCalendar feeds number and repeat the school's weeks
+    invalidate_timetable(g.user.school_id)
     db.session.commit()
 
     return jsonify(week.to_dict()), 201
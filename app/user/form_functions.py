@@ -1,8 +1,9 @@
 from app import db
 from app.exceptions import FieldInUseError
-from app.helper import get_record_by_id, json_from_request, check_keys
+from app.helper import get_record_by_id, json_from_request, check_keys, paginate
 from app.user.models import Form
-from flask import g, jsonify
+from flask import g
+from app.encoding import jsonify
 
 
 def create_form(request):
@@ -21,9 +22,10 @@ def create_form(request):
 
 
 def list_forms(request):
-    forms = Form.query.filter_by(school_id=g.user.school_id).all()
-    form_list = [f.to_dict() for f in forms]
-    return jsonify({'success': True, 'forms': form_list})
+    forms = Form.query.filter_by(school_id=g.user.school_id)
+    page = paginate(request, forms, sort_columns={'id': Form.id, 'name': Form.name})
+    form_list = [f.to_dict() for f in page.items]
+    return jsonify({'success': True, 'forms': form_list, **page.metadata()})
 
 
 def edit_form(request, form_id):
@@ -0,0 +1,50 @@
+"""Functions used when JWT_STATELESS_IDENTITY is set so a request can be authenticated without loading the User."""
+from app.exceptions import CustomError
+from app.permissions.models import Permission
+
+# Bit used for each default permission in a token's permission bitmap.
+# Only ever append to Permission.DEFAULTS or tokens already issued will be read incorrectly.
+PERMISSION_BITS = {permission['name']: 1 << n for n, permission in enumerate(Permission.DEFAULTS)}
+
+
+def permission_bitmap(permission_names):
+    """Encode the default permissions from permission_names as an integer. Custom permissions are left out."""
+    bitmap = 0
+    for name in permission_names:
+        bitmap |= PERMISSION_BITS.get(name, 0)
+    return bitmap
+
+
+def permissions_from_bitmap(bitmap):
+    return {name for name, bit in PERMISSION_BITS.items() if bitmap & bit}
+
+
+class LazyUser:
+    """
+    Stand in for a User stored in g.user.
+
+    id and school_id come from the token. Anything else is read from the real User, which is only
+    loaded from the database the first time it is needed.
+    """
+    def __init__(self, user_id, school_id, bitmap=0):
+        self.id = user_id
+        self.school_id = school_id
+        self.permission_bitmap = bitmap
+        self._user = None
+
+    def load(self):
+        if self._user is None:
+            from .models import User
+            self._user = User.query.get(self.id)
+            if self._user is None:
+                raise CustomError(404, message='User with id: {} was not found.'.format(self.id))
+        return self._user
+
+    def has_permissions(self, permissions, include_roles=True):
+        # The bitmap includes permissions granted through roles so can only answer that question
+        if include_roles and permissions.issubset(PERMISSION_BITS.keys()):
+            return permissions.issubset(permissions_from_bitmap(self.permission_bitmap))
+        return self.load().has_permissions(permissions, include_roles=include_roles)
+
+    def __getattr__(self, name):
+        return getattr(self.load(), name)
@@ -0,0 +1,245 @@
+"""Functions to create many users at once from an uploaded CSV or NDJSON file."""
+import csv
+import json
+from itertools import islice
+
+from flask import current_app, g
+
+from app import db
+from app.encoding import jsonify
+from app.exceptions import CustomError
+from app.homework.status_functions import rebuild_statuses
+from app.lessons.models import Lesson, lesson_student
+from app.permissions.cache_functions import invalidate_permissions
+from app.timetable.cache_functions import invalidate_timetable
+from app.permissions.models import Role, user_roles
+from app.user.models import Form, User
+from app.user.password_functions import hash_passwords
+
+EXPECTED_KEYS = ["first_name", "last_name", "password", "username", "email"]
+CSV_CONTENT_TYPES = {'text/csv'}
+NDJSON_CONTENT_TYPES = {'application/x-ndjson', 'application/ndjson', 'application/jsonl'}
+
+
+def read_rows(request):
+    """Yield each row of the upload as a dict, or None if it can't be parsed, without reading the whole body."""
+    lines = (line.decode('utf-8-sig') for line in request.stream)
+
+    if request.mimetype in CSV_CONTENT_TYPES:
+        # role_ids and lesson_ids are separated by ; in a CSV
+        for row in csv.DictReader(lines):
+            yield row
+    elif request.mimetype in NDJSON_CONTENT_TYPES:
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield row if isinstance(row, dict) else None
+    else:
+        raise CustomError(415, message="Expected a text/csv or application/x-ndjson upload.")
+
+
+def _parse_id(value):
+    if value is None or value == '':
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def _parse_ids(value):
+    if value is None or value == '':
+        return []
+    if isinstance(value, str):
+        value = [v for v in value.split(';') if v.strip()]
+    if not isinstance(value, list):
+        value = [value]
+    return [_parse_id(v) for v in value]
+
+
+def _is_scalar(value):
+    return isinstance(value, (str, int, float)) and not isinstance(value, bool)
+
+
+def clean_row(row):
+    """Return (data, errors) for one row, checking the keys user_create checks."""
+    if row is None:
+        return None, ["Could not parse row."]
+
+    errors = []
+    data = {}
+    for key in EXPECTED_KEYS:
+        value = row.get(key)
+        if value is None:
+            errors.append("Missing key: {}".format(key))
+        elif not _is_scalar(value):
+            errors.append("Value for key: {} must be a string".format(key))
+        elif str(value).strip() == '':
+            errors.append("Value for key: {} cannot be blank".format(key))
+        else:
+            value = str(value)
+        data[key] = value
+
+    # NDJSON values can be lists or objects, which can't be ids
+    form_id = row.get('form_id')
+    if form_id is not None and not _is_scalar(form_id):
+        errors.append("Invalid value for key: form_id")
+    for key in ('role_ids', 'lesson_ids'):
+        ids = row.get(key)
+        if ids is not None and not _is_scalar(ids) and \
+                not (isinstance(ids, list) and all(_is_scalar(i) for i in ids)):
+            errors.append("Invalid value for key: {}".format(key))
+    if errors:
+        return data, errors
+
+    data['form_id'] = _parse_id(form_id)
+    data['role_ids'] = _parse_ids(row.get('role_ids'))
+    data['lesson_ids'] = _parse_ids(row.get('lesson_ids'))
+    return data, errors
+
+
+class UserImport:
+    """
+    Create users from rows a chunk at a time.
+
+    Each chunk is checked with one query per table, its passwords are hashed on the process pool and it is
+    inserted with executemany before the next chunk is read.
+    """
+    def __init__(self, school_id, chunk_size):
+        self.school_id = school_id
+        self.chunk_size = chunk_size
+        self.seen_emails = set()
+        self.seen_usernames = set()
+        # {model: {id: belongs to school}} so each id is only looked up once
+        self.known_ids = {Form: {}, Role: {}, Lesson: {}}
+        self.report = []
+
+    def run(self, rows):
+        rows = enumerate(rows, start=1)
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                break
+            self.import_chunk(chunk)
+        return self.report
+
+    def invalid_ids(self, model, ids):
+        """Return the ids which are not a model in the school, querying only ids not seen before."""
+        known = self.known_ids[model]
+        unknown = {i for i in ids if i not in known}
+        if unknown:
+            query = db.session.query(model.id).filter(
+                model.id.in_([i for i in unknown if isinstance(i, int)]),
+                model.school_id == self.school_id
+            )
+            found = {model_id for (model_id,) in query}
+            known.update({i: i in found for i in unknown})
+        return [i for i in ids if not known[i]]
+
+    def existing_values(self, column, values, *criteria):
+        if not values:
+            return set()
+        query = db.session.query(column).filter(column.in_(values), *criteria)
+        return {value for (value,) in query}
+
+    def import_chunk(self, chunk):
+        rows = []
+        for row_number, row in chunk:
+            data, errors = clean_row(row)
+            rows.append((row_number, data, errors))
+
+        candidates = [data for _, data, errors in rows if not errors]
+        taken_emails = self.existing_values(User.email, {data['email'] for data in candidates})
+        taken_usernames = self.existing_values(
+            User.username, {data['username'] for data in candidates}, User.school_id == self.school_id
+        )
+        self.invalid_ids(Form, {data['form_id'] for data in candidates if data['form_id'] is not None})
+        self.invalid_ids(Role, {i for data in candidates for i in data['role_ids']})
+        self.invalid_ids(Lesson, {i for data in candidates for i in data['lesson_ids']})
+
+        new_users = []
+        for row_number, data, errors in rows:
+            if not errors:
+                errors.extend(self.check_row(data, taken_emails, taken_usernames))
+            if errors:
+                self.report.append({'row': row_number, 'success': False, 'errors': errors})
+                continue
+
+            self.seen_emails.add(data['email'])
+            self.seen_usernames.add(data['username'])
+            new_users.append((row_number, data))
+
+        if new_users:
+            self.insert_users(new_users)
+
+    def check_row(self, data, taken_emails, taken_usernames):
+        errors = []
+        if data['email'] in taken_emails or data['email'] in self.seen_emails:
+            errors.append("email already in use.")
+        if data['username'] in taken_usernames or data['username'] in self.seen_usernames:
+            errors.append("username already in use.")
+        if data['form_id'] is not None and self.invalid_ids(Form, [data['form_id']]):
+            errors.append("Invalid form_id.")
+        for key, model in (('role_ids', Role), ('lesson_ids', Lesson)):
+            invalid_ids = self.invalid_ids(model, data[key])
+            if invalid_ids:
+                errors.append("Invalid id in {}: {}".format(key, ", ".join(str(i) for i in invalid_ids)))
+        return errors
+
+    def insert_users(self, new_users):
+        passwords = hash_passwords([data['password'] for _, data in new_users])
+        db.session.execute(User.__table__.insert(), [
+            {
+                'school_id': self.school_id,
+                'username': data['username'],
+                'first_name': data['first_name'],
+                'last_name': data['last_name'],
+                'email': data['email'],
+                'password': password,
+                'form_id': data['form_id']
+            } for (_, data), password in zip(new_users, passwords)
+        ])
+
+        # executemany doesn't return primary keys so look them up by the unique email
+        query = db.session.query(User.email, User.id).filter(User.email.in_([data['email'] for _, data in new_users]))
+        user_ids = dict(query.all())
+
+        roles = [
+            {'user_id': user_ids[data['email']], 'role_id': role_id}
+            for _, data in new_users for role_id in set(data['role_ids'])
+        ]
+        if roles:
+            db.session.execute(user_roles.insert(), roles)
+            invalidate_permissions(self.school_id)
+
+        lessons = [
+            {'user_id': user_ids[data['email']], 'lesson_id': lesson_id}
+            for _, data in new_users for lesson_id in set(data['lesson_ids'])
+        ]
+        if lessons:
+            db.session.execute(lesson_student.insert(), lessons)
+            rebuild_statuses(user_ids={lesson['user_id'] for lesson in lessons})
+            invalidate_timetable(self.school_id)
+
+        db.session.commit()
+
+        for row_number, data in new_users:
+            self.report.append({'row': row_number, 'success': True, 'id': user_ids[data['email']]})
+
+
+def user_import(request):
+    chunk_size = current_app.config.get('USER_IMPORT_CHUNK_SIZE', 500)
+    report = UserImport(g.user.school_id, chunk_size).run(read_rows(request))
+    report.sort(key=lambda r: r['row'])
+
+    created = len([r for r in report if r['success']])
+    return jsonify({
+        'success': True,
+        'created': created,
+        'failed': len(report) - created,
+        'rows': report
+    })
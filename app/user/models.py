@@ -1,7 +1,7 @@
 from app import db
 
 
-from flask_bcrypt import generate_password_hash
+from app.user.password_functions import hash_password
 from app.permissions.models import user_roles, user_permissions
 from app.lessons.models import lesson_student, lesson_teacher
 
@@ -10,6 +10,7 @@ class User(db.Model):
     """Represents a user."""
     __table_args__ = (
         db.UniqueConstraint('school_id', 'username'),
+        db.Index('ix_user_school_id_id', 'school_id', 'id'),
         {}
     )
 
@@ -22,6 +23,15 @@ class User(db.Model):
     email = db.Column(db.String(120), unique=True)
     password = db.Column(db.LargeBinary())
     form_id = db.Column(db.Integer, db.ForeignKey('form.id'), nullable=True)
+    # Incremented whenever homework is set for one of the user's lessons, used with the school's timetable_version
+    # to tell whether their iCalendar feed changed, see app/timetable/ical_functions.py
+    calendar_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    calendar_modified_at = db.Column(db.DateTime, nullable=True)
+    # Part of the user's iCalendar feed URL, incremented to revoke it
+    feed_token_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    # Properties included in to_dict and UserSchema
+    FIELDS = ['id', 'first_name', 'last_name', 'email', 'username', 'school_id', 'form_id']
 
     form = db.relationship('Form', backref=db.backref('form', lazy='dynamic'))
 
@@ -62,19 +72,11 @@ class User(db.Model):
 
     @classmethod
     def generate_password_hash(self, password):
-        return generate_password_hash(password)
+        return hash_password(password)
 
     def to_dict(self, nest_roles=False, nest_role_permissions=False, nest_permissions=False, nest_form=False):
         """Convert instance into a dict, excluding password."""
-        user_dictionary = {
-            'id': self.id,
-            'first_name': self.first_name,
-            'last_name': self.last_name,
-            'email': self.email,
-            'username': self.username,
-            'school_id': self.school_id,
-            'form_id': self.form_id
-        }
+        user_dictionary = {field: getattr(self, field) for field in self.FIELDS}
         if nest_roles:
             user_dictionary['roles'] = [r.to_dict(nest_permissions=nest_role_permissions) for r in self.roles]
 
@@ -87,23 +89,20 @@ class User(db.Model):
         return user_dictionary
 
     def has_permissions(self, permissions, include_roles=True):
-        users_permissions = {permission.name for permission in self.permissions}
-
-        if include_roles:
-            for role in self.roles:
-                for permission in role.permissions:
-                    users_permissions.add(permission.name)
+        from app.permissions.cache_functions import get_access_summary
+        access = get_access_summary(self)
+        users_permissions = access.permissions if include_roles else access.direct_permissions
         return permissions.issubset(users_permissions)
 
     def has_roles(self, roles):
-        users_roles = {role.name for role in self.roles}
-        return roles.issubset(users_roles)
+        from app.permissions.cache_functions import get_access_summary
+        return roles.issubset(get_access_summary(self).roles)
 
 
 class Form(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120))
-    school_id = db.Column(db.Integer, db.ForeignKey('school.id'))
+    school_id = db.Column(db.Integer, db.ForeignKey('school.id'), index=True)
 
     def __init__(self, name, school_id):
         self.name = name
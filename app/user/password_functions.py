@@ -0,0 +1,152 @@
+"""
+Functions to hash and check passwords on a bounded pool of workers.
+
+bcrypt is deliberately slow, so doing it on the request thread lets a burst of logins block every other request.
+Password work is instead sent to PASSWORD_HASH_WORKERS threads or processes. Once PASSWORD_HASH_QUEUE_LIMIT
+jobs are waiting a 429 is returned rather than queueing more.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from flask import current_app
+from flask_bcrypt import check_password_hash, generate_password_hash
+
+from app import metrics
+from app.exceptions import TooManyRequestsError
+
+_pool = None
+_pool_lock = threading.Lock()
+
+hash_latency = metrics.histogram(
+    'password_hash_seconds',
+    'Time taken to hash or check a password, including time spent queueing.'
+)
+hash_rejected = metrics.counter('password_hash_rejected_total', 'Password jobs rejected because the queue was full.')
+
+
+def _hash_password(password_and_rounds):
+    # May run in a worker process so must not use the app
+    password, rounds = password_and_rounds
+    return generate_password_hash(password, rounds)
+
+
+def _check_password(password_hash_and_password):
+    password_hash, password = password_hash_and_password
+    return check_password_hash(password_hash, password)
+
+
+class PasswordPool:
+    """An executor which refuses work once max_pending jobs are already running or queued."""
+    def __init__(self, executor, workers, max_pending):
+        self.executor = executor
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.lock = threading.Lock()
+
+    def _reserve(self, number_of_jobs, check_limit=True):
+        with self.lock:
+            if check_limit and self.max_pending is not None and self.pending + number_of_jobs > self.max_pending:
+                hash_rejected.inc()
+                raise TooManyRequestsError()
+            self.pending += number_of_jobs
+
+    def _release(self, number_of_jobs):
+        with self.lock:
+            self.pending -= number_of_jobs
+
+    def run(self, operation, function, argument):
+        """Run one job on the pool and wait for its result."""
+        self._reserve(1)
+        start = time.perf_counter()
+        try:
+            return self.executor.submit(function, argument).result()
+        finally:
+            self._release(1)
+            hash_latency.observe(time.perf_counter() - start, operation=operation)
+
+    def map(self, operation, function, arguments):
+        """
+        Run many jobs, returning results in the same order.
+
+        Jobs are sent one worker's worth at a time so single jobs, e.g. logins, only wait for one batch. Batches are
+        never rejected but do count towards the limit.
+        """
+        results = []
+        for i in range(0, len(arguments), self.workers):
+            batch = arguments[i:i + self.workers]
+            self._reserve(len(batch), check_limit=False)
+            start = time.perf_counter()
+            try:
+                results.extend(self.executor.map(function, batch))
+            finally:
+                self._release(len(batch))
+                elapsed = time.perf_counter() - start
+                for _ in batch:
+                    hash_latency.observe(elapsed, operation=operation)
+        return results
+
+
+def number_of_workers():
+    return current_app.config.get('PASSWORD_HASH_WORKERS') or os.cpu_count()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            config = current_app.config
+            workers = number_of_workers()
+            if config.get('PASSWORD_HASH_EXECUTOR', 'thread') == 'process':
+                executor = ProcessPoolExecutor(max_workers=workers)
+            else:
+                executor = ThreadPoolExecutor(max_workers=workers)
+
+            queue_limit = config.get('PASSWORD_HASH_QUEUE_LIMIT')
+            _pool = PasswordPool(executor, workers, None if queue_limit is None else workers + queue_limit)
+        return _pool
+
+
+def shutdown_pool():
+    """Stop the workers, a new pool is created from the current config when next needed."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.executor.shutdown()
+            _pool = None
+
+
+def log_rounds():
+    return current_app.config.get('BCRYPT_LOG_ROUNDS', 12)
+
+
+def hash_password(password):
+    if not password:
+        raise ValueError('Password must be non-empty.')
+    return get_pool().run('hash', _hash_password, (password, log_rounds()))
+
+
+def hash_passwords(passwords):
+    """Hash many passwords at once, spread over every worker. Hashes are returned in the same order."""
+    rounds = log_rounds()
+    return get_pool().map('hash', _hash_password, [(password, rounds) for password in passwords])
+
+
+def check_password(password_hash, password):
+    return get_pool().run('check', _check_password, (password_hash, password))
+
+
+def hash_rounds(password_hash):
+    """Return the cost a bcrypt hash was made with, e.g. 12 for $2b$12$..."""
+    if isinstance(password_hash, str):
+        password_hash = password_hash.encode('utf-8')
+    try:
+        return int(bytes(password_hash).split(b'$')[2])
+    except (IndexError, ValueError):
+        return None
+
+
+def needs_rehash(password_hash):
+    return hash_rounds(password_hash) != log_rounds()
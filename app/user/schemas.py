@@ -0,0 +1,19 @@
+from app.permissions.schemas import PermissionSchema, RoleSchema, RoleWithPermissionsSchema
+from app.serializers import Schema
+
+from .models import Form, User
+
+FormSchema = Schema(Form, ['id', 'name', 'school_id'])
+UserSchema = Schema(User, User.FIELDS)
+
+
+def user_schema(nest_roles=False, nest_role_permissions=False, nest_permissions=False, nest_form=False):
+    """Return the UserSchema matching User.to_dict's nest_* flags."""
+    nested = {}
+    if nest_roles:
+        nested['roles'] = RoleWithPermissionsSchema if nest_role_permissions else RoleSchema
+    if nest_permissions:
+        nested['permissions'] = PermissionSchema
+    if nest_form:
+        nested['form'] = FormSchema
+    return UserSchema.nest(**nested)
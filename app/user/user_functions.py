@@ -1,8 +1,14 @@
 from app import db
 from app.exceptions import FieldInUseError, CustomError
-from app.helper import get_boolean_query_param, json_from_request, check_keys, get_record_by_id, check_values_not_blank
+from app.helper import get_boolean_query_param, json_from_request, check_keys, get_record_by_id, \
+    check_values_not_blank, get_list_query_param, paginate
+from app.permissions.models import Permission, Role
 from app.user.models import Form
-from flask import jsonify, g
+from app.user.schemas import user_schema
+from flask import g
+from app.encoding import jsonify
+from sqlalchemy import or_
+from sqlalchemy.orm import load_only
 from .models import User
 
 
@@ -12,16 +18,50 @@ def user_listing(request):
     nest_permissions = get_boolean_query_param(request, 'nest-permissions')
     nest_forms = get_boolean_query_param(request, 'nest-forms')
 
+    fields = get_list_query_param(request, 'fields')
+    invalid_fields = [field for field in fields if field not in User.FIELDS]
+    if invalid_fields:
+        raise CustomError(409, message="Invalid field: {}".format(", ".join(invalid_fields)))
+
     users = User.query.filter_by(school_id=g.user.school_id)
-    users_list = [
-        u.to_dict(
-            nest_roles=nest_roles,
-            nest_role_permissions=nest_role_permissions,
-            nest_permissions=nest_permissions,
-            nest_form=nest_forms
-        ) for u in users
-        ]
-    return jsonify({'success': True, 'users': users_list})
+
+    # Filters, ?form_id= is handled by paginate
+    role = request.args.get('role')
+    if role:
+        users = users.filter(User.roles.any(Role.name == role))
+
+    permission = request.args.get('permission')
+    if permission:
+        users = users.filter(or_(
+            User.permissions.any(Permission.name == permission),
+            User.roles.any(Role.permissions.any(Permission.name == permission))
+        ))
+
+    schema = user_schema(
+        nest_roles=nest_roles,
+        nest_role_permissions=nest_role_permissions,
+        nest_permissions=nest_permissions,
+        nest_form=nest_forms
+    )
+    options = []
+    if fields:
+        schema = schema.only(*fields)
+        columns = set(fields) | {'id'}
+        if nest_forms:
+            columns.add('form_id')
+        options.append(load_only(*columns))
+
+    page = paginate(
+        request, users,
+        sort_columns={
+            'id': User.id, 'first_name': User.first_name, 'last_name': User.last_name,
+            'username': User.username, 'email': User.email
+        },
+        filters={'form_id': User.form_id},
+        options=options,
+        schema=schema
+    )
+    return jsonify({'success': True, 'users': schema.dump_many(page.items), **page.metadata()})
 
 
 def user_create(request):
@@ -2,6 +2,7 @@ from app.permissions import permissions_required
 from app.user.form_functions import create_form, list_forms, edit_form, delete_form, form_detail
 from app.user.user_functions import user_listing, user_create, current_user_details, user_update, user_detail, \
     user_delete
+from app.user.import_functions import user_import
 from flask import Blueprint, request
 from flask_jwt import jwt_required
 
@@ -25,6 +26,14 @@ def user_listing_or_create_view():
         return user_create(request)
 
 
+@user_blueprint.route("/import", methods=["POST"])
+@jwt_required()
+@permissions_required({'Administrator'})
+def user_import_view():
+    """Route to create many Users from a CSV or NDJSON upload."""
+    return user_import(request)
+
+
 @user_blueprint.route("/user/<int:user_id>", methods=["PUT", "GET", "DELETE"])
 @jwt_required()
 def user_update_or_delete(user_id):
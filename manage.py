@@ -60,5 +60,72 @@ def create_hw_types():
         db.session.add(t)
     db.session.commit()
 
+
+@manager.option('-h', '--homework_id', dest='homework_id', type=int, default=None)
+@manager.option('-l', '--lesson_id', dest='lesson_id', type=int, default=None)
+def rebuild_homework_status(homework_id=None, lesson_id=None):
+    """Rebuild homework_status from homework, lesson_student and submission, for everything by default."""
+    from app.homework.status_functions import rebuild_statuses
+    from app.homework.models import HomeworkStatus
+    rebuild_statuses(homework_id=homework_id, lesson_id=lesson_id)
+    db.session.commit()
+    logging.info("Rebuilt homework_status, {} rows".format(HomeworkStatus.query.count()))
+
+
+@manager.option('-w', '--week_id', dest='week_id', type=int)
+@manager.option('-p', '--periods_per_lesson', dest='periods_per_lesson', type=int, default=1)
+@manager.option('-t', '--time_limit', dest='time_limit', type=int, default=None)
+def solve_timetable(week_id, periods_per_lesson=1, time_limit=None):
+    """Timetable every lesson in a week's school into its periods, in this process rather than the web workers."""
+    from app.lessons.models import Lesson
+    from app.timetable.models import SolverJob, Week
+    from app.timetable.solver_functions import run_job
+    from sqlalchemy.exc import IntegrityError
+    week = Week.query.get(week_id)
+    if week is None:
+        logging.error("Week {} not found".format(week_id))
+        raise SystemExit(1)
+    lesson_ids = [lesson_id for (lesson_id,) in db.session.query(Lesson.id).filter(Lesson.school_id == week.school_id)]
+    job = SolverJob(week.school_id, week.id, {
+        'lesson_ids': sorted(lesson_ids),
+        'periods_per_lesson': periods_per_lesson,
+        'lesson_periods': {},
+        'time_limit': time_limit or app.config.get('TIMETABLE_SOLVER_TIME_LIMIT'),
+        'random_seed': None
+    })
+    db.session.add(job)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        logging.error("A solver job is already running for week {}".format(week_id))
+        raise SystemExit(1)
+    run_job(job.id)
+    logging.info("Solver job {}: {} {}".format(job.id, job.to_dict()['status'], job.result))
+
+
+@manager.command
+def audit_indexes():
+    """EXPLAIN the hot queries in app/index_audit.py and report any which scan a table or sort a page."""
+    from app.index_audit import audit_indexes as run_audit
+    report = run_audit()
+    for result in report:
+        if result['sequential_scans'] or result['sorts']:
+            if result['sequential_scans']:
+                logging.warning("{}: sequential scan on {}".format(
+                    result['query'], ", ".join(result['sequential_scans'])
+                ))
+            if result['sorts']:
+                logging.warning("{}: page sorted rather than read in index order".format(result['query']))
+            for line in result['plan']:
+                logging.warning("    {}".format(line))
+        else:
+            logging.info("{}: ok".format(result['query']))
+
+    failed = [result for result in report if result['sequential_scans'] or result['sorts']]
+    logging.info("{} of {} queries scan a table or sort a page".format(len(failed), len(report)))
+    if failed:
+        raise SystemExit(1)
+
 if __name__ == "__main__":
     manager.run()
\ No newline at end of file
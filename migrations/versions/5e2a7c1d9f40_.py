@@ -0,0 +1,50 @@
+"""empty message
+
+Revision ID: 5e2a7c1d9f40
+Revises: 3b9d2f6a1c84
+Create Date: 2026-10-18 15:21:09.663120
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '5e2a7c1d9f40'
+down_revision = '3b9d2f6a1c84'
+
+from alembic import op
+import sqlalchemy as sa
+
+# (name, table, columns), also declared on the models
+INDEXES = [
+    ('ix_comment_submission_id', 'comment', ['submission_id']),
+    ('ix_form_school_id', 'form', ['school_id']),
+    ('ix_homework_lesson_id_date_due', 'homework', ['lesson_id', 'date_due']),
+    ('ix_lesson_school_id_name', 'lesson', ['school_id', 'name']),
+    ('ix_lesson_student_user_id_lesson_id', 'lesson_student', ['user_id', 'lesson_id']),
+    ('ix_lesson_teacher_user_id_lesson_id', 'lesson_teacher', ['user_id', 'lesson_id']),
+    ('ix_period_week_id_day_start_time', 'period', ['week_id', 'day', 'start_time']),
+    ('ix_question_homework_id', 'question', ['homework_id']),
+    ('ix_quiz_answer_question_id', 'quiz_answer', ['question_id']),
+    ('ix_role_school_id', 'role', ['school_id']),
+    ('ix_role_permissions_permission_id', 'role_permissions', ['permission_id']),
+    ('ix_role_permissions_role_id_permission_id', 'role_permissions', ['role_id', 'permission_id']),
+    ('ix_subject_school_id', 'subject', ['school_id']),
+    ('ix_submission_homework_id_user_id', 'submission', ['homework_id', 'user_id']),
+    ('ix_submission_user_id_homework_id', 'submission', ['user_id', 'homework_id']),
+    ('ix_timetabled_lesson_lesson_id', 'timetabled_lesson', ['lesson_id']),
+    ('ix_timetabled_lesson_period_id', 'timetabled_lesson', ['period_id']),
+    ('ix_user_permissions_permission_id', 'user_permissions', ['permission_id']),
+    ('ix_user_permissions_user_id_permission_id', 'user_permissions', ['user_id', 'permission_id']),
+    ('ix_user_roles_role_id', 'user_roles', ['role_id']),
+    ('ix_user_roles_user_id_role_id', 'user_roles', ['user_id', 'role_id']),
+    ('ix_week_school_id', 'week', ['school_id']),
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False)
+
+
+def downgrade():
+    for name, table, columns in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
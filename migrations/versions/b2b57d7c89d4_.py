@@ -0,0 +1,44 @@
+"""empty message
+
+Revision ID: b2b57d7c89d4
+Revises: c61f0b8e2d4a
+Create Date: 2026-10-18 22:14:37.508216
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'b2b57d7c89d4'
+down_revision = 'c61f0b8e2d4a'
+
+from alembic import op
+import sqlalchemy as sa
+
+# (name, table, columns), also declared on the models
+INDEXES = [
+    ('ix_homework_status_homework_id_user_id', 'homework_status', ['homework_id', 'user_id']),
+    ('ix_homework_status_user_id_date_due_homework_id', 'homework_status', ['user_id', 'date_due', 'homework_id']),
+    ('ix_lesson_school_id_id', 'lesson', ['school_id', 'id']),
+    ('ix_permission_school_id_id', 'permission', ['school_id', 'id']),
+    ('ix_submission_homework_id_id', 'submission', ['homework_id', 'id']),
+    ('ix_submission_user_id_id', 'submission', ['user_id', 'id']),
+    ('ix_user_school_id_id', 'user', ['school_id', 'id']),
+]
+# Replaced by the indexes above which lead with the same columns
+REPLACED_INDEXES = [
+    ('ix_homework_status_homework_id', 'homework_status', ['homework_id']),
+    ('ix_homework_status_user_id_date_due', 'homework_status', ['user_id', 'date_due']),
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False)
+    for name, table, columns in REPLACED_INDEXES:
+        op.drop_index(name, table_name=table)
+
+
+def downgrade():
+    for name, table, columns in REPLACED_INDEXES:
+        op.create_index(name, table, columns, unique=False)
+    for name, table, columns in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
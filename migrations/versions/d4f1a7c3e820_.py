@@ -0,0 +1,28 @@
+"""empty message
+
+Revision ID: d4f1a7c3e820
+Revises: aac197ef1c66
+Create Date: 2026-10-18 23:41:09.271604
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'd4f1a7c3e820'
+down_revision = 'aac197ef1c66'
+
+from alembic import op
+import sqlalchemy as sa
+
+# Queued or running, see SolverJobStatus
+ACTIVE_SOLVER_STATUSES = sa.text('status IN (0, 1)')
+
+
+def upgrade():
+    op.create_index(
+        'ix_solver_job_week_id_active', 'solver_job', ['week_id'], unique=True,
+        postgresql_where=ACTIVE_SOLVER_STATUSES, sqlite_where=ACTIVE_SOLVER_STATUSES
+    )
+
+
+def downgrade():
+    op.drop_index('ix_solver_job_week_id_active', table_name='solver_job')
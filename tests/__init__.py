@@ -1,23 +1,118 @@
+"""
+Test helpers.
+
+The app and its database schema are created once per process. Each test runs inside a transaction on one
+connection which is rolled back afterwards. App code can still commit: each commit releases a SAVEPOINT and a new
+one is started. Testing uses an in memory SQLite database unless TEST_DATABASE_URL is set, see config.py.
+"""
 import unittest
+from contextlib import contextmanager
+
+from sqlalchemy import event
 
 from app import db, create_app
 
 import json
 
+# Statements run to isolate tests rather than by the code being tested
+ISOLATION_STATEMENTS = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+_app = None
+
+
+@contextmanager
+def count_queries():
+    """Collects every SQL statement executed inside the block into the yielded list."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if not statement.startswith(ISOLATION_STATEMENTS):
+            statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def _use_sqlite_savepoints(engine):
+    """pysqlite begins and ends transactions itself, which breaks SAVEPOINT. Let SQLAlchemy do it instead."""
+    @event.listens_for(engine, 'connect')
+    def connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, 'begin')
+    def begin(connection):
+        connection.execute('BEGIN')
+
 
-class APITestCase(unittest.TestCase):
+def get_app():
+    """Return the app shared by every test, creating it and the schema the first time."""
+    global _app
+    if _app is None:
+        app = create_app('testing')
+        with app.app_context():
+            if db.engine.dialect.name == 'sqlite':
+                _use_sqlite_savepoints(db.engine)
+            # A file or server database may have been left by an earlier run
+            db.drop_all()
+            db.create_all()
+        _app = app
+    return _app
+
+
+class DatabaseTestCase(unittest.TestCase):
+    """Runs each test in an app context with a session whose changes are rolled back afterwards."""
     def setUp(self):
-        self.app = create_app('testing')
+        self.app = get_app()
+        self._config = dict(self.app.config)
+        self._extensions = dict(self.app.extensions)
         self.app_context = self.app.app_context()
         self.app_context.push()
-        db.create_all()
-        self.client = self.app.test_client()
+
+        self.connection = db.engine.connect()
+        self.transaction = self.connection.begin()
+        self._session = db.session
+        # Flask-SQLAlchemy binds each table to the engine unless given binds, so bind them to this connection
+        db.session = db.create_scoped_session(options={
+            'bind': self.connection,
+            'binds': {table: self.connection for table in db.get_tables_for_bind()}
+        })
+        session = db.session()
+        session.begin_nested()
+
+        def restart_savepoint(session, transaction):
+            if transaction.nested and not transaction._parent.nested:
+                session.expire_all()
+                session.begin_nested()
+
+        self._restart_savepoint = restart_savepoint
+        event.listen(session, 'after_transaction_end', restart_savepoint)
 
     def tearDown(self):
+        # Roll back the savepoint without starting another, as closing the session would leave the connection in it
+        # and the outer transaction would then be rolled back underneath it, which the pool warns about
+        session = db.session()
+        event.remove(session, 'after_transaction_end', self._restart_savepoint)
+        session.rollback()
         db.session.remove()
-        db.drop_all()
+        db.session = self._session
+        self.transaction.rollback()
+        self.connection.close()
         self.app_context.pop()
 
+        self.app.config.clear()
+        self.app.config.update(self._config)
+        self.app.extensions.clear()
+        self.app.extensions.update(self._extensions)
+
+
+class APITestCase(DatabaseTestCase):
+    def setUp(self):
+        super(APITestCase, self).setUp()
+        self.client = self.app.test_client()
+
     def get_auth_token(self, username, password):
         response = self.client.post(
             '/auth',
@@ -0,0 +1,63 @@
+import json
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import NullPool, QueuePool
+
+from app import db
+from app.database import STATEMENT_TIMEOUT_OPTION, health, pool_status
+
+from tests import APITestCase
+
+
+class DatabaseTestCase(APITestCase):
+    def engine_options(self, url, **config):
+        self.app.config.update(config)
+        options = {'pool_size': 5, 'max_overflow': 10, 'pool_timeout': 10, 'pool_recycle': 1800}
+        db.apply_driver_hacks(self.app, make_url(url), options)
+        return options
+
+    def test_pool_options(self):
+        options = self.engine_options('postgresql://vle@localhost/vle', DATABASE_STATEMENT_TIMEOUT_MS=30000)
+        self.assertTrue(options['pool_pre_ping'])
+        self.assertEqual(options['pool_size'], 5)
+        self.assertEqual(options['connect_args']['options'], '-c statement_timeout=30000')
+
+        options = self.engine_options(
+            'postgresql://vle@localhost/vle', DATABASE_STATEMENT_TIMEOUT_MS=30000, DATABASE_PGBOUNCER=True
+        )
+        self.assertIs(options['poolclass'], NullPool)
+        self.assertNotIn('pool_size', options)
+        self.assertNotIn('connect_args', options)
+        self.assertEqual(options['execution_options'][STATEMENT_TIMEOUT_OPTION], 30000)
+
+        options = self.engine_options('sqlite://', DATABASE_PGBOUNCER=False)
+        self.assertNotIn('pool_size', options)
+        self.assertNotIn('pool_pre_ping', options)
+
+    def test_pool_saturation(self):
+        engine = create_engine('sqlite://', poolclass=QueuePool, pool_size=2, max_overflow=0)
+        connections = [engine.connect(), engine.connect()]
+
+        status = pool_status(engine.pool)
+        self.assertEqual(status['checked_out'], 2)
+        self.assertEqual(status['saturation'], 1.0)
+        healthy, status = health(engine, 0.9)
+        self.assertFalse(healthy)
+
+        connections.pop().close()
+        healthy, status = health(engine, 0.9)
+        self.assertTrue(healthy)
+        self.assertEqual(status['database'], 'ok')
+        connections.pop().close()
+        engine.dispose()
+
+    def test_health_endpoint(self):
+        response = self.client.get('/health')
+        self.assertEqual(response.status_code, 200)
+        body = json.loads(response.data.decode('utf-8'))
+        self.assertTrue(body['success'])
+        self.assertEqual(body['status']['database'], 'ok')
+
+        response = self.client.get('/metrics')
+        self.assertIn('db_pool_checkouts_total', response.data.decode('utf-8'))
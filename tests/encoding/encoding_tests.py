@@ -0,0 +1,69 @@
+import datetime
+import decimal
+import gzip
+import json
+
+from app import encoding
+from app.homework.models import HomeworkType
+
+from tests import APITestCase
+from tests.school.factories import SchoolFactory
+from tests.user.factories import UserFactory
+
+school_factory = SchoolFactory()
+user_factory = UserFactory()
+
+
+class EncodingTestCase(APITestCase):
+    def setUp(self):
+        super(EncodingTestCase, self).setUp()
+        self.school = school_factory.new_into_db()
+        self.user = user_factory.new_into_db(school_id=self.school.id, permissions=['Administrator'])
+
+    def tearDown(self):
+        super(EncodingTestCase, self).tearDown()
+
+    def test_backends_encode_the_same(self):
+        data = {
+            'time': datetime.time(9, 30),
+            'date': datetime.date(2016, 10, 3),
+            'datetime': datetime.datetime(2016, 10, 3, 9, 30),
+            'decimal': decimal.Decimal('1.5'),
+            'type': HomeworkType.QUIZ,
+            1: 'integer key'
+        }
+        expected = {
+            'time': '09:30:00',
+            'date': 'Mon, 03 Oct 2016 00:00:00 GMT',
+            'datetime': 'Mon, 03 Oct 2016 09:30:00 GMT',
+            'decimal': 1.5,
+            'type': HomeworkType.QUIZ.value,
+            '1': 'integer key'
+        }
+
+        with self.app.test_request_context():
+            for backend in ('json', 'orjson'):
+                if backend == 'orjson' and encoding.orjson is None:
+                    continue
+                self.app.config['JSON_BACKEND'] = backend
+                encoded = encoding.dumps(data)
+                # Compact output
+                self.assertNotIn(b'": ', encoded)
+                self.assertEqual(json.loads(encoded.decode('utf-8')), expected)
+
+    def test_large_response_is_gzipped(self):
+        for i in range(0, 3):
+            user_factory.new_into_db(school_id=self.school.id)
+        token = self.get_auth_token(self.user.username, self.user.raw_password)
+        self.app.config['RESPONSE_COMPRESSION_MIN_SIZE'] = 100
+
+        plain = self.client.get('/user/user', headers={'Authorization': 'JWT ' + token})
+        self.assertNotIn('Content-Encoding', plain.headers)
+
+        compressed = self.client.get(
+            '/user/user',
+            headers={'Authorization': 'JWT ' + token, 'Accept-Encoding': 'gzip'}
+        )
+        self.assertEqual(compressed.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', compressed.headers['Vary'])
+        self.assertEqual(gzip.decompress(compressed.data), plain.data)
@@ -5,7 +5,7 @@ from faker import Faker
 from app import db
 
 from app.homework.models import Quiz, HomeworkType, Question, Essay, QuizAnswer, QuizSubmission, EssaySubmission, \
-    Comment
+    Comment, Submission
 from tests.lessons.factories import LessonFactory
 from tests.user.factories import UserFactory
 
@@ -27,13 +27,16 @@ class QuizFactory:
     def __init__(self, school):
         self.school = school
 
-    def new(self, lesson_id=None):
+    def new(self, lesson_id=None, number_of_questions=None):
         id = fake.random_int()
 
         if lesson_id is None:
             lesson = LessonFactory(school=self.school).new_into_db()
             lesson_id = lesson.id
 
+        if number_of_questions is None:
+            number_of_questions = fake.random_int(min=1, max=20)
+
         type_id = HomeworkType.HOMEWORK.value
         date_due = fake.date_time_this_year(after_now=True).date
 
@@ -42,7 +45,7 @@ class QuizFactory:
             title=fake.first_name(),
             description=fake.first_name(),
             date_due=date_due(),
-            number_of_questions=fake.random_int()
+            number_of_questions=number_of_questions
         )
 
         quiz.id = id
@@ -79,6 +82,8 @@ class QuizSubmissionFactory:
         )
 
         submission.id = fake.random_int()
+        while Submission.query.get(submission.id) is not None:
+            submission.id = fake.random_int()
 
         for question in quiz.questions:
             answer = QuizAnswer(fake.first_name(), submission.id, question.id)
@@ -143,6 +148,8 @@ class EssaySubmissionFactory:
         )
 
         submission.id = fake.random_int()
+        while Submission.query.get(submission.id) is not None:
+            submission.id = fake.random_int()
 
         return submission
 
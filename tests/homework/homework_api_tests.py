@@ -1,10 +1,14 @@
+import csv
+import io
 import json
 
-from tests import APITestCase
+from app import db
+from tests import APITestCase, count_queries
 from tests.school.factories import SchoolFactory
 from tests.user.factories import UserFactory
 from tests.lessons.factories import SubjectFactory, LessonFactory
-from tests.homework.factories import QuizFactory, EssaySubmissionFactory, QuizSubmissionFactory
+from tests.homework.factories import QuizFactory, EssaySubmissionFactory, QuizSubmissionFactory, EssayFactory, \
+    CommentFactory
 
 from app.user.models import User
 from app.permissions.models import Permission, Role
@@ -26,6 +30,7 @@ class HomeworkAPITestCase(APITestCase):
         self.subject_factory = SubjectFactory(self.school)
         self.lesson_factory = LessonFactory(self.school)
         self.quiz_factory = QuizFactory(self.school)
+        self.essay_factory = EssayFactory(self.school)
         self.essay_submission_factory = EssaySubmissionFactory(self.school)
         self.quiz_submission_factory = QuizSubmissionFactory(self.school)
 
@@ -48,6 +53,39 @@ class HomeworkAPITestCase(APITestCase):
 
         self.assertIn(submission.id, [s['id'] for s in json_response['submissions']])
 
+    def test_submission_listing_for_students_query_count(self):
+        token = self.get_auth_token(username=self.user.username, password=self.user.raw_password)
+        user_id = self.user.id
+        self.essay_submission_factory.new_into_db(user_id=user_id)
+        quiz = self.quiz_factory.new_into_db(number_of_questions=2)
+        self.quiz_submission_factory.new_into_db(quiz=quiz, user_id=user_id)
+
+        def count():
+            db.session.expunge_all()
+            with count_queries() as statements:
+                response = self.client.get('/homework/submissions', headers={'Authorization': 'JWT ' + token})
+            return len(statements), json.loads(response.data.decode('utf-8'))
+
+        before, _ = count()
+        self.quiz_factory.school = self.quiz_submission_factory.school = db.session.merge(self.school)
+        for i in range(0, 2):
+            quiz = self.quiz_factory.new_into_db(number_of_questions=3)
+            self.quiz_submission_factory.new_into_db(quiz=quiz, user_id=user_id)
+        after, json_response = count()
+
+        # Each quiz's questions are loaded with the homework for every submission at once
+        self.assertEqual(before, after)
+        self.assertEqual(len(json_response['submissions']), 4)
+        for submission in json_response['submissions']:
+            homework = submission['homework']
+            if homework['type'] == 'QUIZ':
+                self.assertEqual(len(homework['questions']), homework['number_of_questions'])
+                self.assertEqual(
+                    set(homework['questions'][0].keys()), {'homework_id', 'question_text', 'answer', 'id'}
+                )
+            else:
+                self.assertNotIn('questions', homework)
+
     def test_submission_listing_for_homework(self):
         token = self.get_auth_token(username=self.user.username, password=self.user.raw_password)
 
@@ -66,6 +104,126 @@ class HomeworkAPITestCase(APITestCase):
 
         self.assertIn(submission.id, [s['id'] for s in json_response['submissions']])
 
+    def test_submission_listing_for_homework_query_count(self):
+        token = self.get_auth_token(username=self.user.username, password=self.user.raw_password)
+        quiz = self.quiz_factory.new_into_db(number_of_questions=2)
+        self.quiz_submission_factory.new_into_db(quiz=quiz)
+        url = '/homework/homework/{}/submissions'.format(quiz.id)
+
+        def count():
+            db.session.expunge_all()
+            with count_queries() as statements:
+                response = self.client.get(url, headers={'Authorization': 'JWT ' + token})
+            return len(statements), json.loads(response.data.decode('utf-8'))
+
+        before, _ = count()
+        quiz = db.session.merge(quiz)
+        self.quiz_submission_factory.school = db.session.merge(self.school)
+        for i in range(0, 2):
+            self.quiz_submission_factory.new_into_db(quiz=quiz)
+        after, json_response = count()
+
+        # Users and answers are loaded for every submission at once
+        self.assertEqual(before, after)
+        self.assertEqual(len(json_response['submissions']), 3)
+        for submission in json_response['submissions']:
+            self.assertEqual(len(submission['answers']), 2)
+            self.assertIn('score', submission)
+            self.assertEqual(submission['user']['id'], submission['user_id'])
+
+    def test_submissions_export(self):
+        token = self.get_auth_token(username=self.user.username, password=self.user.raw_password)
+        quiz = self.quiz_factory.new_into_db(number_of_questions=2)
+        quiz_submission = self.quiz_submission_factory.new_into_db(quiz=quiz, user_id=self.user.id)
+        essay_submission = self.essay_submission_factory.new_into_db(user_id=self.user.id)
+        CommentFactory(self.school).new_into_db(submission_id=essay_submission.id, user_id=self.user.id)
+        CommentFactory(self.school).new_into_db(submission_id=essay_submission.id, user_id=self.user.id)
+
+        response = self.client.get('/homework/export', headers={'Authorization': 'JWT ' + token})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        rows = {
+            row['submission_id']: row
+            for row in (json.loads(line) for line in response.data.decode('utf-8').splitlines())
+        }
+        self.assertEqual(set(rows.keys()), {quiz_submission.id, essay_submission.id})
+        self.assertEqual(rows[quiz_submission.id]['quiz_score'], quiz_submission.total_score)
+        self.assertEqual(rows[quiz_submission.id]['homework_type'], 'QUIZ')
+        self.assertEqual(rows[essay_submission.id]['essay_length'], len(essay_submission.text))
+        self.assertEqual(rows[essay_submission.id]['comment_count'], 2)
+        self.assertEqual(rows[essay_submission.id]['username'], self.user.username)
+
+        response = self.client.get(
+            '/homework/export?format=csv&homework_id={}'.format(quiz.id),
+            headers={'Authorization': 'JWT ' + token}
+        )
+        rows = list(csv.DictReader(io.StringIO(response.data.decode('utf-8'))))
+        self.assertEqual([row['submission_id'] for row in rows], [str(quiz_submission.id)])
+        self.assertEqual(rows[0]['comment_count'], '0')
+
+        response = self.client.get('/homework/export?homework_id=-1', headers={'Authorization': 'JWT ' + token})
+        self.assertEqual(response.status_code, 409)
+
+    def test_homework_status_maintained(self):
+        token = self.get_auth_token(username=self.user.username, password=self.user.raw_password)
+        headers = {'Content-Type': 'application/json', 'Authorization': 'JWT ' + token}
+        lesson = self.lesson_factory.new_into_db(teachers=[self.user], students=[self.user])
+        lesson_id = lesson.id
+
+        def statuses(url='/homework/status'):
+            response = self.client.get(url, headers=headers)
+            self.assertEqual(response.status_code, 200)
+            return json.loads(response.data.decode('utf-8'))['statuses']
+
+        # Creating the essay adds a row for each student
+        response = self.client.post('/homework/essay', data=json.dumps({
+            'lesson_id': lesson_id,
+            'title': 'Essay',
+            'description': 'Write an essay.',
+            'date_due': '01/01/2030'
+        }), headers=headers)
+        self.assertEqual(response.status_code, 201)
+        essay_id = json.loads(response.data.decode('utf-8'))['id']
+
+        rows = statuses()
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['homework_id'], essay_id)
+        self.assertEqual(rows[0]['status'], 'NOT_SUBMITTED')
+        self.assertIsNone(rows[0]['submission_id'])
+
+        # Submitting updates it
+        response = self.client.post(
+            '/homework/essay/{}'.format(essay_id), data=json.dumps({'content': 'My essay.'}), headers=headers
+        )
+        self.assertEqual(response.status_code, 201)
+
+        rows = statuses('/homework/homework/{}/status'.format(essay_id))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['user_id'], self.user.id)
+        self.assertEqual(rows[0]['status'], 'SUBMITTED')
+        self.assertIsNotNone(rows[0]['submission_id'])
+        self.assertIsNotNone(rows[0]['submitted_at'])
+
+        # Leaving the lesson removes it
+        response = self.client.put(
+            '/lessons/lesson/{}'.format(lesson_id), data=json.dumps({'student_ids': []}), headers=headers
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(statuses(), [])
+
+        # A rebuild gives the same rows as keeping them up to date
+        from app.homework.models import HomeworkStatus
+        from app.homework.status_functions import rebuild_statuses
+        self.client.put(
+            '/lessons/lesson/{}'.format(lesson_id), data=json.dumps({'student_ids': [self.user.id]}), headers=headers
+        )
+        maintained = statuses()
+        db.session.query(HomeworkStatus).delete()
+        rebuild_statuses()
+        db.session.commit()
+        self.assertEqual(statuses(), maintained)
+        self.assertEqual(maintained[0]['status'], 'SUBMITTED')
+
     def test_submission_listing_for_homework_failed_bad_id(self):
         token = self.get_auth_token(username=self.user.username, password=self.user.raw_password)
 
@@ -117,3 +275,32 @@ class HomeworkAPITestCase(APITestCase):
         self.assertIn('homework', json_response.keys())
 
         self.assertIn(quiz.id, [h['id'] for h in json_response['homework']])
+
+
+    def test_homework_summary_query_count(self):
+        lesson = self.lesson_factory.new_into_db(students=[self.user])
+        for n in range(5):
+            quiz = self.quiz_factory.new_into_db(lesson_id=lesson.id, number_of_questions=3)
+            self.quiz_submission_factory.new_into_db(quiz=quiz, user_id=self.user.id)
+            essay = self.essay_factory.new_into_db(lesson_id=lesson.id)
+            self.essay_submission_factory.new_into_db(essay=essay, user_id=self.user.id)
+        self.quiz_factory.new_into_db(lesson_id=lesson.id, number_of_questions=3)
+
+        token = self.get_auth_token(username=self.user.username, password=self.user.raw_password)
+        db.session.expunge_all()
+
+        with count_queries() as statements:
+            response = self.client.get(
+                '/homework/summary?nest-lessons=true',
+                headers={'Content-Type': 'application/json', 'Authorization': 'JWT ' + token}
+            )
+
+        self.assertEqual(response.status_code, 200)
+        json_response = json.loads(response.data.decode('utf-8'))
+        self.assertEqual(len(json_response['homework']), 11)
+        self.assertEqual(len([h for h in json_response['homework'] if h['submitted']]), 10)
+        for homework in json_response['homework']:
+            self.assertIn('lesson', homework.keys())
+
+        # User, permissions, homework with submissions and lessons, quiz questions and quiz answers
+        self.assertLessEqual(len(statements), 5)
@@ -1,6 +1,6 @@
 import json
 
-from tests import APITestCase
+from tests import APITestCase, count_queries
 from tests.school.factories import SchoolFactory
 from tests.user.factories import UserFactory
 from tests.lessons.factories import SubjectFactory, LessonFactory
@@ -8,6 +8,9 @@ from tests.homework.factories import QuizFactory, QuizSubmissionFactory
 
 from app.user.models import User
 from app.permissions.models import Permission, Role
+from app import db
+from app.homework.models import Homework, HomeworkStatus, QuizSubmission
+from app.homework.stats_functions import score_distribution
 from app.lessons.models import Lesson
 
 
@@ -47,6 +50,24 @@ class QuizAPITestCase(APITestCase):
 
         self.assertEqual(response.status_code, 201)
 
+    def test_quiz_create_invalid_question_rolled_back(self):
+        token = self.get_auth_token(username=self.user.username, password=self.user.raw_password)
+
+        student = self.user_factory.new_into_db(permissions=['Student'])
+        lesson = self.lesson_factory.new_into_db(teachers=[self.user], students=[student])
+        quiz_json = self.quiz_factory.new(lesson.id).to_dict(date_as_string=True)
+        quiz_json['questions'].append({'question_text': 'No answer'})
+
+        response = self.client.post(
+            '/homework/quiz',
+            data=json.dumps(quiz_json),
+            headers={'Content-Type': 'application/json', 'Authorization': 'JWT ' + token}
+        )
+
+        self.assertEqual(response.status_code, 409)
+        self.assertIsNone(Homework.query.filter_by(lesson_id=lesson.id).first())
+        self.assertIsNone(HomeworkStatus.query.filter_by(lesson_id=lesson.id).first())
+
     def test_quiz_submit(self):
         token = self.get_auth_token(username=self.user.username, password=self.user.raw_password)
 
@@ -71,6 +92,207 @@ class QuizAPITestCase(APITestCase):
 
         self.assertEqual(json_response['score'], predicted_score)
 
+    def test_quiz_submit_query_count(self):
+        token = self.get_auth_token(username=self.user.username, password=self.user.raw_password)
+
+        lesson = self.lesson_factory.new_into_db(students=[self.user])
+        quiz = self.quiz_factory.new_into_db(lesson_id=lesson.id, number_of_questions=50)
+        answer_json = {'answers': [{'question_id': q.id, 'answer': q.question_answer} for q in quiz.questions]}
+        db.session.expunge_all()
+
+        with count_queries() as statements:
+            response = self.client.post(
+                '/homework/quiz/{}'.format(quiz.id),
+                data=json.dumps(answer_json),
+                headers={'Content-Type': 'application/json', 'Authorization': 'JWT ' + token}
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data.decode('utf-8'))['score'], 50)
+        # Includes the UPDATE of the student's homework_status row
+        self.assertLessEqual(len(statements), 11)
+
+    def test_quiz_submit_failed_duplicate_question(self):
+        token = self.get_auth_token(username=self.user.username, password=self.user.raw_password)
+
+        lesson = self.lesson_factory.new_into_db(students=[self.user])
+        quiz = self.quiz_factory.new_into_db(lesson_id=lesson.id, number_of_questions=2)
+        question = quiz.questions[0]
+        answer_json = {'answers': [{'question_id': question.id, 'answer': question.question_answer}] * 2}
+
+        response = self.client.post(
+            '/homework/quiz/{}'.format(quiz.id),
+            data=json.dumps(answer_json),
+            headers={'Content-Type': 'application/json', 'Authorization': 'JWT ' + token}
+        )
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(QuizSubmission.query.filter_by(homework_id=quiz.id).count(), 0)
+
+    def test_quiz_submit_failed_malformed_answers(self):
+        token = self.get_auth_token(username=self.user.username, password=self.user.raw_password)
+
+        lesson = self.lesson_factory.new_into_db(students=[self.user])
+        quiz = self.quiz_factory.new_into_db(lesson_id=lesson.id, number_of_questions=2)
+        question = quiz.questions[0]
+
+        for answers in [
+            [{'question_id': [question.id], 'answer': question.question_answer}],
+            [{'question_id': {'id': question.id}, 'answer': question.question_answer}],
+            [{'question_id': str(question.id), 'answer': question.question_answer}],
+            [question.id],
+            {'question_id': question.id, 'answer': question.question_answer},
+        ]:
+            response = self.client.post(
+                '/homework/quiz/{}'.format(quiz.id),
+                data=json.dumps({'answers': answers}),
+                headers={'Content-Type': 'application/json', 'Authorization': 'JWT ' + token}
+            )
+            self.assertEqual(response.status_code, 409, answers)
+        self.assertEqual(QuizSubmission.query.filter_by(homework_id=quiz.id).count(), 0)
+
+    def test_quiz_submit_normalises_answers(self):
+        token = self.get_auth_token(username=self.user.username, password=self.user.raw_password)
+
+        lesson = self.lesson_factory.new_into_db(students=[self.user])
+        quiz = self.quiz_factory.new_into_db(lesson_id=lesson.id, number_of_questions=3)
+
+        answer_json = {'answers': [
+            {'question_id': question.id, 'answer': '  {} '.format(question.question_answer.upper())}
+            for question in quiz.questions
+        ]}
+
+        response = self.client.post(
+            '/homework/quiz/{}'.format(quiz.id),
+            data=json.dumps(answer_json),
+            headers={'Content-Type': 'application/json', 'Authorization': 'JWT ' + token}
+        )
+        self.assertEqual(response.status_code, 200)
+
+        json_response = json.loads(response.data.decode('utf-8'))
+        self.assertEqual(json_response['score'], 3)
+
+    def test_question_update_remarks_submissions(self):
+        token = self.get_auth_token(username=self.user.username, password=self.user.raw_password)
+
+        lesson = self.lesson_factory.new_into_db(teachers=[self.user])
+        quiz = self.quiz_factory.new_into_db(lesson_id=lesson.id, number_of_questions=2)
+        submissions = [self.quiz_submission_factory.new_into_db(quiz=quiz) for n in range(3)]
+        question = quiz.questions[0]
+        new_answer = submissions[0].answers[0].answer
+
+        response = self.client.put(
+            '/homework/quiz/{}/question/{}'.format(quiz.id, question.id),
+            data=json.dumps({'answer': new_answer}),
+            headers={'Content-Type': 'application/json', 'Authorization': 'JWT ' + token}
+        )
+        self.assertEqual(response.status_code, 200)
+
+        db.session.expire_all()
+        # Random answers can also match the other question's answer, so mark against the whole key
+        answer_key = {q.id: q.question_answer.lower() for q in quiz.questions}
+        self.assertEqual(answer_key[question.id], new_answer.lower())
+        for submission in submissions:
+            submission = QuizSubmission.query.get(submission.id)
+            correct = [a for a in submission.answers if a.correct]
+            self.assertEqual(submission.total_score, len(correct))
+            self.assertEqual(
+                [a.question_id for a in correct],
+                [a.question_id for a in submission.answers if a.answer.lower() == answer_key[a.question_id]]
+            )
+        self.assertGreaterEqual(QuizSubmission.query.get(submissions[0].id).total_score, 1)
+
+    def test_quiz_stats(self):
+        token = self.get_auth_token(username=self.user.username, password=self.user.raw_password)
+
+        students = [self.user_factory.new_into_db(permissions=['Student']) for n in range(2)]
+        lesson = self.lesson_factory.new_into_db(teachers=[self.user], students=[self.user] + students)
+        quiz = self.quiz_factory.new_into_db(lesson_id=lesson.id, number_of_questions=2)
+
+        # One student gets everything right, one gets the first question right and one hasn't submitted
+        right = self.quiz_submission_factory.new_into_db(quiz=quiz, user_id=self.user.id)
+        half = self.quiz_submission_factory.new_into_db(quiz=quiz, user_id=students[0].id)
+        for answer in right.answers + half.answers:
+            answer.answer = 'wrong'
+        for question in quiz.questions:
+            next(a for a in right.answers if a.question_id == question.id).answer = question.question_answer
+        next(a for a in half.answers if a.question_id == quiz.questions[0].id).answer = quiz.questions[0].question_answer
+        right.mark()
+        half.mark()
+        db.session.commit()
+        url = '/homework/quiz/{}/stats'.format(quiz.id)
+
+        db.session.expunge_all()
+        with count_queries() as statements:
+            response = self.client.get(
+                url,
+                headers={'Authorization': 'JWT ' + token}
+            )
+        self.assertEqual(response.status_code, 200)
+        stats = json.loads(response.data.decode('utf-8'))['stats']
+
+        self.assertEqual(stats['submission_count'], 2)
+        self.assertEqual(stats['student_count'], 3)
+        self.assertEqual(stats['not_submitted_count'], 1)
+        self.assertEqual(stats['scores']['histogram'], [
+            {'score': 0, 'count': 0}, {'score': 1, 'count': 1}, {'score': 2, 'count': 1}
+        ])
+        self.assertEqual(stats['scores']['mean'], 1.5)
+        self.assertEqual(stats['scores']['median'], 1.5)
+        self.assertEqual(stats['scores']['percentiles']['90'], 1.9)
+        self.assertEqual([q['correct_rate'] for q in stats['questions']], [1.0, 0.5])
+
+        # Nothing is loaded per submission or per answer
+        self.assertFalse([s for s in statements if 'FROM quiz_answer' in s and 'GROUP BY' not in s])
+
+    def test_score_distribution_counts_unmarked_as_zero(self):
+        students = [self.user_factory.new_into_db(permissions=['Student']) for n in range(3)]
+        lesson = self.lesson_factory.new_into_db(teachers=[self.user], students=students)
+        quiz = self.quiz_factory.new_into_db(lesson_id=lesson.id, number_of_questions=2)
+        submissions = [self.quiz_submission_factory.new_into_db(quiz=quiz, user_id=s.id) for s in students]
+        submissions[0].total_score = None
+        submissions[1].total_score = 0
+        submissions[2].total_score = 2
+        db.session.commit()
+
+        self.assertEqual(score_distribution(quiz.id), {0: 2, 2: 1})
+
+    def test_quiz_stats_count_first_submissions(self):
+        token = self.get_auth_token(username=self.user.username, password=self.user.raw_password)
+
+        lesson = self.lesson_factory.new_into_db(teachers=[self.user], students=[self.user])
+        quiz = self.quiz_factory.new_into_db(lesson_id=lesson.id, number_of_questions=2)
+
+        # The student's homework status keeps the first submission so a resubmission isn't counted again. Factory ids
+        # are random, rather than increasing as they would be, so the first is the one with the lower id.
+        first, second = sorted(
+            [self.quiz_submission_factory.new_into_db(quiz=quiz, user_id=self.user.id) for n in range(2)],
+            key=lambda submission: submission.id
+        )
+        for question in quiz.questions:
+            next(a for a in first.answers if a.question_id == question.id).answer = question.question_answer
+        for answer in second.answers:
+            answer.answer = 'wrong'
+        first.mark()
+        second.mark()
+        db.session.commit()
+
+        response = self.client.get(
+            '/homework/quiz/{}/stats'.format(quiz.id),
+            headers={'Authorization': 'JWT ' + token}
+        )
+        self.assertEqual(response.status_code, 200)
+        stats = json.loads(response.data.decode('utf-8'))['stats']
+
+        self.assertEqual(stats['submission_count'], 1)
+        self.assertEqual(stats['not_submitted_count'], 0)
+        self.assertEqual(stats['scores']['histogram'], [
+            {'score': 0, 'count': 0}, {'score': 1, 'count': 0}, {'score': 2, 'count': 1}
+        ])
+        self.assertEqual(stats['scores']['mean'], 2)
+        self.assertEqual([q['answer_count'] for q in stats['questions']], [1, 1])
+        self.assertEqual([q['correct_rate'] for q in stats['questions']], [1.0, 1.0])
+
     def test_quiz_detail(self):
         token = self.get_auth_token(self.user.username, self.user.raw_password)
 
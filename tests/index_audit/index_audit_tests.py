@@ -0,0 +1,32 @@
+from sqlalchemy import select
+
+from app.index_audit import HOT_QUERIES, audit_indexes
+from app.lessons.models import Lesson
+
+from tests import APITestCase
+
+
+class IndexAuditTestCase(APITestCase):
+    def test_hot_queries_use_indexes(self):
+        report = audit_indexes()
+
+        self.assertEqual(len(report), len(HOT_QUERIES))
+        for result in report:
+            self.assertEqual(result['sequential_scans'], [], "{}: {}".format(result['query'], result['plan']))
+            self.assertEqual(result['sorts'], [], "{}: {}".format(result['query'], result['plan']))
+
+    def test_sequential_scan_reported(self):
+        report = audit_indexes({'lessons by name': lambda: select([Lesson.__table__]).where(Lesson.name == 'name')})
+
+        self.assertEqual(report[0]['sequential_scans'], ['lesson'])
+
+    def test_sorted_page_reported(self):
+        report = audit_indexes({
+            'page of lessons by subject': lambda: select([Lesson.__table__])
+            .where(Lesson.school_id == 1)
+            .order_by(Lesson.subject_id, Lesson.id)
+            .limit(20)
+        })
+
+        self.assertEqual(report[0]['sequential_scans'], [])
+        self.assertEqual(len(report[0]['sorts']), 1)
@@ -0,0 +1,88 @@
+import json
+
+from sqlalchemy.exc import DBAPIError
+
+from app import db, metrics
+from app.instrumentation import RequestStats, statement_shape
+
+from tests import APITestCase
+from tests.lessons.factories import LessonFactory
+from tests.school.factories import SchoolFactory
+from tests.user.factories import UserFactory
+
+school_factory = SchoolFactory()
+user_factory = UserFactory()
+
+
+class InstrumentationTestCase(APITestCase):
+    def setUp(self):
+        super(InstrumentationTestCase, self).setUp()
+        self.school = school_factory.new_into_db()
+        self.user = user_factory.new_into_db(school_id=self.school.id, permissions=['Administrator'])
+
+    def tearDown(self):
+        super(InstrumentationTestCase, self).tearDown()
+
+    def test_request_headers_and_metrics(self):
+        token = self.get_auth_token(username=self.user.username, password=self.user.raw_password)
+        LessonFactory(self.school).new_into_db()
+
+        response = self.client.get(
+            '/lessons/lesson',
+            headers={'Content-Type': 'application/json', 'Authorization': 'JWT ' + token}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(int(response.headers['X-DB-Statements']), 0)
+        self.assertGreater(float(response.headers['X-DB-Time-Ms']), 0)
+        self.assertIn('X-Serialisation-Time-Ms', response.headers)
+
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        text = response.data.decode('utf-8')
+        self.assertIn('# TYPE db_statements_per_request histogram', text)
+        self.assertIn(
+            'http_requests_total{blueprint="lessons",endpoint="lessons.lesson_list_or_create_view",status="200"}',
+            text
+        )
+        self.assertIn('db_statements_per_request_bucket{blueprint="lessons"', text)
+
+    def test_metrics_token(self):
+        self.app.config['METRICS_TOKEN'] = 'secret'
+        try:
+            self.assertEqual(self.client.get('/metrics').status_code, 401)
+            response = self.client.get('/metrics', headers={'Authorization': 'Bearer wrong'})
+            self.assertEqual(response.status_code, 401)
+            response = self.client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+            self.assertEqual(response.status_code, 200)
+        finally:
+            self.app.config['METRICS_TOKEN'] = None
+
+    def test_failed_statement_timing_removed(self):
+        connection = db.session.connection()
+        starts = connection.info.setdefault('_statement_start', [])
+        before = len(starts)
+        with self.assertRaises(DBAPIError):
+            with db.session.begin_nested():
+                db.session.execute('SELECT * FROM no_such_table')
+        self.assertEqual(len(connection.info['_statement_start']), before)
+
+    def test_statement_shape(self):
+        self.assertEqual(
+            statement_shape('SELECT * FROM "user" WHERE "user".id IN (?, ?, ?) AND name = \'bob\''),
+            statement_shape('SELECT *\nFROM "user" WHERE "user".id IN (?) AND name = \'alice\'')
+        )
+        self.assertEqual(
+            statement_shape('SELECT anon_1.id FROM lesson AS anon_1 WHERE anon_1.id = %(param_1)s LIMIT 10'),
+            'SELECT anon_1.id FROM lesson AS anon_1 WHERE anon_1.id = ? LIMIT ?'
+        )
+
+    def test_repeated_statements_reported(self):
+        stats = RequestStats()
+        for user_id in range(6):
+            stats.add_statement('SELECT * FROM role WHERE user_id = {}'.format(user_id), 0.001)
+        stats.add_statement('SELECT * FROM "user"', 0.002)
+
+        repeated = stats.repeated_shapes(5)
+        self.assertEqual(repeated, [('SELECT * FROM role WHERE user_id = ?', 6)])
+        self.assertEqual(stats.statement_count, 7)
+        self.assertEqual(stats.slowest_statement, 'SELECT * FROM "user"')
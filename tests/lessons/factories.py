@@ -14,6 +14,8 @@ class SubjectFactory:
 
     def new(self):
         id = fake.random_int()
+        while Subject.query.get(id) is not None:
+            id = fake.random_int()
         subject = Subject(
             name=fake.first_name(),
             school_id=self.school.id
@@ -38,6 +40,8 @@ class LessonFactory:
             subject = SubjectFactory(self.school).new_into_db()
 
         id = fake.random_int()
+        while Lesson.query.get(id) is not None:
+            id = fake.random_int()
         lesson = Lesson(
             name=fake.first_name(),
             school_id=self.school.id,
@@ -1,5 +1,7 @@
+import base64
 import json
 
+from app import db
 from tests import APITestCase
 from tests.school.factories import SchoolFactory
 from tests.user.factories import UserFactory
@@ -109,6 +111,38 @@ class LessonAPITestCase(APITestCase):
         self.assertIn(lesson1.to_dict(), json_response['lessons'])
         self.assertNotIn(lesson2.to_dict(), json_response['lessons'])
 
+    def test_lesson_listing_cursor_with_null_sort_values(self):
+        subject = self.subject_factory.new_into_db()
+        lessons = [self.lesson_factory.new_into_db(subject=subject) for _ in range(2)]
+        lessons += [self.lesson_factory.new_into_db() for _ in range(3)]
+        for lesson in lessons[2:]:
+            lesson.subject_id = None
+        db.session.commit()
+        lesson_ids = {lesson.id for lesson in lessons}
+
+        token = self.get_auth_token(username=self.user.username, password=self.user.raw_password)
+        for sort in ['subject_id', '-subject_id']:
+            ids = []
+            cursor = ''
+            while cursor is not None:
+                response = self.client.get(
+                    '/lessons/lesson?limit=2&sort={}{}'.format(sort, '&cursor=' + cursor if cursor else ''),
+                    headers={'Content-Type': 'application/json', 'Authorization': 'JWT ' + token}
+                )
+                json_response = json.loads(response.data.decode('utf-8'))
+                ids.extend(lesson['id'] for lesson in json_response['lessons'] if lesson['id'] in lesson_ids)
+                cursor = json_response['next_cursor']
+            self.assertEqual(sorted(ids), sorted(lesson_ids), sort)
+
+    def test_lesson_listing_invalid_cursor(self):
+        token = self.get_auth_token(username=self.user.username, password=self.user.raw_password)
+        cursor = base64.urlsafe_b64encode(json.dumps([None, {'id': 1}]).encode('utf-8')).decode('ascii')
+        response = self.client.get(
+            '/lessons/lesson?sort=subject_id&cursor={}'.format(cursor),
+            headers={'Content-Type': 'application/json', 'Authorization': 'JWT ' + token}
+        )
+        self.assertEqual(response.status_code, 409)
+
     def test_lesson_detail(self):
         lesson = self.lesson_factory.new_into_db()
 
@@ -170,6 +204,52 @@ class LessonAPITestCase(APITestCase):
         self.assertEqual(sorted([t.id for t in lesson_from_db.teachers]), sorted(json_update['teacher_ids']))
         self.assertEqual(sorted([s.id for s in lesson_from_db.students]), sorted(json_update['student_ids']))
 
+    def test_lesson_update_applies_membership_changes(self):
+        students = [self.user_factory.new_into_db() for i in range(0, 4)]
+        lesson = self.lesson_factory.new_into_db(students=students[:3])
+
+        token = self.get_auth_token(username=self.user.username, password=self.user.raw_password)
+
+        student_ids = [s.id for s in students[1:]]
+        response = self.client.put(
+            '/lessons/lesson/{}'.format(lesson.id),
+            data=json.dumps({'student_ids': student_ids}),
+            headers={'Authorization': 'JWT ' + token, 'Content-Type': 'application/json'}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        lesson_from_db = Lesson.query.get(lesson.id)
+        self.assertEqual(sorted([s.id for s in lesson_from_db.students]), sorted(student_ids))
+
+    def test_lesson_update_failed_reports_all_invalid_ids(self):
+        lesson = self.lesson_factory.new_into_db()
+        other_school = self.school_factory.new_into_db()
+        other_user = UserFactory(school=other_school).new_into_db()
+
+        token = self.get_auth_token(username=self.user.username, password=self.user.raw_password)
+
+        response = self.client.put(
+            '/lessons/lesson/{}'.format(lesson.id),
+            data=json.dumps({'student_ids': [self.user.id, other_user.id, -1]}),
+            headers={'Authorization': 'JWT ' + token, 'Content-Type': 'application/json'}
+        )
+
+        self.assertEqual(response.status_code, 409)
+        json_response = json.loads(response.data.decode('utf-8'))
+        self.assertEqual(sorted(json_response['invalid_ids']), sorted([other_user.id, -1]))
+
+    def test_lesson_update_failed_malformed_ids(self):
+        lesson = self.lesson_factory.new_into_db()
+        token = self.get_auth_token(username=self.user.username, password=self.user.raw_password)
+
+        for student_ids in [self.user.id, [[self.user.id]], [{'id': self.user.id}], [True], ['1']]:
+            response = self.client.put(
+                '/lessons/lesson/{}'.format(lesson.id),
+                data=json.dumps({'student_ids': student_ids}),
+                headers={'Authorization': 'JWT ' + token, 'Content-Type': 'application/json'}
+            )
+            self.assertEqual(response.status_code, 409, student_ids)
+
     def test_update_lesson_failed_bad_id(self):
         # Create lesson
         lesson = self.lesson_factory.new_into_db()
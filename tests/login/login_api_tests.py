@@ -1,9 +1,14 @@
 import json
+import re
 
-from tests import APITestCase
+from app import db
+from tests import APITestCase, count_queries
 from tests.school.factories import SchoolFactory
 from tests.user.factories import UserFactory
 
+from app.user import password_functions
+from app.user.models import User
+
 
 user_factory = UserFactory()
 school_factory = SchoolFactory()
@@ -59,4 +64,56 @@ class LoginAPITestCase(APITestCase):
                 'password': self.user.raw_password
             })
         )
-        self.assertEqual(response.status_code, 401)
\ No newline at end of file
+        self.assertEqual(response.status_code, 401)
+
+    def test_stateless_identity_does_not_load_user(self):
+        self.app.config['JWT_STATELESS_IDENTITY'] = True
+        token = self.get_auth_token(self.user.username, self.user.raw_password)
+        db.session.expunge_all()
+
+        with count_queries() as statements:
+            response = self.client.get('/user/form', headers={'Authorization': 'JWT ' + token})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([s for s in statements if re.search(r'FROM "?user"?\s', s)])
+
+    def test_stateless_identity_loads_user_when_needed(self):
+        self.app.config['JWT_STATELESS_IDENTITY'] = True
+        token = self.get_auth_token(self.user.username, self.user.raw_password)
+
+        response = self.client.get('/user/me', headers={'Authorization': 'JWT ' + token})
+
+        self.assertEqual(response.status_code, 200)
+        json_response = json.loads(response.data.decode('utf-8'))
+        self.assertEqual(json_response['user']['username'], self.user.username)
+
+    def login(self):
+        return self.client.post(
+            '/auth',
+            headers={'Content-Type': 'application/json'},
+            data=json.dumps({'username': self.user.username, 'password': self.user.raw_password})
+        )
+
+    def test_login_rehashes_password_when_rounds_change(self):
+        self.assertEqual(password_functions.hash_rounds(self.user.password), 4)
+        checks = password_functions.hash_latency.snapshot(operation='check')['count']
+
+        self.app.config['BCRYPT_LOG_ROUNDS'] = 5
+        self.assertEqual(self.login().status_code, 200)
+        self.assertEqual(password_functions.hash_rounds(User.query.get(self.user.id).password), 5)
+
+        # The new hash still works and each check is timed
+        self.assertEqual(self.login().status_code, 200)
+        self.assertEqual(password_functions.hash_latency.snapshot(operation='check')['count'], checks + 2)
+
+    def test_login_rejected_when_password_queue_full(self):
+        pool = password_functions.get_pool()
+        rejected = password_functions.hash_rejected.value()
+        pool.pending = pool.max_pending
+        try:
+            response = self.login()
+        finally:
+            pool.pending = 0
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(password_functions.hash_rejected.value(), rejected + 1)
+        self.assertEqual(self.login().status_code, 200)
@@ -0,0 +1,171 @@
+"""
+Performance tests.
+
+The database is seeded once per test case with tests/perf/seed.py, PERF_SCALE times a school of 2,000 users,
+80 lessons, 5,000 homework and 100,000 submissions, or for the timetable a school of 1,500 students. Every endpoint
+must stay within its budget of SQL statements, which doesn't depend on the scale, so the normal test run checks
+them against a small seed (PERF_SCALE defaults to SMOKE_SCALE).
+
+With PERF_TESTS=1 PERF_SCALE defaults to 1 and each endpoint is also requested PERF_RUNS times and must stay within
+its p95 latency budget. PERF_LATENCY_FACTOR scales every latency budget for slower machines. Results are written to
+PERF_REPORT as JSON with the same keys on every commit so reports can be compared.
+"""
+import datetime
+import gc
+import json
+import os
+import platform
+import random
+import subprocess
+import time
+import unittest
+
+from app import create_app, db
+from tests import count_queries
+from tests.perf.seed import fake, seed_school
+
+SMOKE_SCALE = 0.02
+PERF_TESTS = bool(os.environ.get('PERF_TESTS'))
+PERF_SCALE = float(os.environ.get('PERF_SCALE', 1 if PERF_TESTS else SMOKE_SCALE))
+PERF_RUNS = int(os.environ.get('PERF_RUNS', 20))
+PERF_LATENCY_FACTOR = float(os.environ.get('PERF_LATENCY_FACTOR', 1))
+PERF_REPORT = os.environ.get('PERF_REPORT', 'perf-report.json')
+
+
+def percentile(values, p):
+    """Nearest rank percentile."""
+    values = sorted(values)
+    rank = max(1, int(round(p / 100 * len(values) + 0.5)))
+    return values[min(rank, len(values)) - 1]
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Budget:
+    """The most SQL statements and p95 milliseconds a request to an endpoint may take."""
+    def __init__(self, statements, p95_ms):
+        self.statements = statements
+        self.p95_ms = p95_ms
+
+
+# Wall clock budgets depend on the machine and the scale so only fail the build when asked for
+latency_test = unittest.skipUnless(PERF_TESTS, "Set PERF_TESTS=1 to check latency budgets.")
+
+
+class PerfTestCase(unittest.TestCase):
+    """Seeds the database once for the test case with seed_function and collects results into the report."""
+    seed_function = staticmethod(seed_school)
+    seed = None
+    results = {}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('testing')
+        cls.app.config['INSTRUMENTATION_HEADERS'] = False
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+        db.create_all()
+
+        # Seeding seeds random and Faker's generator, so restore them for the tests run after these
+        random_states = random.getstate(), fake.random.getstate()
+        start = time.perf_counter()
+        try:
+            cls.seed = cls.seed_function(scale=PERF_SCALE)
+        finally:
+            random.setstate(random_states[0])
+            fake.random.setstate(random_states[1])
+        cls.seed_seconds = time.perf_counter() - start
+        cls.results = {}
+
+        cls.client = cls.app.test_client()
+        response = cls.client.post('/auth', data=json.dumps({
+            'username': cls.seed.username,
+            'password': cls.seed.password
+        }), headers={'Content-Type': 'application/json'})
+        cls.token = json.loads(response.data.decode('utf-8'))['access_token']
+
+    @classmethod
+    def tearDownClass(cls):
+        if PERF_TESTS:
+            cls.write_report()
+        db.session.remove()
+        db.drop_all()
+        cls.app_context.pop()
+
+    @classmethod
+    def write_report(cls):
+        report = {}
+        if os.path.exists(PERF_REPORT):
+            with open(PERF_REPORT) as f:
+                report = json.load(f)
+        if report.get('commit') != git_commit() or report.get('scale') != PERF_SCALE:
+            report = {}
+
+        report.update({
+            'commit': git_commit(),
+            'date': datetime.datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'database': db.engine.dialect.name,
+            'scale': PERF_SCALE,
+            'runs': PERF_RUNS
+        })
+        report.setdefault('seeds', {})[cls.__name__] = {'seconds': round(cls.seed_seconds, 2), 'counts': cls.seed.counts}
+        report.setdefault('endpoints', {}).update(cls.results)
+        with open(PERF_REPORT, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    def request(self, url):
+        response = self.client.get(url, headers={'Authorization': 'JWT ' + self.token})
+        response.get_data()
+        # The app context outlives the request here, so end the session as the request's teardown would
+        db.session.remove()
+        return response
+
+    def assertWithinBudget(self, name, url, budget):
+        """
+        Request url once counting statements and, with PERF_TESTS, PERF_RUNS more times for the latency budget.
+        """
+        with count_queries() as statements:
+            response = self.request(url)
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertLessEqual(
+            len(statements), budget.statements,
+            "{} ran {} statements, budget is {}".format(name, len(statements), budget.statements)
+        )
+        if not PERF_TESTS:
+            return
+
+        # As timeit does, keep garbage collection pauses out of the timings
+        timings = []
+        gc.collect()
+        gc.disable()
+        try:
+            for _ in range(PERF_RUNS):
+                start = time.perf_counter()
+                self.request(url)
+                timings.append((time.perf_counter() - start) * 1000)
+        finally:
+            gc.enable()
+
+        p95_budget = budget.p95_ms * PERF_LATENCY_FACTOR
+        result = {
+            'url': url,
+            'statements': len(statements),
+            'response_bytes': len(response.data),
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'max_ms': round(max(timings), 2),
+            'budget': {'statements': budget.statements, 'p95_ms': p95_budget}
+        }
+        result['passed'] = result['statements'] <= budget.statements and result['p95_ms'] <= p95_budget
+        self.results[name] = result
+
+        self.assertLessEqual(
+            result['p95_ms'], p95_budget,
+            "{} p95 was {}ms, budget is {}ms".format(name, result['p95_ms'], p95_budget)
+        )
@@ -0,0 +1,85 @@
+from tests.perf import Budget, PerfTestCase
+
+# Statement budgets don't depend on PERF_SCALE, so a lazy load in a loop fails however little data is seeded and
+# they are checked on every test run.
+# Latency budgets are for PERF_SCALE=1 on a developer machine with SQLite.
+BUDGETS = {
+    'user_listing': Budget(statements=4, p95_ms=100),
+    'user_listing_nested': Budget(statements=6, p95_ms=150),
+    'lesson_listing': Budget(statements=5, p95_ms=250),
+    'lesson_detail': Budget(statements=3, p95_ms=50),
+    'homework_due_for_lesson': Budget(statements=4, p95_ms=100),
+    'homework_summary': Budget(statements=6, p95_ms=500),
+    'homework_status': Budget(statements=4, p95_ms=75),
+    'my_submissions': Budget(statements=7, p95_ms=150),
+    'homework_submissions': Budget(statements=7, p95_ms=100),
+    'homework_submissions_export': Budget(statements=5, p95_ms=75),
+    'quiz_detail': Budget(statements=6, p95_ms=75),
+    'quiz_stats': Budget(statements=9, p95_ms=100),
+    'role_listing': Budget(statements=4, p95_ms=50),
+}
+
+
+class EndpointPerfTestCase(PerfTestCase):
+    def test_user_listing(self):
+        self.assertWithinBudget('user_listing', '/user/user?limit=500', BUDGETS['user_listing'])
+
+    def test_user_listing_nested(self):
+        self.assertWithinBudget(
+            'user_listing_nested',
+            '/user/user?limit=500&nest-roles=true&nest-forms=true',
+            BUDGETS['user_listing_nested']
+        )
+
+    def test_lesson_listing(self):
+        self.assertWithinBudget(
+            'lesson_listing', '/lessons/lesson?nest-teachers=true&nest-students=true', BUDGETS['lesson_listing']
+        )
+
+    def test_lesson_detail(self):
+        self.assertWithinBudget(
+            'lesson_detail', '/lessons/lesson/{}'.format(self.seed.taught_lesson_id), BUDGETS['lesson_detail']
+        )
+
+    def test_homework_due_for_lesson(self):
+        self.assertWithinBudget(
+            'homework_due_for_lesson',
+            '/homework/due/{}'.format(self.seed.taught_lesson_id),
+            BUDGETS['homework_due_for_lesson']
+        )
+
+    def test_homework_summary(self):
+        self.assertWithinBudget('homework_summary', '/homework/summary', BUDGETS['homework_summary'])
+
+    def test_homework_status(self):
+        self.assertWithinBudget('homework_status', '/homework/status', BUDGETS['homework_status'])
+
+    def test_my_submissions(self):
+        self.assertWithinBudget('my_submissions', '/homework/submissions', BUDGETS['my_submissions'])
+
+    def test_homework_submissions(self):
+        self.assertWithinBudget(
+            'homework_submissions',
+            '/homework/homework/{}/submissions'.format(self.seed.quiz_ids[0]),
+            BUDGETS['homework_submissions']
+        )
+
+    def test_homework_submissions_export(self):
+        self.assertWithinBudget(
+            'homework_submissions_export',
+            '/homework/export?homework_id={}'.format(self.seed.quiz_ids[0]),
+            BUDGETS['homework_submissions_export']
+        )
+
+    def test_quiz_detail(self):
+        self.assertWithinBudget(
+            'quiz_detail', '/homework/quiz/{}'.format(self.seed.quiz_ids[0]), BUDGETS['quiz_detail']
+        )
+
+    def test_quiz_stats(self):
+        self.assertWithinBudget(
+            'quiz_stats', '/homework/quiz/{}/stats'.format(self.seed.quiz_ids[0]), BUDGETS['quiz_stats']
+        )
+
+    def test_role_listing(self):
+        self.assertWithinBudget('role_listing', '/permissions/role', BUDGETS['role_listing'])
@@ -0,0 +1,310 @@
+"""
+Seed a school sized database for the performance tests.
+
+Objects are built with the factories' new() so they look like the ones the API tests use, then written with one
+executemany per table. Ids are assigned here because the factories pick random ones. Users other than the one the
+tests log in as share a password hash so seeding doesn't spend minutes in bcrypt.
+"""
+import datetime
+import random
+
+from faker import Faker
+from sqlalchemy.orm import object_mapper
+
+from tests.school.factories import SchoolFactory
+from tests.user.factories import UserFactory
+from tests.lessons.factories import SubjectFactory
+from tests.homework.factories import EssayFactory, EssaySubmissionFactory, QuizFactory, QuizSubmissionFactory
+
+from app import db
+from app.homework.models import Comment, EssaySubmission, Homework, Question, QuizAnswer, QuizSubmission, \
+    Submission, Quiz, Essay
+from app.homework.status_functions import rebuild_statuses
+from app.lessons.models import Lesson, lesson_student, lesson_teacher
+from app.timetable.models import Period, TimetabledLesson, Week
+from app.user.models import User
+from app.user.password_functions import hash_password
+
+fake = Faker()
+
+# Sizes at PERF_SCALE=1
+TIMETABLE_STUDENTS = 1500
+BLOCKS = 10
+WEEKS = 2
+PERIODS_PER_DAY = 6
+FULL_SIZE = {
+    'users': 2000,
+    'lessons': 80,
+    'homework': 5000,
+    'submissions': 100000
+}
+STUDENTS_PER_LESSON = 30
+QUESTIONS_PER_QUIZ = 5
+BATCH_SIZE = 5000
+
+
+def sizes(scale):
+    return {name: max(1, int(size * scale)) for name, size in FULL_SIZE.items()}
+
+
+def table_rows(objects, table):
+    """Return the values of a table's columns for each object, e.g. the essay_submission part of EssaySubmissions."""
+    if not objects:
+        return []
+    mapper = object_mapper(objects[0])
+    keys = [(column.name, mapper.get_property_by_column(column).key) for column in table.columns]
+    return [{name: getattr(obj, key) for name, key in keys} for obj in objects]
+
+
+def insert(objects, *tables):
+    """Write objects to each table they map, in order, BATCH_SIZE rows at a time."""
+    for table in tables:
+        rows = table_rows(objects, table)
+        for start in range(0, len(rows), BATCH_SIZE):
+            db.session.execute(table.insert(), rows[start:start + BATCH_SIZE])
+
+
+class Seed:
+    """The ids of what was seeded, for the tests to build URLs from."""
+    def __init__(self, school_id, user, counts):
+        self.school_id = school_id
+        self.user_id = user.id
+        self.username = user.username
+        self.password = user.raw_password
+        self.counts = counts
+        self.lesson_ids = []
+        self.taught_lesson_id = None
+        self.quiz_ids = []
+        self.essay_ids = []
+
+
+def seed_school(scale=1.0, random_seed=0):
+    random.seed(random_seed)
+    fake.seed(random_seed)
+    counts = sizes(scale)
+
+    school = SchoolFactory().new_into_db()
+    school_id = school.id
+
+    # The user the tests log in as attends and teaches lessons so every endpoint has data
+    user = UserFactory(school=school).new_into_db(
+        school_id=school_id,
+        permissions=['Administrator', 'Teacher', 'Student']
+    )
+    seed = Seed(school_id, user, counts)
+
+    password = hash_password('password')
+    users = [
+        {
+            'id': user.id + 1 + i,
+            'school_id': school_id,
+            'username': '{}{}'.format(fake.user_name(), i),
+            'first_name': fake.first_name(),
+            'last_name': fake.last_name(),
+            'email': '{}{}@{}'.format(fake.user_name(), i, fake.free_email_domain()),
+            'password': password,
+            'form_id': None
+        } for i in range(counts['users'])
+    ]
+    db.session.execute(User.__table__.insert(), users)
+    user_ids = [u['id'] for u in users]
+    teacher_ids = user_ids[:max(1, len(user_ids) // 20)]
+    student_ids = user_ids[len(teacher_ids):] or user_ids
+
+    subject = SubjectFactory(school).new_into_db()
+    lessons = []
+    for i in range(counts['lessons']):
+        lesson = Lesson(name='{} {}'.format(fake.first_name(), i), school_id=school_id, subject_id=subject.id)
+        lesson.id = i + 1
+        lessons.append(lesson)
+    insert(lessons, Lesson.__table__)
+    seed.lesson_ids = [lesson.id for lesson in lessons]
+    seed.taught_lesson_id = seed.lesson_ids[0]
+
+    members = {}
+    teachers = [{'lesson_id': seed.taught_lesson_id, 'user_id': user.id}]
+    students = []
+    for lesson in lessons:
+        members[lesson.id] = random.sample(student_ids, min(STUDENTS_PER_LESSON, len(student_ids)))
+        students.extend({'lesson_id': lesson.id, 'user_id': student_id} for student_id in members[lesson.id])
+        teachers.append({'lesson_id': lesson.id, 'user_id': random.choice(teacher_ids)})
+    for lesson_id in seed.lesson_ids[:10]:
+        members[lesson_id].append(user.id)
+        students.append({'lesson_id': lesson_id, 'user_id': user.id})
+    db.session.execute(lesson_teacher.insert(), teachers)
+    db.session.execute(lesson_student.insert(), students)
+
+    # Half quizzes, half essays, spread across the lessons
+    quiz_factory = QuizFactory(school)
+    essay_factory = EssayFactory(school)
+    quizzes, essays, questions = [], [], []
+    for i in range(counts['homework']):
+        lesson_id = seed.lesson_ids[i % len(seed.lesson_ids)]
+        if i % 2 == 0:
+            homework = quiz_factory.new(lesson_id=lesson_id, number_of_questions=QUESTIONS_PER_QUIZ)
+            homework.id = i + 1
+            for question in homework.questions:
+                question.homework_id = homework.id
+                question.id = len(questions) + 1
+                questions.append(question)
+            quizzes.append(homework)
+        else:
+            homework = essay_factory.new(lesson_id=lesson_id)
+            homework.id = i + 1
+            essays.append(homework)
+    insert(quizzes, Homework.__table__, Quiz.__table__)
+    insert(essays, Homework.__table__, Essay.__table__)
+    insert(questions, Question.__table__)
+    seed.quiz_ids = [quiz.id for quiz in quizzes]
+    seed.essay_ids = [essay.id for essay in essays]
+
+    # Submissions from students of each homework's lesson, first to the homework the test user can see
+    homework = sorted(quizzes + essays, key=lambda h: (h.lesson_id not in seed.lesson_ids[:10], h.id))
+    per_homework = max(1, counts['submissions'] // len(homework))
+    quiz_submission_factory = QuizSubmissionFactory(school)
+    essay_submission_factory = EssaySubmissionFactory(school)
+    quiz_submissions, essay_submissions, answers = [], [], []
+    submitted = datetime.datetime(2016, 10, 3, 9, 0)
+    total = 0
+    for item in homework:
+        for student_id in members[item.lesson_id][-per_homework:]:
+            if total >= counts['submissions']:
+                break
+            total += 1
+            if isinstance(item, Quiz):
+                submission = quiz_submission_factory.new(quiz=item, user_id=student_id)
+                submission.id = total
+                submission.total_score = 0
+                for answer in submission.answers:
+                    answer.submission_id = submission.id
+                    answer.id = len(answers) + 1
+                    answer.correct = random.random() < 0.5
+                    submission.total_score += answer.correct
+                    answers.append(answer)
+                quiz_submissions.append(submission)
+            else:
+                submission = essay_submission_factory.new(essay=item, user_id=student_id)
+                submission.id = total
+                essay_submissions.append(submission)
+            submission.datetime_submitted = submitted + datetime.timedelta(minutes=total)
+    insert(quiz_submissions, Submission.__table__, QuizSubmission.__table__)
+    insert(essay_submissions, Submission.__table__, EssaySubmission.__table__)
+    insert(answers, QuizAnswer.__table__)
+
+    # A comment on every tenth essay
+    comments = []
+    for submission in essay_submissions[::10]:
+        comment = Comment(text=fake.sentence(), user_id=user.id, submission_id=submission.id)
+        comment.id = len(comments) + 1
+        comments.append(comment)
+    insert(comments, Comment.__table__)
+
+    rebuild_statuses()
+    db.session.commit()
+
+    seed.counts = {
+        'users': len(users) + 1,
+        'lessons': len(lessons),
+        'homework': len(quizzes) + len(essays),
+        'questions': len(questions),
+        'submissions': total,
+        'quiz_answers': len(answers),
+        'comments': len(comments)
+    }
+    return seed
+
+
+def seed_timetable_school(scale=1.0, random_seed=0):
+    """
+    Seed a school of TIMETABLE_STUDENTS students timetabled in BLOCKS option blocks, for the clash report.
+
+    Each block has a lesson per STUDENTS_PER_LESSON students and each student attends one lesson in every block, so
+    with a block's lessons all in the same periods no one is double booked. One student in a hundred is then put in a
+    second lesson of the first block, giving a clash in each of its periods.
+    """
+    random.seed(random_seed)
+    fake.seed(random_seed)
+
+    school = SchoolFactory().new_into_db()
+    school_id = school.id
+    user = UserFactory(school=school).new_into_db(school_id=school_id, permissions=['Administrator'])
+
+    student_count = max(STUDENTS_PER_LESSON, int(TIMETABLE_STUDENTS * scale))
+    lessons_per_block = -(-student_count // STUDENTS_PER_LESSON)
+    teacher_count = max(lessons_per_block, student_count // 15)
+    password = hash_password('password')
+    users = [
+        {
+            'id': user.id + 1 + i,
+            'school_id': school_id,
+            'username': 'user{}'.format(i),
+            'first_name': fake.first_name(),
+            'last_name': fake.last_name(),
+            'email': 'user{}@example.com'.format(i),
+            'password': password,
+            'form_id': None
+        } for i in range(student_count + teacher_count)
+    ]
+    db.session.execute(User.__table__.insert(), users)
+    student_ids = [u['id'] for u in users[:student_count]]
+    teacher_ids = [u['id'] for u in users[student_count:]]
+
+    subject = SubjectFactory(school).new_into_db()
+    weeks, periods = [], []
+    for week_number in range(WEEKS):
+        weeks.append({'id': week_number + 1, 'name': 'Week {}'.format(week_number + 1), 'school_id': school_id})
+        for day in range(1, 6):
+            for number in range(PERIODS_PER_DAY):
+                periods.append({
+                    'id': len(periods) + 1,
+                    'week_id': week_number + 1,
+                    'day': day,
+                    'start_time': datetime.time(9 + number),
+                    'end_time': datetime.time(9 + number, 50),
+                    'name': 'Period {}'.format(number + 1)
+                })
+    db.session.execute(Week.__table__.insert(), weeks)
+    db.session.execute(Period.__table__.insert(), periods)
+
+    # Spread each block's periods through the week
+    periods_per_week = 5 * PERIODS_PER_DAY
+    block_periods = [
+        [p['id'] for p in periods if (p['id'] - 1) % periods_per_week % BLOCKS == block]
+        for block in range(BLOCKS)
+    ]
+
+    lessons, students, teachers, timetabled = [], [], [], []
+    for block in range(BLOCKS):
+        random.shuffle(student_ids)
+        for number in range(lessons_per_block):
+            lesson_id = len(lessons) + 1
+            lessons.append({
+                'id': lesson_id,
+                'name': 'Block {} lesson {}'.format(block + 1, number + 1),
+                'school_id': school_id,
+                'subject_id': subject.id
+            })
+            members = student_ids[number * STUDENTS_PER_LESSON:(number + 1) * STUDENTS_PER_LESSON]
+            students.extend({'lesson_id': lesson_id, 'user_id': student_id} for student_id in members)
+            teachers.append({'lesson_id': lesson_id, 'user_id': teacher_ids[(number + block) % teacher_count]})
+            for period_id in block_periods[block]:
+                timetabled.append({'id': len(timetabled) + 1, 'period_id': period_id, 'lesson_id': lesson_id})
+
+    # Block one's lessons have the first ids, so put these students in the next one along too
+    first_block = {row['user_id']: row['lesson_id'] for row in students[:student_count]}
+    for student_id in student_ids[:student_count // 100]:
+        students.append({'lesson_id': first_block[student_id] % lessons_per_block + 1, 'user_id': student_id})
+
+    db.session.execute(Lesson.__table__.insert(), lessons)
+    db.session.execute(lesson_student.insert(), students)
+    db.session.execute(lesson_teacher.insert(), teachers)
+    db.session.execute(TimetabledLesson.__table__.insert(), timetabled)
+    db.session.commit()
+
+    return Seed(school_id, user, {
+        'users': len(users) + 1,
+        'lessons': len(lessons),
+        'lesson_students': len(students),
+        'periods': len(periods),
+        'timetabled_lessons': len(timetabled)
+    })
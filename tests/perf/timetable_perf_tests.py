@@ -0,0 +1,59 @@
+import json
+import time
+
+from tests.perf import Budget, PerfTestCase, latency_test
+from tests.perf.seed import seed_timetable_school
+
+from app import db
+from app.lessons.models import Lesson
+from app.timetable.models import SolverJob
+from app.timetable.solver_functions import run_job
+
+# Seconds the solver may take to place every lesson in a week twice, and how long it may search
+SOLVER_BUDGET_SECONDS = 120
+
+# Latency budgets are for PERF_SCALE=1 on a developer machine with SQLite
+BUDGETS = {
+    'timetable_clash_report': Budget(statements=5, p95_ms=1000),
+    'timetable_clash_report_week': Budget(statements=5, p95_ms=500),
+}
+
+
+class TimetablePerfTestCase(PerfTestCase):
+    seed_function = staticmethod(seed_timetable_school)
+
+    def test_clash_report(self):
+        self.assertWithinBudget('timetable_clash_report', '/timetable/clashes', BUDGETS['timetable_clash_report'])
+
+    def test_clash_report_week(self):
+        self.assertWithinBudget(
+            'timetable_clash_report_week', '/timetable/clashes?week_id=1', BUDGETS['timetable_clash_report_week']
+        )
+
+    @latency_test
+    def test_solver(self):
+        lesson_ids = [lesson_id for (lesson_id,) in db.session.query(Lesson.id)]
+        job = SolverJob(self.seed.school_id, 1, {
+            'lesson_ids': lesson_ids,
+            'periods_per_lesson': 2,
+            'lesson_periods': {},
+            'time_limit': SOLVER_BUDGET_SECONDS,
+            'random_seed': 0
+        })
+        db.session.add(job)
+        db.session.commit()
+
+        start = time.perf_counter()
+        run_job(job.id)
+        seconds = time.perf_counter() - start
+        result = json.loads(job.result)
+        self.results['timetable_solver'] = {
+            'seconds': round(seconds, 2),
+            'lessons': len(lesson_ids),
+            'result': result,
+            'budget': {'seconds': SOLVER_BUDGET_SECONDS},
+            'passed': result['unplaced'] == 0 and seconds <= SOLVER_BUDGET_SECONDS
+        }
+
+        self.assertEqual(result['unplaced'], 0, result)
+        self.assertLessEqual(seconds, SOLVER_BUDGET_SECONDS)
@@ -17,6 +17,8 @@ class WeekFactory:
 
     def new(self):
         id = fake.random_int()
+        while Week.query.get(id) is not None:
+            id = fake.random_int()
 
         week = Week(
             name=fake.first_name(),
@@ -53,7 +55,7 @@ class PeriodFactory:
             end_time = placeholder
 
         period = Period(
-            week=week_id,
+            week=None,
             day=random.randint(1, 5),
             start_time=start_time,
             end_time=end_time,
@@ -61,6 +63,7 @@ class PeriodFactory:
         )
 
         period.id = id
+        period.week_id = week_id
         return period
 
     def new_into_db(self, **kwargs):
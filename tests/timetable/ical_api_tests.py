@@ -0,0 +1,184 @@
+import datetime
+import json
+
+from app import db
+from app.cache import LRUCache
+from tests import APITestCase, count_queries
+from tests.school.factories import SchoolFactory
+from tests.user.factories import UserFactory
+from tests.lessons.factories import LessonFactory
+from tests.timetable.factories import WeekFactory
+
+from app.timetable.cache_functions import invalidate_timetable
+from app.timetable.ical_functions import feed_token, fold
+from app.timetable.models import Day, Period, TimetabledLesson
+
+
+class ICalAPITestCase(APITestCase):
+    def setUp(self):
+        super(ICalAPITestCase, self).setUp()
+        self.school = SchoolFactory().new_into_db()
+        self.user = UserFactory(school=self.school).new_into_db(
+            school_id=self.school.id,
+            permissions=['Administrator', 'Teacher', 'Student']
+        )
+        self.token = self.get_auth_token(username=self.user.username, password=self.user.raw_password)
+
+        week_factory = WeekFactory(school=self.school)
+        # Weeks repeat in id order
+        self.week_a, self.week_b = sorted([week_factory.new_into_db(), week_factory.new_into_db()], key=lambda w: w.id)
+        self.monday = Period(
+            self.week_a, Day.MONDAY.value, datetime.time(9, 0), datetime.time(10, 0), 'Period 1'
+        )
+        self.friday = Period(
+            self.week_b, Day.FRIDAY.value, datetime.time(14, 0), datetime.time(15, 0), 'Period 5'
+        )
+        db.session.add_all([self.monday, self.friday])
+        db.session.commit()
+
+        lesson_factory = LessonFactory(self.school)
+        self.attending = lesson_factory.new_into_db(students=[self.user])
+        self.teaching = lesson_factory.new_into_db(teachers=[self.user])
+        self.other = lesson_factory.new_into_db()
+        # Factory names are random first names, which could appear in another lesson's event by chance
+        for name, lesson in [('Attending', self.attending), ('Teaching', self.teaching), ('Other', self.other)]:
+            lesson.name = '{} lesson'.format(name)
+            lesson.subject.name = '{} subject'.format(name)
+        db.session.add_all([
+            TimetabledLesson(self.monday.id, self.attending.id),
+            TimetabledLesson(self.friday.id, self.teaching.id),
+            TimetabledLesson(self.friday.id, self.other.id)
+        ])
+        db.session.commit()
+        self.other_timetabled_id = TimetabledLesson.query.filter_by(lesson_id=self.other.id).one().id
+
+        self.url = '/timetable/ical/{}.ics'.format(feed_token(self.user.id, self.school.id))
+
+    def tearDown(self):
+        super(ICalAPITestCase, self).tearDown()
+
+    def create_essay(self, title, lesson_id):
+        return self.client.post(
+            '/homework/essay',
+            data=json.dumps({'lesson_id': lesson_id, 'title': title, 'description': '', 'date_due': '20/10/2026'}),
+            headers={'Content-Type': 'application/json', 'Authorization': 'JWT ' + self.token}
+        )
+
+    def test_ical_feed(self):
+        response = self.client.get(
+            '/timetable/ical',
+            headers={'Content-Type': 'application/json', 'Authorization': 'JWT ' + self.token}
+        )
+        url = json.loads(response.data.decode('utf-8'))['url']
+        self.assertTrue(url.endswith(self.url))
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'text/calendar')
+        feed = response.data.decode('utf-8')
+        self.assertTrue(feed.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertEqual(feed.count('BEGIN:VEVENT'), 2)
+        self.assertIn('SUMMARY:{}'.format(self.attending.name), feed)
+        # The second week is the week after ICAL_TIMETABLE_START, and the two weeks alternate
+        self.assertIn('DTSTART:20160905T090000', feed)
+        self.assertIn('DTSTART:20160916T140000', feed)
+        self.assertIn('RRULE:FREQ=WEEKLY;INTERVAL=2', feed)
+        self.assertNotIn(self.other.name, feed)
+        self.assertNotIn('UID:timetabled-lesson-{}@'.format(self.other_timetabled_id), feed)
+
+    def test_ical_feed_invalid_token(self):
+        token = feed_token(self.user.id, self.school.id)
+        response = self.client.get('/timetable/ical/{}x.ics'.format(token))
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get('/timetable/ical/{}.ics'.format(feed_token(self.user.id, self.school.id + 1)))
+        self.assertEqual(response.status_code, 404)
+
+    def test_ical_feed_url_reset(self):
+        response = self.client.post(
+            '/timetable/ical/reset',
+            headers={'Content-Type': 'application/json', 'Authorization': 'JWT ' + self.token}
+        )
+        self.assertEqual(response.status_code, 200)
+        url = json.loads(response.data.decode('utf-8'))['url']
+        self.assertFalse(url.endswith(self.url))
+
+        # The old URL is revoked, checked by the one query that finds the feed's versions
+        with count_queries() as statements:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(len(statements), 1)
+
+        response = self.client.get(url[url.index('/timetable/'):])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('SUMMARY:{}'.format(self.attending.name), response.data.decode('utf-8'))
+
+    def test_ical_feed_conditional_get(self):
+        response = self.client.get(self.url)
+        etag = response.headers['ETag']
+        self.assertFalse(etag.startswith('W/'))
+
+        with count_queries() as statements:
+            response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+        # Only the versions are looked up
+        self.assertEqual(len(statements), 1)
+
+        # Setting homework changes the feed of the lesson's members
+        self.assertEqual(self.create_essay('Essay; draft', self.teaching.id).status_code, 201)
+        response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.assertIn('SUMMARY:Due: Essay\\; draft', response.data.decode('utf-8'))
+        self.assertIn('DTSTART;VALUE=DATE:20261020', response.data.decode('utf-8'))
+
+        last_modified = response.headers['Last-Modified']
+        response = self.client.get(self.url, headers={'If-Modified-Since': last_modified})
+        self.assertEqual(response.status_code, 304)
+
+    def test_ical_feed_changed_by_new_week(self):
+        response = self.client.get(self.url)
+        etag = response.headers['ETag']
+        self.assertIn('RRULE:FREQ=WEEKLY;INTERVAL=2', response.data.decode('utf-8'))
+
+        response = self.client.post(
+            '/timetable/week',
+            data=json.dumps({'name': 'Week C'}),
+            headers={'Content-Type': 'application/json', 'Authorization': 'JWT ' + self.token}
+        )
+        self.assertEqual(response.status_code, 201)
+
+        response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.assertIn('RRULE:FREQ=WEEKLY;INTERVAL=3', response.data.decode('utf-8'))
+
+    def test_ical_feed_cache(self):
+        self.app.extensions['ical_cache'] = LRUCache()
+        try:
+            first = self.client.get(self.url).data
+            with count_queries() as statements:
+                self.assertEqual(self.client.get(self.url).data, first)
+            self.assertEqual(len(statements), 1)
+
+            # Only the homework part is rebuilt after homework is set
+            self.assertEqual(self.create_essay('Essay', self.teaching.id).status_code, 201)
+            with count_queries() as statements:
+                feed = self.client.get(self.url).data.decode('utf-8')
+            self.assertEqual(len([statement for statement in statements if 'period' in statement]), 0)
+            self.assertEqual(len([statement for statement in statements if 'homework' in statement]), 1)
+            self.assertEqual(feed.count('BEGIN:VEVENT'), 3)
+
+            # Timetable changes are seen straight away
+            db.session.add(TimetabledLesson(self.friday.id, self.attending.id))
+            invalidate_timetable(self.school.id)
+            db.session.commit()
+            self.assertEqual(self.client.get(self.url).data.decode('utf-8').count('BEGIN:VEVENT'), 4)
+        finally:
+            del self.app.extensions['ical_cache']
+
+    def test_fold(self):
+        line = 'DESCRIPTION:' + 'é' * 60
+        folded = fold(line)
+        self.assertTrue(all(len(part.encode('utf-8')) <= 75 for part in folded.split('\r\n')))
+        self.assertEqual(folded.replace('\r\n ', ''), line)
@@ -0,0 +1,149 @@
+import datetime
+import json
+
+from app import db
+from tests import APITestCase, count_queries
+from tests.school.factories import SchoolFactory
+from tests.user.factories import UserFactory
+from tests.lessons.factories import LessonFactory
+from tests.timetable.factories import WeekFactory
+
+from app.timetable.models import Day, Period, TimetabledLesson
+
+TEMPLATE = [
+    {'name': 'Period 1', 'start_time': '09:00', 'end_time': '10:00'},
+    {'name': 'Period 2', 'start_time': '10:00', 'end_time': '11:00'},
+    {'name': 'Period 3', 'start_time': '11:20', 'end_time': '12:20'},
+    {'name': 'Period 4', 'start_time': '12:20', 'end_time': '13:20'},
+    {'name': 'Period 5', 'start_time': '14:00', 'end_time': '15:00'},
+    {'name': 'Period 6', 'start_time': '15:00', 'end_time': '16:00'},
+]
+
+
+class PeriodAPITestCase(APITestCase):
+    def setUp(self):
+        super(PeriodAPITestCase, self).setUp()
+        self.school = SchoolFactory().new_into_db()
+        self.user = UserFactory(school=self.school).new_into_db(
+            school_id=self.school.id,
+            permissions=['Administrator', 'Teacher', 'Student']
+        )
+        self.token = self.get_auth_token(username=self.user.username, password=self.user.raw_password)
+
+        week_factory = WeekFactory(school=self.school)
+        self.week_a = week_factory.new_into_db()
+        self.week_b = week_factory.new_into_db()
+        self.week_ids = [self.week_a.id, self.week_b.id]
+
+    def tearDown(self):
+        super(PeriodAPITestCase, self).tearDown()
+
+    def post(self, url, data):
+        return self.client.post(
+            url,
+            data=json.dumps(data),
+            headers={'Content-Type': 'application/json', 'Authorization': 'JWT ' + self.token}
+        )
+
+    def periods(self, week_id):
+        return Period.query.filter_by(week_id=week_id).order_by(Period.day, Period.start_time).all()
+
+    def test_period_template(self):
+        with count_queries() as statements:
+            response = self.post('/timetable/period-template', {'week_ids': self.week_ids, 'periods': TEMPLATE})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(json.loads(response.data.decode('utf-8'))['periods_created'], 2 * 5 * 6)
+        # Every period in one INSERT
+        self.assertEqual(len([statement for statement in statements if statement.startswith('INSERT')]), 1)
+
+        periods = self.periods(self.week_a.id)
+        self.assertEqual(len(periods), 5 * 6)
+        self.assertEqual({period.day for period in periods}, {day.value for day in Day})
+        self.assertEqual(
+            [(period.name, period.start_time) for period in periods[:3]],
+            [('Period 1', datetime.time(9, 0)), ('Period 2', datetime.time(10, 0)), ('Period 3', datetime.time(11, 20))]
+        )
+        self.assertEqual(len(self.periods(self.week_b.id)), 5 * 6)
+
+    def test_period_template_days_and_replace(self):
+        self.post('/timetable/period-template', {'week_ids': [self.week_a.id], 'periods': TEMPLATE})
+        response = self.post('/timetable/period-template', {'week_ids': [self.week_a.id], 'periods': TEMPLATE})
+        self.assertEqual(response.status_code, 409)
+
+        response = self.post(
+            '/timetable/period-template',
+            {'week_ids': [self.week_a.id], 'periods': TEMPLATE[:2], 'days': [Day.MONDAY.value], 'replace': True}
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            [(period.day, period.name) for period in self.periods(self.week_a.id)],
+            [(Day.MONDAY.value, 'Period 1'), (Day.MONDAY.value, 'Period 2')]
+        )
+
+    def test_period_template_invalid(self):
+        for data in [
+            {'week_ids': self.week_ids, 'periods': [{'start_time': '10:00', 'end_time': '09:00'}]},
+            {'week_ids': self.week_ids, 'periods': [{'start_time': '9am', 'end_time': '10:00'}]},
+            {'week_ids': self.week_ids, 'periods': TEMPLATE + [{'start_time': '09:30', 'end_time': '09:45'}]},
+            {'week_ids': self.week_ids, 'periods': TEMPLATE, 'days': [6]},
+            {'week_ids': self.week_ids + [self.week_b.id + 100], 'periods': TEMPLATE},
+            {'week_ids': [], 'periods': TEMPLATE},
+            {'week_ids': self.week_ids, 'periods': ['x']},
+            {'week_ids': [{'id': self.week_a.id}], 'periods': TEMPLATE},
+        ]:
+            response = self.post('/timetable/period-template', data)
+            self.assertEqual(response.status_code, 409, data)
+        self.assertEqual(Period.query.count(), 0)
+
+    def test_copy_week(self):
+        self.post('/timetable/period-template', {'week_ids': [self.week_a.id], 'periods': TEMPLATE})
+        source_periods = self.periods(self.week_a.id)
+        lesson_factory = LessonFactory(self.school)
+        lessons = [lesson_factory.new_into_db() for _ in range(2)]
+        db.session.add_all([
+            TimetabledLesson(source_periods[0].id, lessons[0].id),
+            TimetabledLesson(source_periods[0].id, lessons[1].id),
+            TimetabledLesson(source_periods[7].id, lessons[1].id)
+        ])
+        db.session.commit()
+        expected = sorted([
+            (source_periods[0].day, source_periods[0].start_time, lessons[0].id),
+            (source_periods[0].day, source_periods[0].start_time, lessons[1].id),
+            (source_periods[7].day, source_periods[7].start_time, lessons[1].id)
+        ])
+
+        with count_queries() as statements:
+            response = self.post('/timetable/week/{}/copy'.format(self.week_a.id), {'week_id': self.week_b.id})
+        self.assertEqual(response.status_code, 201)
+        json_response = json.loads(response.data.decode('utf-8'))
+        self.assertEqual(json_response['periods_created'], 5 * 6)
+        self.assertEqual(json_response['timetabled_lessons_created'], 3)
+        # One INSERT ... SELECT for the periods and one for the timetabled lessons
+        self.assertEqual(len([statement for statement in statements if statement.startswith('INSERT')]), 2)
+
+        self.assertEqual(
+            [(p.day, p.start_time, p.end_time, p.name) for p in self.periods(self.week_b.id)],
+            [(p.day, p.start_time, p.end_time, p.name) for p in source_periods]
+        )
+        copied = db.session.query(Period.day, Period.start_time, TimetabledLesson.lesson_id) \
+            .join(TimetabledLesson, TimetabledLesson.period_id == Period.id) \
+            .filter(Period.week_id == self.week_b.id)
+        self.assertEqual(sorted(copied), expected)
+
+        # Copying again needs replace, which doesn't duplicate anything
+        response = self.post('/timetable/week/{}/copy'.format(self.week_a.id), {'week_id': self.week_b.id})
+        self.assertEqual(response.status_code, 409)
+        response = self.post(
+            '/timetable/week/{}/copy'.format(self.week_a.id),
+            {'week_id': self.week_b.id, 'replace': True, 'include_lessons': False}
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(self.periods(self.week_b.id)), 5 * 6)
+        self.assertEqual(copied.count(), 0)
+
+    def test_copy_week_invalid(self):
+        other_week = WeekFactory(school=SchoolFactory().new_into_db()).new_into_db()
+        response = self.post('/timetable/week/{}/copy'.format(self.week_a.id), {'week_id': other_week.id})
+        self.assertEqual(response.status_code, 409)
+        response = self.post('/timetable/week/{}/copy'.format(self.week_a.id), {'week_id': self.week_a.id})
+        self.assertEqual(response.status_code, 409)
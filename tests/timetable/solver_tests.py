@@ -0,0 +1,148 @@
+import datetime
+import json
+import unittest
+
+from app import db
+from tests import APITestCase
+from tests.school.factories import SchoolFactory
+from tests.user.factories import UserFactory
+from tests.lessons.factories import LessonFactory
+from tests.timetable.factories import WeekFactory
+
+from app.timetable.models import Day, Period, SolverJob, SolverJobStatus, TimetabledLesson
+from app.timetable.solver import Solver
+
+PERIODS = [(1, 1), (2, 1), (3, 2)]
+OVERLAPPING = {1: {1}, 2: {2}, 3: {3}}
+
+
+class SolverTestCase(unittest.TestCase):
+    def test_lessons_sharing_a_teacher_placed_apart(self):
+        lessons = {10: (1, {100, 1}), 11: (1, {100, 2}), 12: (1, {100, 3})}
+        result = Solver(PERIODS, OVERLAPPING, lessons, random_seed=0).solve(time_limit=5)
+
+        self.assertEqual(result.unplaced, [])
+        self.assertEqual(sorted(period_id for _, period_id in result.placements), [1, 2, 3])
+
+    def test_fixed_lessons_and_overlapping_periods_respected(self):
+        overlapping = {1: {1, 2}, 2: {1, 2}, 3: {3}}
+        lessons = {10: (1, {100}), 11: (1, {101})}
+        # 100 is already busy in period 3
+        result = Solver(PERIODS, overlapping, lessons, busy={100: {3}}, random_seed=0).solve(time_limit=5)
+
+        placements = dict(result.placements)
+        self.assertIn(placements[10], [1, 2])
+
+    def test_unplaceable_sessions_left_out(self):
+        # Four sessions of one teacher's lessons but only three periods
+        lessons = {10: (2, {100}), 11: (2, {100})}
+        result = Solver(PERIODS, OVERLAPPING, lessons, random_seed=0).solve(time_limit=1)
+
+        self.assertEqual(len(result.placements), 3)
+        self.assertEqual(len(result.unplaced), 1)
+        self.assertEqual(len({period_id for _, period_id in result.placements}), 3)
+
+
+class SolverAPITestCase(APITestCase):
+    def setUp(self):
+        super(SolverAPITestCase, self).setUp()
+        self.school = SchoolFactory().new_into_db()
+        self.user = UserFactory(school=self.school).new_into_db(
+            school_id=self.school.id,
+            permissions=['Administrator']
+        )
+        self.token = self.get_auth_token(username=self.user.username, password=self.user.raw_password)
+
+        self.week = WeekFactory(school=self.school).new_into_db()
+        db.session.add_all([
+            Period(self.week, day.value, datetime.time(hour), datetime.time(hour, 50), 'Period')
+            for day in Day for hour in (9, 10)
+        ])
+        db.session.commit()
+
+        # Every lesson shares a teacher or students with the next so a careless timetable would clash
+        user_factory = UserFactory(school=self.school)
+        teachers = [user_factory.new_into_db(school_id=self.school.id) for _ in range(2)]
+        students = [user_factory.new_into_db(school_id=self.school.id) for _ in range(4)]
+        lesson_factory = LessonFactory(self.school)
+        self.lessons = [
+            lesson_factory.new_into_db(teachers=[teachers[i % 2]], students=students[i % 3:i % 3 + 2])
+            for i in range(5)
+        ]
+
+    def tearDown(self):
+        super(SolverAPITestCase, self).tearDown()
+
+    def test_solve_week(self):
+        week_id = self.week.id
+        response = self.client.post(
+            '/timetable/solve',
+            data=json.dumps({'week_id': week_id, 'periods_per_lesson': 2, 'random_seed': 0, 'time_limit': 5}),
+            headers={'Content-Type': 'application/json', 'Authorization': 'JWT ' + self.token}
+        )
+        self.assertEqual(response.status_code, 202)
+        job = json.loads(response.data.decode('utf-8'))['job']
+
+        response = self.client.get(
+            '/timetable/solve/{}'.format(job['id']),
+            headers={'Content-Type': 'application/json', 'Authorization': 'JWT ' + self.token}
+        )
+        job = json.loads(response.data.decode('utf-8'))['job']
+        self.assertEqual(job['status'], 'SUCCEEDED')
+        self.assertEqual(job['result']['placed'], 10)
+        self.assertEqual(TimetabledLesson.query.count(), 10)
+
+        response = self.client.get(
+            '/timetable/clashes?week_id={}'.format(week_id),
+            headers={'Content-Type': 'application/json', 'Authorization': 'JWT ' + self.token}
+        )
+        self.assertEqual(json.loads(response.data.decode('utf-8'))['clashes'], [])
+
+    def test_solve_week_already_running(self):
+        running = SolverJob(self.school.id, self.week.id, {})
+        db.session.add(running)
+        db.session.commit()
+        running_id = running.id
+
+        response = self.client.post(
+            '/timetable/solve',
+            data=json.dumps({'week_id': self.week.id, 'time_limit': 5}),
+            headers={'Content-Type': 'application/json', 'Authorization': 'JWT ' + self.token}
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(json.loads(response.data.decode('utf-8'))['job_id'], running_id)
+        self.assertEqual(SolverJob.query.count(), 1)
+
+        # A finished job doesn't stop the week being solved again
+        running = SolverJob.query.get(running_id)
+        running.status = SolverJobStatus.FAILED.value
+        db.session.commit()
+        response = self.client.post(
+            '/timetable/solve',
+            data=json.dumps({'week_id': self.week.id, 'time_limit': 5}),
+            headers={'Content-Type': 'application/json', 'Authorization': 'JWT ' + self.token}
+        )
+        self.assertEqual(response.status_code, 202)
+
+    def test_solve_invalid_week(self):
+        response = self.client.post(
+            '/timetable/solve',
+            data=json.dumps({'week_id': 0}),
+            headers={'Content-Type': 'application/json', 'Authorization': 'JWT ' + self.token}
+        )
+        self.assertEqual(response.status_code, 409)
+
+    def test_solve_invalid_lessons(self):
+        for data in [
+            {'lesson_ids': [{'a': 1}]},
+            {'lesson_ids': 'all'},
+            {'lesson_periods': [1]},
+            {'lesson_periods': {'x': 2}},
+        ]:
+            data['week_id'] = self.week.id
+            response = self.client.post(
+                '/timetable/solve',
+                data=json.dumps(data),
+                headers={'Content-Type': 'application/json', 'Authorization': 'JWT ' + self.token}
+            )
+            self.assertEqual(response.status_code, 409, data)
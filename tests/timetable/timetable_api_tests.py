@@ -0,0 +1,185 @@
+import datetime
+import json
+
+from app import db
+from app.cache import LRUCache
+from tests import APITestCase, count_queries
+from tests.school.factories import SchoolFactory
+from tests.user.factories import UserFactory
+from tests.lessons.factories import LessonFactory
+from tests.timetable.factories import WeekFactory
+
+from app.timetable.clash_functions import IntervalIndex
+from app.timetable.models import Day, Period, TimetabledLesson
+
+
+class TimetableAPITestCase(APITestCase):
+    def setUp(self):
+        super(TimetableAPITestCase, self).setUp()
+        self.school = SchoolFactory().new_into_db()
+        self.user = UserFactory(school=self.school).new_into_db(
+            school_id=self.school.id,
+            permissions=['Administrator', 'Teacher', 'Student']
+        )
+        self.token = self.get_auth_token(username=self.user.username, password=self.user.raw_password)
+
+        self.week = WeekFactory(school=self.school).new_into_db()
+        self.first = Period(
+            self.week, Day.MONDAY.value, datetime.time(9, 0), datetime.time(10, 0), 'Period 1'
+        )
+        self.second = Period(
+            self.week, Day.MONDAY.value, datetime.time(10, 0), datetime.time(11, 0), 'Period 2'
+        )
+        self.free = Period(
+            self.week, Day.TUESDAY.value, datetime.time(9, 0), datetime.time(10, 0), 'Period 1'
+        )
+        db.session.add_all([self.first, self.second, self.free])
+        db.session.commit()
+
+        lesson_factory = LessonFactory(self.school)
+        self.attending = lesson_factory.new_into_db(students=[self.user])
+        self.teaching = lesson_factory.new_into_db(teachers=[self.user])
+        self.other = lesson_factory.new_into_db()
+        db.session.add_all([
+            TimetabledLesson(self.first.id, self.attending.id),
+            TimetabledLesson(self.first.id, self.other.id),
+            TimetabledLesson(self.second.id, self.teaching.id)
+        ])
+        db.session.commit()
+
+    def tearDown(self):
+        super(TimetableAPITestCase, self).tearDown()
+
+    def get(self, url):
+        return self.client.get(url, headers={'Content-Type': 'application/json', 'Authorization': 'JWT ' + self.token})
+
+    def test_my_timetable(self):
+        url = '/timetable/me?week_id={}'.format(self.week.id)
+        with count_queries() as statements:
+            response = self.get(url)
+        self.assertEqual(response.status_code, 200)
+        # One query for the whole grid, besides loading the user
+        self.assertEqual(len([statement for statement in statements if 'period' in statement]), 1)
+        self.assertLessEqual(len(statements), 2)
+
+        timetable = json.loads(response.data.decode('utf-8'))['timetable']
+        self.assertEqual(timetable['week']['id'], self.week.id)
+        self.assertEqual([day['name'] for day in timetable['days']], [day.name for day in Day])
+
+        monday, tuesday = timetable['days'][0], timetable['days'][1]
+        self.assertEqual([period['id'] for period in monday['periods']], [self.first.id, self.second.id])
+        self.assertEqual(
+            [(lesson['id'], lesson['role']) for lesson in monday['periods'][0]['lessons']],
+            [(self.attending.id, 'student')]
+        )
+        self.assertEqual(monday['periods'][0]['start_time'], '09:00:00')
+        self.assertEqual(
+            [(lesson['id'], lesson['role']) for lesson in monday['periods'][1]['lessons']],
+            [(self.teaching.id, 'teacher')]
+        )
+        self.assertEqual(tuesday['periods'][0]['lessons'], [])
+
+        # The school's first week is used by default
+        response = self.get('/timetable/me')
+        self.assertEqual(json.loads(response.data.decode('utf-8'))['timetable']['week']['id'], self.week.id)
+
+        response = self.get('/timetable/me?week_id=0')
+        self.assertEqual(response.status_code, 404)
+
+    def test_lesson_timetable(self):
+        response = self.get('/timetable/lesson/{}?week_id={}'.format(self.other.id, self.week.id))
+        self.assertEqual(response.status_code, 200)
+        monday = json.loads(response.data.decode('utf-8'))['timetable']['days'][0]
+        self.assertEqual([lesson['id'] for lesson in monday['periods'][0]['lessons']], [self.other.id])
+        self.assertEqual(monday['periods'][1]['lessons'], [])
+
+        other_school = SchoolFactory().new_into_db()
+        lesson = LessonFactory(other_school).new_into_db()
+        response = self.get('/timetable/lesson/{}'.format(lesson.id))
+        self.assertEqual(response.status_code, 404)
+
+    def test_timetable_cache_invalidated_by_lesson_change(self):
+        self.app.extensions['timetable_cache'] = LRUCache()
+        url = '/timetable/me?week_id={}'.format(self.week.id)
+        self.get(url)
+
+        with count_queries() as statements:
+            self.get(url)
+        self.assertEqual([statement for statement in statements if 'period' in statement], [])
+        self.assertEqual(len([statement for statement in statements if 'timetable_version' in statement]), 1)
+
+        response = self.client.put(
+            '/lessons/lesson/{}'.format(self.attending.id),
+            data=json.dumps({'name': 'Renamed'}),
+            headers={'Content-Type': 'application/json', 'Authorization': 'JWT ' + self.token}
+        )
+        self.assertEqual(response.status_code, 200)
+
+        response = self.get(url)
+        monday = json.loads(response.data.decode('utf-8'))['timetable']['days'][0]
+        self.assertEqual(monday['periods'][0]['lessons'][0]['name'], 'Renamed')
+
+    def post(self, url, data):
+        return self.client.post(
+            url,
+            data=json.dumps(data),
+            headers={'Content-Type': 'application/json', 'Authorization': 'JWT ' + self.token}
+        )
+
+    def test_interval_index(self):
+        index = IntervalIndex([
+            (1, 1, 1, datetime.time(9, 0), datetime.time(10, 0)),
+            (2, 1, 1, datetime.time(10, 0), datetime.time(11, 0)),
+            (3, 1, 1, datetime.time(8, 0), datetime.time(12, 0)),
+            (4, 1, 2, datetime.time(9, 0), datetime.time(10, 0)),
+            (5, 2, 1, datetime.time(9, 0), datetime.time(10, 0)),
+            (6, 1, 1, None, None)
+        ])
+        self.assertEqual(index.overlapping_period(1), {1, 3})
+        self.assertEqual(index.overlapping_period(3), {1, 2, 3})
+        self.assertEqual(index.overlapping_period(6), {6})
+        self.assertEqual(sorted(index.overlapping(1, 1, datetime.time(9, 30), datetime.time(10, 30))), [1, 2, 3])
+        self.assertEqual(index.overlapping(1, 1, datetime.time(12, 0), datetime.time(13, 0)), [])
+
+    def test_timetabled_lesson_create_checks_clashes(self):
+        overlapping = Period(
+            self.week, Day.MONDAY.value, datetime.time(9, 30), datetime.time(10, 30), 'Period 1b'
+        )
+        db.session.add(overlapping)
+        student = UserFactory(school=self.school).new_into_db(school_id=self.school.id, permissions=['Student'])
+        self.attending.students.append(student)
+        lesson = LessonFactory(self.school).new_into_db(students=[student])
+        db.session.commit()
+        user_id, lesson_id, attending_id = student.id, lesson.id, self.attending.id
+        first_id, free_id, overlapping_id = self.first.id, self.free.id, overlapping.id
+
+        response = self.post('/timetable/timetabled-lesson', {'period_id': overlapping_id, 'lesson_id': lesson_id})
+        self.assertEqual(response.status_code, 409)
+        clashes = json.loads(response.data.decode('utf-8'))['clashes']
+        self.assertEqual(clashes, [{
+            'user_id': user_id,
+            'period_ids': [first_id, overlapping_id],
+            'lesson_ids': [attending_id, lesson_id]
+        }])
+
+        response = self.post('/timetable/timetabled-lesson', {'period_id': free_id, 'lesson_id': lesson_id})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(TimetabledLesson.query.filter_by(period_id=free_id, lesson_id=lesson_id).count(), 1)
+
+    def test_clash_report(self):
+        response = self.get('/timetable/clashes')
+        self.assertEqual(json.loads(response.data.decode('utf-8'))['clashes'], [])
+
+        # Double book the user, who teaches one lesson and attends the other
+        db.session.add(TimetabledLesson(self.second.id, self.attending.id))
+        db.session.commit()
+
+        response = self.get('/timetable/clashes?week_id={}'.format(self.week.id))
+        self.assertEqual(response.status_code, 200)
+        json_response = json.loads(response.data.decode('utf-8'))
+        self.assertEqual(json_response['clash_count'], 1)
+        self.assertEqual(json_response['clashes'][0]['user_id'], self.user.id)
+        self.assertEqual(
+            json_response['clashes'][0]['lesson_ids'],
+            sorted([self.attending.id, self.teaching.id])
+        )
@@ -45,6 +45,30 @@ class UserAPITestCase(APITestCase):
         for form in forms:
             self.assertIn(form.to_dict(), dict_response['forms'])
 
+    def test_form_listing_sorted_pages(self):
+        forms = [self.form] + [form_factory.new_into_db(school_id=self.school.id) for i in range(0, 4)]
+        token = self.get_auth_token(self.user.username, self.user.raw_password)
+
+        listed = []
+        query_string = '/user/form?sort=-name&limit=2&count=true'
+        while query_string is not None:
+            response = self.client.get(query_string, headers={'Authorization': 'JWT ' + token})
+            dict_response = json.loads(response.data.decode('utf-8'))
+            self.assertEqual(dict_response['total'], 5)
+            self.assertEqual(dict_response['limit'], 2)
+            listed.extend((f['name'], f['id']) for f in dict_response['forms'])
+
+            query_string = None
+            if dict_response['next_cursor'] is not None:
+                query_string = '/user/form?sort=-name&limit=2&count=true&cursor=' + dict_response['next_cursor']
+
+        self.assertEqual(listed, sorted([(f.name, f.id) for f in forms], reverse=True))
+
+    def test_form_listing_invalid_sort(self):
+        token = self.get_auth_token(self.user.username, self.user.raw_password)
+        response = self.client.get('/user/form?sort=school_id', headers={'Authorization': 'JWT ' + token})
+        self.assertEqual(response.status_code, 409)
+
     def test_form_create_success(self):
         # Get an auth token
         token = self.get_auth_token(self.user.username, self.user.raw_password)
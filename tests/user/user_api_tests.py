@@ -3,16 +3,19 @@ import json
 
 from app import db, create_app
 
-from tests import APITestCase
+from tests import APITestCase, count_queries
 from tests.school.factories import SchoolFactory
 
 from app.user.models import User
 from tests.user.factories import UserFactory, FormFactory
+from tests.lessons.factories import LessonFactory
+from tests.permissions.factories import RoleFactory
 from app.user.user_functions import user_listing
 
 user_factory = UserFactory()
 school_factory = SchoolFactory()
 form_factory = FormFactory()
+role_factory = RoleFactory()
 
 
 class UserAPITestCase(APITestCase):
@@ -62,6 +65,72 @@ class UserAPITestCase(APITestCase):
         self.assertTrue(dict_response['success'])
         self.assertIn('permissions', dict_response['users'][0].keys())
 
+    def get_users(self, token, query_string=''):
+        response = self.client.get('/user/user' + query_string, headers={'Authorization': 'JWT ' + token})
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.data.decode('utf-8'))
+
+    def test_user_listing_pagination(self):
+        users = [user_factory.new_into_db(school_id=self.school.id) for i in range(0, 3)]
+        token = self.get_auth_token(self.user.username, self.user.raw_password)
+
+        ids = []
+        cursor = ''
+        for page in range(0, 2):
+            dict_response = self.get_users(token, '?limit=2' + cursor)
+            self.assertEqual(len(dict_response['users']), 2)
+            ids.extend(u['id'] for u in dict_response['users'])
+            cursor = '&cursor={}'.format(dict_response['next_cursor'])
+
+        self.assertIsNone(dict_response['next_cursor'])
+        self.assertEqual(ids, sorted([self.user.id] + [u.id for u in users]))
+
+    def test_user_listing_fields_and_filters(self):
+        role = role_factory.new_into_db(school_id=self.school.id)
+        in_form = user_factory.new_into_db(school_id=self.school.id, form_id=self.form.id)
+        with_role = user_factory.new_into_db(school_id=self.school.id, roles=[role.name])
+        token = self.get_auth_token(self.user.username, self.user.raw_password)
+
+        dict_response = self.get_users(token, '?fields=id,email')
+        self.assertIn({'id': in_form.id, 'email': in_form.email}, dict_response['users'])
+
+        dict_response = self.get_users(token, '?fields=id&form_id={}'.format(self.form.id))
+        self.assertEqual(dict_response['users'], [{'id': in_form.id}])
+
+        dict_response = self.get_users(token, '?fields=id&role={}'.format(role.name))
+        self.assertEqual(dict_response['users'], [{'id': with_role.id}])
+
+        dict_response = self.get_users(token, '?fields=id&permission=Administrator')
+        self.assertEqual(dict_response['users'], [{'id': self.user.id}])
+
+        response = self.client.get('/user/user?fields=password', headers={'Authorization': 'JWT ' + token})
+        self.assertEqual(response.status_code, 409)
+
+    def test_user_listing_nesting_query_count(self):
+        role = role_factory.new_into_db(school_id=self.school.id, permission_names=['Administrator'])
+        school_id, form_id, role_name = self.school.id, self.form.id, role.name
+        token = self.get_auth_token(self.user.username, self.user.raw_password)
+        query_string = '?nest-roles=true&nest-role-permissions=true&nest-permissions=true&nest-forms=true'
+
+        def count():
+            db.session.expunge_all()
+            with count_queries() as statements:
+                dict_response = self.get_users(token, query_string)
+            return len(statements), dict_response
+
+        user_factory.new_into_db(school_id=school_id, form_id=form_id, roles=[role_name])
+        before, _ = count()
+        for i in range(0, 2):
+            user_factory.new_into_db(school_id=school_id, form_id=form_id, roles=[role_name])
+        after, dict_response = count()
+
+        # Adding users doesn't add queries
+        self.assertEqual(before, after)
+        nested = [u for u in dict_response['users'] if u['roles']]
+        self.assertEqual(len(nested), 3)
+        self.assertEqual(nested[0]['form']['id'], form_id)
+        self.assertEqual(nested[0]['roles'][0]['permissions'][0]['name'], 'Administrator')
+
     def test_user_create_success(self):
         # Get an auth token
         token = self.get_auth_token(self.user.username, self.user.raw_password)
@@ -217,3 +286,73 @@ class UserAPITestCase(APITestCase):
         user = User.query.filter_by(username=mock_user.username).first()
         self.assertIsNotNone(user)
 
+
+    def test_user_import_csv(self):
+        token = self.get_auth_token(self.user.username, self.user.raw_password)
+        role = role_factory.new_into_db(school_id=self.school.id)
+        lesson = LessonFactory(self.school).new_into_db()
+
+        upload = "\n".join([
+            "first_name,last_name,password,username,email,form_id,role_ids,lesson_ids",
+            "Ada,Lovelace,secret1,ada,ada@example.com,{},{},{}".format(self.form.id, role.id, lesson.id),
+            "Alan,Turing,secret2,alan,alan@example.com,,,",
+            "Dupe,Email,secret3,dupe,ada@example.com,,,",
+            "Taken,Username,secret4,{},taken@example.com,,,".format(self.user.username),
+            "No,Password,,nopassword,nopassword@example.com,,,",
+            "Bad,Role,secret5,badrole,badrole@example.com,,-1,",
+        ])
+        response = self.client.post(
+            '/user/import',
+            data=upload,
+            headers={'Authorization': 'JWT ' + token, 'Content-Type': 'text/csv'}
+        )
+        self.assertEqual(response.status_code, 200)
+        json_response = json.loads(response.data.decode('utf-8'))
+        self.assertEqual(json_response['created'], 2)
+        self.assertEqual(json_response['failed'], 4)
+
+        rows = json_response['rows']
+        self.assertEqual([r['success'] for r in rows], [True, True, False, False, False, False])
+        self.assertEqual(rows[2]['errors'], ["email already in use."])
+        self.assertEqual(rows[3]['errors'], ["username already in use."])
+        self.assertEqual(rows[4]['errors'], ["Value for key: password cannot be blank"])
+        self.assertEqual(rows[5]['errors'], ["Invalid id in role_ids: -1"])
+
+        ada = User.query.get(rows[0]['id'])
+        self.assertEqual(ada.username, 'ada')
+        self.assertEqual(ada.form_id, self.form.id)
+        self.assertEqual([r.id for r in ada.roles], [role.id])
+        self.assertEqual([l.id for l in ada.lessons_attending], [lesson.id])
+
+        # The hashed password can be used to log in
+        self.assertIsNotNone(self.get_auth_token('alan', 'secret2'))
+
+    def test_user_import_ndjson(self):
+        token = self.get_auth_token(self.user.username, self.user.raw_password)
+        upload = "\n".join([
+            json.dumps({
+                'first_name': 'Grace', 'last_name': 'Hopper', 'password': 'secret', 'username': 'grace',
+                'email': 'grace@example.com'
+            }),
+            "not json",
+            json.dumps({'first_name': 'Missing', 'last_name': 'Email', 'password': 'secret', 'username': 'missing'}),
+            json.dumps({
+                'first_name': 'Ada', 'last_name': 'Lovelace', 'password': 'secret', 'username': ['ada'],
+                'email': 'ada@example.com', 'role_ids': [{'id': 1}]
+            }),
+        ])
+        response = self.client.post(
+            '/user/import',
+            data=upload,
+            headers={'Authorization': 'JWT ' + token, 'Content-Type': 'application/x-ndjson'}
+        )
+        self.assertEqual(response.status_code, 200)
+        json_response = json.loads(response.data.decode('utf-8'))
+        self.assertEqual(json_response['created'], 1)
+        self.assertEqual(json_response['rows'][1]['errors'], ["Could not parse row."])
+        self.assertEqual(json_response['rows'][2]['errors'], ["Missing key: email"])
+        self.assertEqual(
+            json_response['rows'][3]['errors'],
+            ["Value for key: username must be a string", "Invalid value for key: role_ids"]
+        )
+        self.assertIsNotNone(User.query.filter_by(username='grace', school_id=self.school.id).first())
@@ -1,7 +1,9 @@
-import unittest
-
-from app import db, create_app
+from app import db
+from app.cache import LRUCache
+from app.permissions.cache_functions import invalidate_permissions
+from app.permissions.models import Permission, Role
 
+from tests import DatabaseTestCase, count_queries
 from tests.school.factories import SchoolFactory
 
 from app.user.models import User
@@ -11,19 +13,13 @@ user_factory = UserFactory()
 school_factory = SchoolFactory()
 
 
-class UserModelTestCase(unittest.TestCase):
+class UserModelTestCase(DatabaseTestCase):
     def setUp(self):
-        self.app = create_app('testing')
-        self.app_context = self.app.app_context()
-        self.app_context.push()
-        db.create_all()
-
+        super(UserModelTestCase, self).setUp()
         self.school = school_factory.new_into_db()
 
     def tearDown(self):
-        db.session.remove()
-        db.drop_all()
-        self.app_context.pop()
+        super(UserModelTestCase, self).tearDown()
 
 
     # def test_creation(self):
@@ -34,4 +30,40 @@ class UserModelTestCase(unittest.TestCase):
     #     db.session.commit()
     #
     #     user_from_db = User.query.filter_by(username=user.username).first()
-    #     self.assertIsNotNone(user_from_db)
\ No newline at end of file
+    #     self.assertIsNotNone(user_from_db)
+
+    def test_has_permissions_includes_roles(self):
+        role = Role(name='Staff', school_id=self.school.id)
+        role.add_permission_by_name('Teacher')
+        db.session.add(role)
+        db.session.commit()
+
+        user = user_factory.new_into_db(school_id=self.school.id, permissions=['Student'], roles=['Staff'])
+
+        self.assertTrue(user.has_permissions({'Student', 'Teacher'}))
+        self.assertFalse(user.has_permissions({'Teacher'}, include_roles=False))
+        self.assertTrue(user.has_roles({'Staff'}))
+        self.assertFalse(user.has_permissions({'Administrator'}))
+
+    def test_has_permissions_queries_once_per_request(self):
+        user = user_factory.new_into_db(school_id=self.school.id, permissions=['Student'])
+        db.session.refresh(user)
+
+        with count_queries() as statements:
+            user.has_permissions({'Student'})
+            user.has_permissions({'Teacher'})
+            user.has_roles({'Staff'})
+
+        self.assertEqual(len(statements), 1)
+
+    def test_shared_cache_invalidated_by_permission_change(self):
+        self.app.extensions['permissions_cache'] = LRUCache()
+        user = user_factory.new_into_db(school_id=self.school.id, permissions=['Student'])
+        self.assertFalse(user.has_permissions({'Teacher'}))
+
+        teacher = Permission.query.filter_by(name='Teacher', school_id=self.school.id).first()
+        user.permissions.append(teacher)
+        invalidate_permissions(self.school.id)
+        db.session.commit()
+
+        self.assertTrue(user.has_permissions({'Teacher'}))